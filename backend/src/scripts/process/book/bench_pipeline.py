@@ -0,0 +1,567 @@
+"""
+Benchmark the book pipeline (step_0 to step_4) on a synthetic catalog.
+
+For every catalog size this script:
+1. Generates a unique book list and a new book list in the catalog format
+   (UNIQUE_BOOK_KEYS). The new list repeats most of the unique list, adds
+   --new_rate fresh books and --dup_rate re-uploads: known books with a new
+   ID and the same ISBN/class/file.
+2. Generates mirror directories (A, B, ...) with a small valid PDF for each
+   fresh book, with varied page counts. Some books are in several mirrors
+   with different sizes. With --sparse, the PDFs are padded with a sparse
+   hole, so they have realistic sizes (up to --max_pdf_mb) without using
+   disk space. step_2 still copies their full size to its output directory
+   unless --link_mode hardlink is used.
+3. Runs each step in a fresh process and measures it:
+   find_new_books (step_0), process_pdfs (step_1), process_books (step_2, with
+   --process), get_unique_books (step_3) and process_csv_to_sql (step_4).
+
+The measurements of each step are:
+- wall time and throughput (input records per second)
+- peak RSS of the step process above the RSS it had before the step started
+  (imports and setup excluded), and the peak RSS of its worker processes
+- read/write syscalls and bytes from /proc/<pid>/io (Linux only), of the step
+  process and its worker processes together
+- calls of open/stat/scandir/listdir/replace/... made through the Python
+  functions, counted by wrapping them while the step runs
+
+Results are appended to --output (a JSON array with one entry per run), so runs
+can be compared over time.
+
+Usage:
+    python process/bench_pipeline.py --sizes 10k -o bench_results.json
+    python process/bench_pipeline.py --sizes 10k 100k 1m --max_pdfs 5000 --sparse --workers 4
+    python process/bench_pipeline.py --sizes 100k --work_dir /data/bench --keep
+"""
+
+import argparse
+import builtins
+import concurrent.futures
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager, redirect_stdout
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import resource
+    HAS_RESOURCE = True
+except ImportError:
+    HAS_RESOURCE = False
+
+from catalog_io import JsonArrayWriter, iter_json_array
+from copy_engine import LINK_MODES, LINK_NONE
+from step_0_create_new import UNIQUE_BOOK_KEYS, find_new_books, load_books_from_file, save_books_to_file, sort_books_by_id
+from step_1_smallest_pdf import process_pdfs
+from step_2_renumber import book_csv_row, process_books
+from step_3_merge_json import book_sort_key, get_unique_books, read_json_files, save_json
+from step_4_csv_to_sql import MODES, MODE_INSERT, process_csv_to_sql
+
+# Catalog sizes accepted by --sizes besides plain numbers
+SIZE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+# Steps in pipeline order (named after the function that is benchmarked)
+STEPS = ["find_new_books", "process_pdfs", "process_books", "get_unique_books", "process_csv_to_sql"]
+
+# Values of the low-cardinality catalog fields
+CLASSES = [str(level) for level in range(1, 13)]
+LEVELS = ["SD", "SMP", "SMA", "SMK"]
+PUBLISHERS = [f"Penerbit {name}" for name in ("Nusantara", "Cendekia", "Pelita", "Gemilang", "Pustaka", "Bina Ilmu", "Erlangga", "Yudhistira")]
+CURRICULA = ["K13", "Kurikulum Merdeka", "KTSP 2006"]
+EDITIONS = ["Edisi 1", "Edisi 2", "Edisi Revisi"]
+BOOK_TYPES = ["Buku Siswa", "Buku Guru", "Buku Non Teks"]
+
+# Base URL of the generated attachments
+ATTACHMENT_BASE = "https://cdn.example.org/buku"
+# ID of the first generated book
+FIRST_ID = 1
+
+# Page counts of the generated PDFs
+PAGE_COUNTS = [1, 4, 24, 64, 120, 180, 256, 320]
+# Share of PDFs that are also in a second mirror (with another size)
+MIRROR_COPY_RATE = 0.3
+# Status codes of the step_4 CSV and their weights
+STATUS_WEIGHTS = {"1": 0.8, "0": 0.1, "": 0.1}
+
+# Functions wrapped with call counters while a step runs
+COUNTED_CALLS = [
+    (builtins, "open"),
+    (os, "stat"),
+    (os, "lstat"),
+    (os, "scandir"),
+    (os, "listdir"),
+    (os, "replace"),
+    (os, "rename"),
+    (os, "remove"),
+    (os, "link"),
+    (shutil, "copyfile"),
+]
+
+
+def parse_size(text: str) -> int:
+    """Parse a catalog size such as 10000, 10k or 1m."""
+    value = text.strip().lower()
+    multiplier = SIZE_SUFFIXES.get(value[-1:], 1)
+    if multiplier != 1:
+        value = value[:-1]
+    try:
+        size = int(float(value) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid catalog size: {text}")
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f"catalog size must be positive: {text}")
+    return size
+
+
+def make_book(index: int) -> Dict[str, Any]:
+    """
+    Catalog record number `index`.
+
+    The record only depends on the index, so the new list can repeat books of
+    the unique list without keeping them in memory.
+    """
+    values = {
+        "title": f"Buku Pelajaran {index}",
+        "id": FIRST_ID + index,
+        "attachment": f"{ATTACHMENT_BASE}/Buku%20{index:07d}.pdf",
+        "filename": f"Buku {index:07d}.pdf",
+        "class": CLASSES[index % len(CLASSES)],
+        "level": LEVELS[(index // 3) % len(LEVELS)],
+        "writer": f"Penulis {index % 5003}",
+        "reviewer": f"Penelaah {index % 811}",
+        "translator": "",
+        "designer": f"Desainer {index % 97}",
+        "cover_designer": f"Desainer {index % 89}",
+        "ilustrator": f"Ilustrator {index % 151}",
+        "editor": f"Editor {index % 307}",
+        "publisher": PUBLISHERS[(index // 5) % len(PUBLISHERS)],
+        "isbn": f"978-602-{index % 100000:05d}-{index // 100000:02d}-{index % 10}",
+        "curriculum": CURRICULA[(index // 7) % len(CURRICULA)],
+        "edition": EDITIONS[(index // 11) % len(EDITIONS)],
+        "book_type": BOOK_TYPES[(index // 13) % len(BOOK_TYPES)],
+        "cloud": "",
+        "size": 0,
+        "page": 0,
+    }
+    return {key: values[key] for key in UNIQUE_BOOK_KEYS}
+
+
+def new_list_entries(size: int, new_rate: float, dup_rate: float, rng: random.Random) -> Tuple[List[Tuple[int, Optional[int]]], List[int]]:
+    """
+    Compose the new book list.
+
+    Returns:
+        Tuple: (entries, fresh book indexes). Each entry is (book index, ID
+        override); an ID override marks a re-upload of that book.
+    """
+    fresh_count = max(1, round(size * new_rate))
+    reupload_count = round(size * dup_rate)
+    known_count = max(0, size - fresh_count - reupload_count)
+
+    fresh = list(range(size, size + fresh_count))
+    next_id = FIRST_ID + size + fresh_count
+    entries: List[Tuple[int, Optional[int]]] = [(index, None) for index in fresh]
+    entries.extend((index, None) for index in rng.sample(range(size), min(known_count, size)))
+    for offset in range(reupload_count):
+        # Mostly re-uploads of known books, some of fresh ones (duplicates within the new list)
+        index = rng.choice(fresh) if rng.random() < new_rate else rng.randrange(size)
+        entries.append((index, next_id + offset))
+    rng.shuffle(entries)
+    return entries, fresh
+
+
+def write_catalog(size: int, unique_file: str, new_file: str, new_rate: float, dup_rate: float, rng: random.Random) -> Tuple[int, List[int]]:
+    """Write the unique and new book lists. Returns (new list size, fresh book indexes)."""
+    with JsonArrayWriter(unique_file) as writer:
+        for index in range(size):
+            writer.write(make_book(index))
+
+    entries, fresh = new_list_entries(size, new_rate, dup_rate, rng)
+    with JsonArrayWriter(new_file) as writer:
+        for index, book_id in entries:
+            book = make_book(index)
+            if book_id is not None:
+                book["id"] = book_id
+            writer.write(book)
+    return len(entries), fresh
+
+
+def write_pdf(path: str, pages: int, padding: int = 0) -> None:
+    """
+    Write a minimal valid PDF with `pages` empty pages.
+
+    With padding, an unused stream object of that many bytes is added; its
+    content is skipped with seek(), so the file is sparse on file systems that
+    support it.
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{3 + i} 0 R" for i in range(pages)), pages)).encode("ascii"),
+    ]
+    objects.extend(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] >>" for _ in range(pages))
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        if padding:
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n<< /Length %d >>\nstream\n" % (len(offsets), padding))
+            f.seek(padding, os.SEEK_CUR)
+            f.write(b"\nendstream\nendobj\n")
+
+        xref_offset = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(offsets) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets) + 1, xref_offset))
+
+
+def write_mirrors(mirror_dirs: List[str], fresh: List[int], max_pdfs: int, sparse: bool, max_pdf_mb: int, rng: random.Random) -> int:
+    """Write the PDFs of the first max_pdfs fresh books to the mirrors. Returns the number of files."""
+    for directory in mirror_dirs:
+        os.makedirs(directory, exist_ok=True)
+
+    count = 0
+    for index in fresh[:max_pdfs]:
+        filename = make_book(index)["filename"]
+        pages = rng.choice(PAGE_COUNTS)
+        targets = [rng.randrange(len(mirror_dirs))]
+        if len(mirror_dirs) > 1 and rng.random() < MIRROR_COPY_RATE:
+            targets.append((targets[0] + rng.randrange(1, len(mirror_dirs))) % len(mirror_dirs))
+        for mirror in targets:
+            padding = rng.randrange(1 << 20, max(2, max_pdf_mb) << 20) if sparse else rng.randrange(0, 4096)
+            write_pdf(os.path.join(mirror_dirs[mirror], filename), pages, padding)
+            count += 1
+    return count
+
+
+def write_sql_csv(renumbered_file: str, csv_file: str, rng: random.Random) -> int:
+    """Write the step_4 input (the step_2 CSV columns plus Status) for the renumbered books."""
+    statuses = list(STATUS_WEIGHTS)
+    weights = list(STATUS_WEIGHTS.values())
+    fieldnames = list(book_csv_row({})) + ["Status"]
+    count = 0
+    with open(csv_file, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for book in iter_json_array(renumbered_file):
+            if book.get("bookId") is None:
+                continue
+            writer.writerow({**book_csv_row(book), "Status": rng.choices(statuses, weights)[0]})
+            count += 1
+    return count
+
+
+def count_records(file_path: str) -> int:
+    if not os.path.exists(file_path):
+        return 0
+    return sum(1 for _ in iter_json_array(file_path))
+
+
+def run_find_new_books(paths: Dict[str, Any], options: Dict[str, Any]) -> None:
+    unique_books = load_books_from_file(Path(paths["unique"]))
+    new_books = load_books_from_file(Path(paths["new"]))
+    new_unique_books = find_new_books(unique_books, new_books)
+    sort_books_by_id(new_unique_books)
+    save_books_to_file(new_unique_books, paths["new_unique"])
+
+
+def run_process_pdfs(paths: Dict[str, Any], options: Dict[str, Any]) -> None:
+    process_pdfs(paths["mirrors"], paths["new_unique"], paths["pdf_log"], workers=options["workers"])
+
+
+def run_process_books(paths: Dict[str, Any], options: Dict[str, Any]) -> None:
+    # Created by step_2's main() before process_books() runs
+    os.makedirs(paths["cloud"], exist_ok=True)
+    process_books(paths["mirrors"], paths["new_unique"], paths["renumbered"], options["start_id"], output_dir=paths["cloud"],
+                  process=True, output_csv=paths["renumbered_csv"], workers=options["workers"], link_mode=options["link_mode"])
+
+
+def run_get_unique_books(paths: Dict[str, Any], options: Dict[str, Any]) -> None:
+    all_books = read_json_files([paths["unique"], paths["renumbered"]])
+    unique_books, duplicate_books = get_unique_books(all_books)
+    unique_books.sort(key=book_sort_key)
+    duplicate_books.sort(key=book_sort_key)
+    save_json(unique_books, paths["merged"], "unique books")
+    save_json(duplicate_books, paths["duplicates"], "duplicate books")
+
+
+def run_process_csv_to_sql(paths: Dict[str, Any], options: Dict[str, Any]) -> None:
+    process_csv_to_sql(paths["sql_csv"], paths["sql"], mode=options["sql_mode"])
+
+
+# Function run for each step
+STEP_RUNNERS = {
+    "find_new_books": run_find_new_books,
+    "process_pdfs": run_process_pdfs,
+    "process_books": run_process_books,
+    "get_unique_books": run_get_unique_books,
+    "process_csv_to_sql": run_process_csv_to_sql,
+}
+
+
+def read_proc_io(pid: str = "self") -> Optional[Dict[str, int]]:
+    """I/O counters of a process from /proc/<pid>/io, or None where unavailable."""
+    try:
+        with open(f"/proc/{pid}/io", "r") as f:
+            return {name: int(value) for name, value in (line.split(":", 1) for line in f if ":" in line)}
+    except (OSError, ValueError):
+        return None
+
+
+def read_step_io() -> Optional[Dict[str, int]]:
+    """
+    I/O counters of this process and its worker processes.
+
+    The kernel adds the counters of a child to its parent's /proc/self/io once the
+    child has exited and been waited for, which is how the pools of bounded_map end.
+    Workers still running are read from their own /proc/<pid>/io and added.
+    """
+    total = read_proc_io()
+    if total is None:
+        return None
+    for child in multiprocessing.active_children():
+        counters = read_proc_io(str(child.pid))
+        if counters is None:
+            # Exited in the meantime, so already counted in /proc/self/io
+            continue
+        for name, value in counters.items():
+            total[name] = total.get(name, 0) + value
+    return total
+
+
+def peak_rss_kb(who: str = "self") -> Optional[int]:
+    """Peak resident set size in KiB of this process ("self") or of its waited-for children."""
+    if not HAS_RESOURCE:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return usage // 1024 if sys.platform == "darwin" else usage
+
+
+@contextmanager
+def count_calls(counts: Dict[str, int]) -> Iterator[Dict[str, int]]:
+    """Count calls of the COUNTED_CALLS functions into `counts` while the context is active."""
+    def counting(name, original):
+        def wrapper(*args, **kwargs):
+            counts[name] = counts.get(name, 0) + 1
+            return original(*args, **kwargs)
+        return wrapper
+
+    patched = []
+    for module, attribute in COUNTED_CALLS:
+        original = getattr(module, attribute, None)
+        if original is None:
+            continue
+        patched.append((module, attribute, original))
+        setattr(module, attribute, counting(f"{module.__name__}.{attribute}", original))
+    try:
+        yield counts
+    finally:
+        for module, attribute, original in patched:
+            setattr(module, attribute, original)
+
+
+def measure_step(step: str, paths: Dict[str, Any], options: Dict[str, Any], records: int) -> Dict[str, Any]:
+    """
+    Run one step and measure it. Runs in a fresh process; step_rss_kb is the peak RSS
+    minus the RSS of that process before the step (interpreter, imports, setup).
+    """
+    runner = STEP_RUNNERS[step]
+    baseline_rss = peak_rss_kb()
+    calls: Dict[str, int] = {}
+
+    with ExitStack() as stack:
+        if not options["verbose"]:
+            stack.enter_context(redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+        io_before = read_step_io()
+        with count_calls(calls):
+            start = time.perf_counter()
+            runner(paths, options)
+            seconds = time.perf_counter() - start
+        io_after = read_step_io()
+
+    io_delta = None
+    if io_before is not None and io_after is not None:
+        io_delta = {name: io_after[name] - io_before.get(name, 0) for name in io_after}
+
+    peak_rss = peak_rss_kb()
+    return {
+        "seconds": round(seconds, 4),
+        "records": records,
+        "records_per_second": round(records / seconds, 1) if seconds > 0 else None,
+        "peak_rss_kb": peak_rss,
+        "baseline_rss_kb": baseline_rss,
+        "step_rss_kb": peak_rss - baseline_rss if peak_rss is not None and baseline_rss is not None else None,
+        "children_peak_rss_kb": peak_rss_kb("children"),
+        "io": io_delta,
+        "calls": dict(sorted(calls.items())),
+    }
+
+
+def run_step(step: str, paths: Dict[str, Any], options: Dict[str, Any], records: int) -> Dict[str, Any]:
+    """Run measure_step in a new (spawned) process."""
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(measure_step, step, paths, options, records).result()
+
+
+def benchmark_size(size: int, work_dir: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Generate the data set for one catalog size and benchmark every step on it."""
+    rng = random.Random(args.seed)
+    os.makedirs(work_dir, exist_ok=True)
+    mirror_dirs = [os.path.join(work_dir, chr(ord("A") + i)) for i in range(args.mirrors)]
+    paths = {
+        "unique": os.path.join(work_dir, "unique_books.json"),
+        "new": os.path.join(work_dir, "new_books.json"),
+        "mirrors": mirror_dirs,
+        "new_unique": os.path.join(work_dir, "step_0_new.json"),
+        "pdf_log": os.path.join(work_dir, "step_1_log.json"),
+        "renumbered": os.path.join(work_dir, "step_2_renumbered.json"),
+        "renumbered_csv": os.path.join(work_dir, "step_2_renumbered.csv"),
+        "cloud": os.path.join(work_dir, "cloud"),
+        "merged": os.path.join(work_dir, "step_3_unique.json"),
+        "duplicates": os.path.join(work_dir, "step_3_duplicates.json"),
+        "sql_csv": os.path.join(work_dir, "step_4_books.csv"),
+        "sql": os.path.join(work_dir, "step_4_books.sql"),
+    }
+    options = {
+        "workers": args.workers,
+        "link_mode": args.link_mode,
+        "sql_mode": args.sql_mode,
+        "start_id": FIRST_ID,
+        "verbose": args.verbose,
+    }
+
+    print(f"Generating catalog of {size} books in {work_dir}...")
+    start = time.perf_counter()
+    new_count, fresh = write_catalog(size, paths["unique"], paths["new"], args.new_rate, args.dup_rate, rng)
+    pdf_count = write_mirrors(mirror_dirs, fresh, args.max_pdfs, args.sparse, args.max_pdf_mb, rng)
+    generate_seconds = time.perf_counter() - start
+    print(f"Generated {size} unique + {new_count} new books and {pdf_count} PDFs in {generate_seconds:.1f}s")
+
+    result = {
+        "size": size,
+        "new_books": new_count,
+        "fresh_books": len(fresh),
+        "pdfs": pdf_count,
+        "generate_seconds": round(generate_seconds, 2),
+        "steps": {},
+    }
+
+    for step in STEPS:
+        if step == "find_new_books":
+            records = size + new_count
+        elif step in ("process_pdfs", "process_books"):
+            records = count_records(paths["new_unique"])
+        elif step == "get_unique_books":
+            records = size + count_records(paths["renumbered"])
+        else:
+            records = write_sql_csv(paths["renumbered"], paths["sql_csv"], rng)
+
+        measurement = run_step(step, paths, options, records)
+        result["steps"][step] = measurement
+        rate = measurement["records_per_second"] or 0
+        rss = measurement["step_rss_kb"]
+        rss_text = f"+{rss / 1024:.0f} MiB" if rss is not None else "n/a"
+        children_rss = measurement["children_peak_rss_kb"]
+        if children_rss:
+            rss_text += f" (workers {children_rss / 1024:.0f} MiB)"
+        print(f"  {step:<20} {measurement['seconds']:9.2f}s {records:>9} records {rate:>12.0f} rec/s  peak RSS {rss_text}")
+    return result
+
+
+def git_revision() -> Optional[str]:
+    """Commit of the working tree, to tell runs apart."""
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip() or None
+
+
+def save_results(run: Dict[str, Any], output_file: str) -> None:
+    """Append a run to the JSON array in output_file."""
+    runs = []
+    if os.path.exists(output_file):
+        try:
+            with open(output_file, "r", encoding="utf-8") as f:
+                runs = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Warning: could not read previous results from {output_file} ({e}); starting a new file.")
+            runs = []
+        if not isinstance(runs, list):
+            runs = [runs]
+    runs.append(run)
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(runs, f, indent=2, ensure_ascii=False)
+    print(f"Results appended to {output_file} ({len(runs)} runs)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the book pipeline on a synthetic catalog.")
+    parser.add_argument("--sizes", nargs='+', type=parse_size, default=[10_000], help="Catalog sizes, e.g. 10k 100k 1m (default: 10k)")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="JSON file the results are appended to (default: bench_results.json)")
+    parser.add_argument("--work_dir", help="Directory for the generated data (default: a new temporary directory)")
+    parser.add_argument("--keep", action="store_true", default=False, help="Keep the generated data after the run")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed of the generator (default: 1)")
+    parser.add_argument("--new_rate", type=float, default=0.1, help="Share of fresh books in the new list (default: 0.1)")
+    parser.add_argument("--dup_rate", type=float, default=0.05, help="Share of re-uploads (known book, new ID) in the new list (default: 0.05)")
+    parser.add_argument("--mirrors", type=int, default=2, help="Number of mirror directories (default: 2)")
+    parser.add_argument("--max_pdfs", type=int, default=2000, help="Maximum number of fresh books with a PDF; the others are not found (default: 2000)")
+    parser.add_argument("--sparse", action="store_true", default=False, help="Pad the PDFs to 1..--max_pdf_mb MB with sparse holes")
+    parser.add_argument("--max_pdf_mb", type=int, default=40, help="Maximum size of the sparse PDFs in MB (default: 40)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for step_1 and step_2 (default: 1)")
+    parser.add_argument("--link_mode", choices=LINK_MODES, default=LINK_NONE, help=f"How step_2 places the PDFs in the output directory (default: {LINK_NONE})")
+    parser.add_argument("--sql_mode", choices=MODES, default=MODE_INSERT, help=f"Output mode of step_4 (default: {MODE_INSERT})")
+    parser.add_argument("-v", "--verbose", action="store_true", default=False, help="Show the output of the steps")
+
+    args = parser.parse_args()
+
+    if args.mirrors < 1:
+        parser.error("--mirrors must be at least 1")
+    if not 0 < args.new_rate < 1 or not 0 <= args.dup_rate < 1 or args.new_rate + args.dup_rate >= 1:
+        parser.error("--new_rate and --dup_rate must be fractions with a sum below 1")
+
+    base_dir = args.work_dir or tempfile.mkdtemp(prefix="book_bench_")
+    run = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "options": {key: value for key, value in vars(args).items() if key not in ("output", "work_dir", "keep", "verbose")},
+        "results": [],
+    }
+
+    try:
+        for size in args.sizes:
+            work_dir = os.path.join(base_dir, f"size_{size}")
+            try:
+                run["results"].append(benchmark_size(size, work_dir, args))
+            finally:
+                if not args.keep:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+    finally:
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    save_results(run, args.output)
+
+
+if __name__ == "__main__":
+    main()
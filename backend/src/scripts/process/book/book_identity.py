@@ -0,0 +1,149 @@
+"""
+Identity index used to recognise books that are already known.
+
+A book can be identified by several keys:
+- "id":              the book ID
+- "isbn_class":      normalized ISBN + class
+- "isbn_class_file": normalized ISBN + class + attachment filename
+- "filename":        attachment filename
+
+The index keeps one hash table per enabled key, so each lookup is O(1), and
+reports which key caused a match. It is shared by step_0_create_new.py (to find
+real novelties in a new list) and step_3_merge_json.py (to de-duplicate merged
+snapshots).
+"""
+
+from collections import Counter
+from pathlib import Path
+from typing import Any, Container, Dict, Iterable, List, Optional, Set, Tuple
+
+from id_index import normalize_book_id
+
+KEY_ID = "id"
+KEY_ISBN_CLASS = "isbn_class"
+KEY_ISBN_CLASS_FILE = "isbn_class_file"
+KEY_FILENAME = "filename"
+
+IDENTITY_KEYS = [KEY_ID, KEY_ISBN_CLASS, KEY_ISBN_CLASS_FILE, KEY_FILENAME]
+
+# A (key name, key value) pair describing why a book matched the index
+IdentityMatch = Tuple[str, Any]
+
+
+def normalize_isbn(isbn: Any) -> str:
+    """Normalize an ISBN for comparison: drop spaces and hyphens, upper-case the check digit."""
+    if not isbn:
+        return ""
+    return str(isbn).strip().replace("-", "").replace(" ", "").upper()
+
+
+def attachment_filename(attachment: Optional[str]) -> str:
+    """Return the file name part of an attachment URL or path."""
+    if not attachment:
+        return ""
+    return Path(attachment).name
+
+
+def identity_keys(book: Dict[str, Any], keys: Iterable[str]) -> List[IdentityMatch]:
+    """
+    Compute the identity key values of a book.
+
+    Keys whose inputs are empty (no ID, no ISBN, no attachment) are left out,
+    so they never cause a match.
+
+    Args:
+        book (Dict[str, Any]): Book dictionary
+        keys (Iterable[str]): Names of the keys to compute
+
+    Returns:
+        List[IdentityMatch]: (key name, key value) pairs, in the order of keys
+    """
+    result: List[IdentityMatch] = []
+    isbn = normalize_isbn(book.get('isbn'))
+    class_key = str(book.get('class', '') or '').strip()
+    filename = attachment_filename(book.get('attachment'))
+
+    for key in keys:
+        if key == KEY_ID:
+            book_id = book.get('id')
+            if book_id:
+                result.append((key, normalize_book_id(book_id)))
+        elif key == KEY_ISBN_CLASS:
+            if isbn:
+                result.append((key, (isbn, class_key)))
+        elif key == KEY_ISBN_CLASS_FILE:
+            if isbn:
+                result.append((key, (isbn, class_key, filename)))
+        elif key == KEY_FILENAME:
+            if filename:
+                result.append((key, filename))
+        else:
+            raise ValueError(f"Unknown identity key: {key}")
+    return result
+
+
+def format_match(match: IdentityMatch) -> str:
+    """Format a match as a duplicate reason, e.g. "duplicate_id:123"."""
+    key, value = match
+    if isinstance(value, tuple):
+        value = ":".join(str(v) for v in value)
+    return f"duplicate_{key}:{value}"
+
+
+class BookIdentityIndex:
+    """
+    Set of known books, looked up by any of the enabled identity keys.
+
+    Args:
+        keys (Iterable[str]): Identity keys to index, checked in this order
+        id_index (Optional[Container[Any]]): Read-only container of already known IDs
+            (for example a SortedIdIndex) consulted in addition to the in-memory ID table
+        key_store (Optional[Any]): On-disk store of key values with contains(key, value)
+            and add(key, value) (for example a KeyIndex); when set, it replaces the
+            in-memory tables, so memory use does not grow with the number of books
+    """
+
+    def __init__(self, keys: Iterable[str] = IDENTITY_KEYS, id_index: Optional[Container[Any]] = None, key_store: Optional[Any] = None):
+        self.keys = list(keys)
+        for key in self.keys:
+            if key not in IDENTITY_KEYS:
+                raise ValueError(f"Unknown identity key: {key}")
+        self.id_index = id_index
+        self.key_store = key_store
+        self.tables: Dict[str, Set[Any]] = {key: set() for key in self.keys}
+        self.match_counts: Counter = Counter()
+
+    def match(self, book: Dict[str, Any]) -> Optional[IdentityMatch]:
+        """
+        Look a book up in the index.
+
+        Returns:
+            Optional[IdentityMatch]: The first key that matched, or None for a new book
+        """
+        for key, value in identity_keys(book, self.keys):
+            if (value in self.tables[key]
+                    or (key == KEY_ID and self.id_index is not None and value in self.id_index)
+                    or (self.key_store is not None and self.key_store.contains(key, value))):
+                self.match_counts[key] += 1
+                return key, value
+        return None
+
+    def add(self, book: Dict[str, Any], keys: Optional[Iterable[str]] = None) -> None:
+        """Register a book under all enabled keys (or only the given subset)."""
+        for key, value in identity_keys(book, self.keys if keys is None else keys):
+            if self.key_store is not None:
+                self.key_store.add(key, value)
+            else:
+                self.tables[key].add(value)
+
+    def add_all(self, books: Iterable[Dict[str, Any]], keys: Optional[Iterable[str]] = None) -> None:
+        """Register every book from an iterable."""
+        for book in books:
+            self.add(book, keys)
+
+    def check_and_add(self, book: Dict[str, Any]) -> Optional[IdentityMatch]:
+        """Look a book up and register it if it is new, in a single pass."""
+        found = self.match(book)
+        if found is None:
+            self.add(book)
+        return found
@@ -0,0 +1,173 @@
+"""
+Compact record type for book catalog entries.
+
+The book scripts hold hundreds of thousands of records with the same ~20 keys.
+As plain dicts, every record carries its own hash table; a Book stores the known
+fields in __slots__ instead and keeps:
+- the key order of the source JSON as a tuple shared by all records with the
+  same layout, so to_json() reproduces the original object exactly;
+- unknown keys (e.g. "reason" on duplicates) in a small per-record dict;
+- repeated category strings (class, publisher, curriculum, ...) interned, so
+  equal values share one string object.
+
+Book is a MutableMapping, so existing code using book.get(), book[key],
+key in book and {**book} keeps working. Use json_default (from catalog_io)
+as the `default` of json.dump/json.dumps to serialize Books.
+"""
+
+import sys
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from catalog_io import CatalogFormatError, iter_catalog
+
+# Fields stored in slots: the catalog keys (UNIQUE_BOOK_KEYS of step_0) and the
+# keys added by step_2. Numeric fields (id, size, page, bookId, originalSize) keep
+# the int values from the JSON as plain ints in their slot.
+BOOK_FIELDS = (
+    "title", "id", "attachment", "filename", "class", "level", "writer",
+    "reviewer", "translator", "designer", "cover_designer", "ilustrator",
+    "editor", "publisher", "isbn", "curriculum", "edition", "book_type",
+    "cloud", "size", "page",
+    "bookId", "cloudFile", "source", "originalSize",
+)
+
+# Fields with few distinct values, interned on load
+INTERNED_FIELDS = frozenset(["class", "level", "publisher", "curriculum", "edition", "book_type", "source"])
+
+# Slot name of each field ("class" is a keyword)
+_SLOTS: Dict[str, str] = {field: ("class_" if field == "class" else field) for field in BOOK_FIELDS}
+
+# Shared key-order tuples, one per distinct record layout
+_LAYOUTS: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def _layout(keys: Tuple[str, ...]) -> Tuple[str, ...]:
+    layout = _LAYOUTS.get(keys)
+    if layout is None:
+        layout = _LAYOUTS.setdefault(keys, keys)
+    return layout
+
+
+class Book(MutableMapping):
+    """A book catalog record with dict-like access and slot storage."""
+
+    __slots__ = tuple(_SLOTS.values()) + ("_keys", "_extra")
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None, **fields: Any):
+        self._keys: Tuple[str, ...] = ()
+        self._extra: Optional[Dict[str, Any]] = None
+        if data:
+            for key, value in data.items():
+                self[key] = value
+        for key, value in fields.items():
+            self[key] = value
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Book":
+        """Build a Book from a decoded JSON object, keeping its key order."""
+        book = cls.__new__(cls)
+        extra = None
+        for key, value in data.items():
+            slot = _SLOTS.get(key)
+            if slot is None:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+                continue
+            if key in INTERNED_FIELDS and type(value) is str:
+                value = sys.intern(value)
+            setattr(book, slot, value)
+        book._keys = _layout(tuple(data))
+        book._extra = extra
+        return book
+
+    def to_json(self) -> Dict[str, Any]:
+        """The record as a plain dict, with the keys in their original order."""
+        return {key: self[key] for key in self._keys}
+
+    def copy(self, **updates: Any) -> "Book":
+        """A copy of the record; updates are set (or appended) in the given order."""
+        book = Book.from_json(self.to_json())
+        for key, value in updates.items():
+            book[key] = value
+        return book
+
+    def __getitem__(self, key: str) -> Any:
+        slot = _SLOTS.get(key)
+        if slot is not None:
+            try:
+                return getattr(self, slot)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in self:
+            self._keys = _layout(self._keys + (key,))
+        slot = _SLOTS.get(key)
+        if slot is not None:
+            if key in INTERNED_FIELDS and type(value) is str:
+                value = sys.intern(value)
+            setattr(self, slot, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        slot = _SLOTS.get(key)
+        if slot is not None:
+            delattr(self, slot)
+        else:
+            del self._extra[key]
+        self._keys = _layout(tuple(k for k in self._keys if k != key))
+
+    def __contains__(self, key: object) -> bool:
+        slot = _SLOTS.get(key)
+        if slot is not None:
+            return hasattr(self, slot)
+        return self._extra is not None and key in self._extra
+
+    def get(self, key: str, default: Any = None) -> Any:
+        slot = _SLOTS.get(key)
+        if slot is not None:
+            return getattr(self, slot, default)
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __repr__(self) -> str:
+        return f"Book({self.to_json()!r})"
+
+
+def as_books(items: Iterable[Dict[str, Any]]) -> Iterator[Book]:
+    """
+    Convert decoded JSON objects to Books one at a time.
+
+    Raises:
+        CatalogFormatError: If an item is not a JSON object
+    """
+    for item in items:
+        if isinstance(item, Book):
+            yield item
+        elif isinstance(item, dict):
+            yield Book.from_json(item)
+        else:
+            raise CatalogFormatError(f"Expected a book object, got {type(item).__name__}")
+
+
+def load_books(file_path: Union[str, Path]) -> List[Book]:
+    """Read a JSON array or NDJSON file of books, converting each record as it is decoded."""
+    return list(as_books(iter_catalog(file_path)))
@@ -0,0 +1,323 @@
+"""
+Streaming helpers for the book catalog JSON files.
+
+The catalog exports are plain JSON arrays of book objects. These helpers let the
+book scripts read such an array one record at a time and write a new array
+record by record, so peak memory does not grow with the size of the catalog.
+
+Catalogs can also be stored as NDJSON (one compact JSON object per line, files
+ending in .ndjson or .jsonl). iter_catalog() detects the format from the
+content and open_catalog_writer() picks it from the file name, so every script
+reads and writes both.
+
+The array writer produces exactly the same text as
+``json.dump(books, f, ensure_ascii=False, indent=2)``. If orjson is installed,
+records are encoded with it, except for records it could encode differently
+(floats, non-string keys, types it does not know); those go through json, so
+the output is identical either way. Writers write to a temporary file next to
+the target and rename it on success, so an interrupted run never leaves a
+truncated catalog behind.
+"""
+
+import json
+import os
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Union
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Size of each read from the input file when streaming a JSON array
+READ_CHUNK_SIZE = 1 << 20
+
+# File suffixes written as NDJSON instead of a JSON array
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+
+# Catalog formats returned by detect_format()
+FORMAT_ARRAY = "array"
+FORMAT_NDJSON = "ndjson"
+
+_WHITESPACE = " \t\n\r"
+
+
+class CatalogFormatError(ValueError):
+    """Valid JSON that is not a catalog: not an array or NDJSON of book objects."""
+
+
+def json_default(obj: Any) -> Any:
+    """`default` hook for json.dump/json.dumps: serializes records that have a to_json() method (e.g. Book)."""
+    to_json = getattr(obj, "to_json", None)
+    if to_json is None:
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    return to_json()
+
+
+def _needs_stdlib(value: Any) -> bool:
+    """Whether orjson could encode value differently from json (floats, non-str keys, other types)."""
+    value_type = type(value)
+    if value_type is str or value_type is int or value_type is bool or value is None:
+        return False
+    if value_type is dict:
+        return any(type(key) is not str or _needs_stdlib(item) for key, item in value.items())
+    if value_type is list or value_type is tuple:
+        return any(_needs_stdlib(item) for item in value)
+    return True
+
+
+def dumps_record(item: Any, indent: Optional[int] = 2, compact: bool = False) -> str:
+    """
+    Encode one record like json.dumps(item, ensure_ascii=False, indent=indent).
+
+    With compact (and no indent), the separators (",", ":") are used instead.
+    orjson produces the same text for indent=2 and for compact output, so it is
+    only used for those. Records with a to_json() method (e.g. Book) are
+    converted first.
+    """
+    if not isinstance(item, dict) and isinstance(item, Mapping) and hasattr(item, "to_json"):
+        item = item.to_json()
+    compact = compact and indent is None
+    if HAS_ORJSON and (indent == 2 or compact) and not _needs_stdlib(item):
+        try:
+            return orjson.dumps(item, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+        except orjson.JSONEncodeError:
+            pass
+    separators = (",", ":") if compact else None
+    return json.dumps(item, ensure_ascii=False, indent=indent, separators=separators, default=json_default)
+
+
+def loads_record(text: str) -> Any:
+    """Decode one JSON value, with orjson when installed (json for what orjson rejects, e.g. NaN)."""
+    if HAS_ORJSON:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
+
+
+def is_ndjson_path(file_path: Union[str, Path]) -> bool:
+    return str(file_path).lower().endswith(NDJSON_SUFFIXES)
+
+
+def detect_format(file_path: Union[str, Path]) -> str:
+    """
+    FORMAT_ARRAY or FORMAT_NDJSON, from the first non-whitespace character of the file.
+
+    An empty file is NDJSON (no records) if its name says so, otherwise an
+    (invalid) array.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        while True:
+            chunk = f.read(4096)
+            if not chunk:
+                return FORMAT_NDJSON if is_ndjson_path(file_path) else FORMAT_ARRAY
+            text = chunk.lstrip(_WHITESPACE)
+            if text:
+                return FORMAT_NDJSON if text[0] == '{' else FORMAT_ARRAY
+
+
+def iter_ndjson(file_path: Union[str, Path]) -> Iterator[Any]:
+    """
+    Yield the records of an NDJSON file, one line at a time. Blank lines are skipped.
+
+    Raises:
+        ValueError: If a line is not valid JSON
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line_num, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield loads_record(line)
+            except ValueError as e:
+                raise ValueError(f"Invalid JSON on line {line_num} of {file_path}: {e}") from None
+
+
+def iter_catalog(file_path: Union[str, Path]) -> Iterator[Any]:
+    """Yield the records of a JSON array or NDJSON file (detected from its content)."""
+    if detect_format(file_path) == FORMAT_NDJSON:
+        return iter_ndjson(file_path)
+    return iter_json_array(file_path)
+
+
+def iter_json_array(file_path: Union[str, Path], chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Any]:
+    """
+    Yield the items of a top-level JSON array without loading the whole file.
+
+    Args:
+        file_path (Union[str, Path]): Path to the JSON file
+        chunk_size (int): Number of characters read from the file at a time
+
+    Yields:
+        Any: Each decoded array item, in file order
+    """
+    decoder = json.JSONDecoder()
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        buffer = ""
+        pos = 0
+        eof = False
+
+        def fill() -> bool:
+            nonlocal buffer, pos, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+                return False
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            return True
+
+        def skip_whitespace() -> None:
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                    pos += 1
+                if pos < len(buffer) or not fill():
+                    return
+
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise ValueError(f"{file_path} is empty")
+        if buffer[pos] != '[':
+            raise CatalogFormatError(f"{file_path} does not contain a JSON array")
+        pos += 1
+
+        skip_whitespace()
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+
+        while True:
+            skip_whitespace()
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                    break
+                except json.JSONDecodeError:
+                    # The item may be cut off at the end of the buffer
+                    if eof or not fill():
+                        raise
+            # A number at the very end of the buffer may continue in the next chunk
+            if end == len(buffer) and not eof and fill():
+                continue
+            pos = end
+            yield item
+
+            skip_whitespace()
+            if pos >= len(buffer):
+                raise ValueError(f"Unexpected end of JSON array in {file_path}")
+            if buffer[pos] == ',':
+                pos += 1
+            elif buffer[pos] == ']':
+                return
+            else:
+                raise ValueError(f"Unexpected character {buffer[pos]!r} in JSON array in {file_path}")
+
+
+class _AtomicWriter:
+    """
+    Base of the catalog writers: writes to a temporary file in the target's
+    directory and renames it over the target when the context exits without an
+    error. On an error the temporary file is removed and the target is untouched.
+    """
+
+    def __init__(self, file_path: Union[str, Path]):
+        self.file_path = file_path
+        self.count = 0
+        self._file = None
+        self._tmp_path = None
+
+    def __enter__(self):
+        path = Path(self.file_path)
+        self._tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        self._file = open(self._tmp_path, 'w', encoding='utf-8')
+        self._start()
+        return self
+
+    def _start(self) -> None:
+        pass
+
+    def _finish(self) -> None:
+        pass
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                self._finish()
+            self._file.close()
+            if exc_type is None:
+                os.replace(self._tmp_path, self.file_path)
+        finally:
+            self._file = None
+            if os.path.exists(self._tmp_path):
+                os.remove(self._tmp_path)
+
+
+class JsonArrayWriter(_AtomicWriter):
+    """
+    Write a JSON array one item at a time.
+
+    Use as a context manager; the closing bracket is written on exit.
+    """
+
+    def __init__(self, file_path: Union[str, Path], indent: Optional[int] = 2):
+        super().__init__(file_path)
+        self.indent = indent
+
+    def _start(self) -> None:
+        self._file.write("[")
+
+    def write(self, item: Dict[str, Any]) -> None:
+        """Append one item to the array."""
+        text = dumps_record(item, self.indent)
+        if self.indent is None:
+            self._file.write(text if self.count == 0 else ", " + text)
+        else:
+            pad = " " * self.indent
+            prefix = "\n" if self.count == 0 else ",\n"
+            self._file.write(prefix + pad + text.replace("\n", "\n" + pad))
+        self.count += 1
+
+    def _finish(self) -> None:
+        if self.count and self.indent is not None:
+            self._file.write("\n")
+        self._file.write("]")
+
+
+class NdjsonWriter(_AtomicWriter):
+    """Write NDJSON (one compact JSON object per line) one item at a time."""
+
+    def write(self, item: Dict[str, Any]) -> None:
+        """Append one item as a line."""
+        self._file.write(dumps_record(item, indent=None, compact=True) + "\n")
+        self.count += 1
+
+
+def open_catalog_writer(file_path: Union[str, Path], indent: Optional[int] = 2, ndjson: Optional[bool] = None) -> _AtomicWriter:
+    """
+    NdjsonWriter for .ndjson/.jsonl paths, otherwise a JsonArrayWriter with the given indent.
+
+    Pass ndjson to choose the format explicitly (e.g. for a temporary file name).
+    """
+    if ndjson is None:
+        ndjson = is_ndjson_path(file_path)
+    if ndjson:
+        return NdjsonWriter(file_path)
+    return JsonArrayWriter(file_path, indent)
+
+
+def save_catalog(items: Iterable[Any], file_path: Union[str, Path], indent: Optional[int] = 2) -> int:
+    """
+    Write items to file_path (JSON array or NDJSON, by file name) atomically.
+
+    Returns:
+        int: Number of items written
+    """
+    with open_catalog_writer(file_path, indent) as writer:
+        for item in items:
+            writer.write(item)
+    return writer.count
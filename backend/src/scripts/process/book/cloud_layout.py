@@ -0,0 +1,107 @@
+"""
+Directory layout of the cloudFile PDFs written by step_2_renumber.py --process.
+
+By default every PDF is written directly into output_dir ("flat"). With many
+thousands of files, listings and lookups in that single directory get slow, so
+the files can be spread over subdirectories instead:
+
+    digit  {bookId // 1000}/{cloudFile}
+           e.g. 0/0001_c4ca.pdf, 5/5001_03b2.pdf, 12/12001_ba3a.pdf; the same
+           directory as the app's PDF URL (getBookPdfUrl: pdf/{bookId/1000}/)
+           and the image store ({bookId/1000}/{size}/{bookId})
+    hash   {h1}/{h2}/.../{cloudFile} with `levels` levels of two hex digits of
+           the MD5 of the cloudFile name (256 directories per level), for an
+           even spread regardless of the ID range
+
+The manifest (cloud_manifest.json) maps each bookId to the relative path of its
+PDF and records the number of files per shard.
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterable, Tuple
+
+SHARD_FLAT = "flat"
+SHARD_DIGIT = "digit"
+SHARD_HASH = "hash"
+SHARD_MODES = [SHARD_FLAT, SHARD_DIGIT, SHARD_HASH]
+
+# Hex digits of the hash per directory level
+HASH_LEVEL_WIDTH = 2
+MAX_HASH_LEVELS = 4
+
+# Default manifest file name in output_dir
+SHARD_MANIFEST_NAME = "cloud_manifest.json"
+
+
+def shard_dir(book_id: Any, cloud_file: str, mode: str = SHARD_FLAT, levels: int = 1) -> str:
+    """Relative directory of a book's cloudFile ("" for the flat layout), with "/" separators."""
+    if mode == SHARD_FLAT:
+        return ""
+    if mode == SHARD_DIGIT:
+        return str(int(book_id) // 1000)
+    if mode == SHARD_HASH:
+        digest = hashlib.md5(cloud_file.encode('utf-8')).hexdigest()
+        return "/".join(digest[i * HASH_LEVEL_WIDTH:(i + 1) * HASH_LEVEL_WIDTH] for i in range(levels))
+    raise ValueError(f"Unknown shard mode: {mode}")
+
+
+def shard_path(book_id: Any, cloud_file: str, mode: str = SHARD_FLAT, levels: int = 1) -> str:
+    """Relative path of a book's cloudFile under output_dir, with "/" separators."""
+    directory = shard_dir(book_id, cloud_file, mode, levels)
+    return f"{directory}/{cloud_file}" if directory else cloud_file
+
+
+class ShardManifest:
+    """bookId -> relative path of the PDF, with per-shard file counts."""
+
+    def __init__(self, mode: str = SHARD_FLAT, levels: int = 1):
+        self.mode = mode
+        self.levels = levels if mode == SHARD_HASH else 0
+        self.files: Dict[str, str] = {}
+        self.shard_counts: Dict[str, int] = {}
+        self._paths = set()
+
+    def add(self, book_id: Any, cloud_file: str) -> str:
+        """Record a book and return the relative path of its PDF."""
+        relpath = shard_path(book_id, cloud_file, self.mode, self.levels)
+        self.files[str(book_id)] = relpath
+        # A book recorded twice counts once
+        if relpath not in self._paths:
+            self._paths.add(relpath)
+            shard = shard_dir(book_id, cloud_file, self.mode, self.levels)
+            self.shard_counts[shard] = self.shard_counts.get(shard, 0) + 1
+        return relpath
+
+    def shard_dirs(self) -> Iterable[str]:
+        return (shard for shard in self.shard_counts if shard)
+
+    def balance(self) -> Tuple[int, int, float]:
+        """(smallest shard, largest shard, mean files per shard)."""
+        counts = list(self.shard_counts.values())
+        if not counts:
+            return 0, 0, 0.0
+        return min(counts), max(counts), sum(counts) / len(counts)
+
+    def print_summary(self, max_shards: int = 16) -> None:
+        smallest, largest, mean = self.balance()
+        print(f"Shard layout: {self.mode}" + (f" ({self.levels} level(s))" if self.mode == SHARD_HASH else ""))
+        print(f"Files: {len(self._paths)} in {len(self.shard_counts)} shard(s); smallest {smallest}, largest {largest}, mean {mean:.1f}")
+        if len(self.shard_counts) <= max_shards:
+            for shard, count in sorted(self.shard_counts.items()):
+                print(f"  {shard or '.'}: {count}")
+
+    def save(self, path: str) -> None:
+        """Write the manifest as JSON (to a temporary name first, then renamed)."""
+        smallest, largest, mean = self.balance()
+        data = {
+            "layout": {"mode": self.mode, "levels": self.levels},
+            "shards": dict(sorted(self.shard_counts.items())),
+            "balance": {"smallest": smallest, "largest": largest, "mean": round(mean, 1)},
+            "files": self.files,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
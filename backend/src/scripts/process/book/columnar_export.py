@@ -0,0 +1,254 @@
+"""
+Columnar export of the renumbered books (step_2_renumber.py --output_columnar).
+
+Reports over the catalog (size distribution, pages per class, curriculum
+breakdown) only need a few fields, so they are exported as typed columns:
+
+    bookId      int64   MISSING_BOOK_ID for books whose PDF was not found
+    size        int64   bytes
+    page        int32
+    class       dictionary-encoded string
+    curriculum  dictionary-encoded string
+    publisher   dictionary-encoded string
+
+The format is chosen by the file name:
+- .parquet: Apache Parquet via pyarrow, strings as dictionary columns
+- .npz: NumPy archive; each string column is an int32 code array "<name>"
+  plus its values "<name>__categories"
+
+load_columns() reads either format into NumPy arrays (codes and categories for
+the string columns), and the reports below aggregate them with bincount and
+histogram instead of Python loops.
+
+Usage:
+    python process/columnar_export.py renumbered_books.npz
+    python process/columnar_export.py renumbered_books.parquet --bins_mb 1 5 10 25 50 100
+"""
+
+import argparse
+import os
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Numeric columns and their array typecode / dtype
+NUMERIC_COLUMNS = {"bookId": ("q", "int64"), "size": ("q", "int64"), "page": ("i", "int32")}
+# Dictionary-encoded string columns
+STRING_COLUMNS = ["class", "curriculum", "publisher"]
+COLUMNS = list(NUMERIC_COLUMNS) + STRING_COLUMNS
+
+# bookId of books without a selected PDF
+MISSING_BOOK_ID = -1
+# Suffix of the categories array of a string column in .npz files
+CATEGORIES_SUFFIX = "__categories"
+
+FORMAT_SUFFIXES = (".parquet", ".npz")
+
+# Default size distribution bins, in MB
+DEFAULT_BINS_MB = [1, 5, 10, 25, 50, 100, 250]
+
+
+def _int_value(value: Any, default: int = 0) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def build_columns(books: Iterable[Dict[str, Any]]) -> Tuple[Dict[str, array], Dict[str, Tuple[array, List[str]]]]:
+    """
+    Collect the exported fields in one pass.
+
+    Returns:
+        Tuple: (numeric columns as typed arrays, string columns as (int32 codes, categories))
+    """
+    numeric = {name: array(typecode) for name, (typecode, _) in NUMERIC_COLUMNS.items()}
+    codes = {name: array("i") for name in STRING_COLUMNS}
+    lookups: Dict[str, Dict[str, int]] = {name: {} for name in STRING_COLUMNS}
+
+    for book in books:
+        numeric["bookId"].append(_int_value(book.get("bookId"), MISSING_BOOK_ID))
+        numeric["size"].append(_int_value(book.get("size")))
+        numeric["page"].append(_int_value(book.get("page")))
+        for name in STRING_COLUMNS:
+            value = book.get(name)
+            value = "" if value is None else str(value)
+            lookup = lookups[name]
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(lookup)
+            codes[name].append(code)
+
+    strings = {name: (codes[name], list(lookups[name])) for name in STRING_COLUMNS}
+    return numeric, strings
+
+
+def columnar_format(file_path: Union[str, Path]) -> str:
+    """
+    Format suffix (".parquet" or ".npz") of file_path.
+
+    Raises:
+        ValueError: If the file name has no supported suffix
+        RuntimeError: If the library needed for the format is not installed
+    """
+    suffix = Path(file_path).suffix.lower()
+    if suffix not in FORMAT_SUFFIXES:
+        raise ValueError(f"Unsupported columnar format {suffix!r} (use {' or '.join(FORMAT_SUFFIXES)})")
+    if suffix == ".parquet" and not HAS_PYARROW:
+        raise RuntimeError("pyarrow is required for Parquet export. Install it with: pip install pyarrow")
+    if suffix == ".npz" and not HAS_NUMPY:
+        raise RuntimeError("NumPy is required for .npz export. Install it with: pip install numpy")
+    return suffix
+
+
+def export_columnar(books: Iterable[Dict[str, Any]], file_path: Union[str, Path]) -> int:
+    """
+    Write the columnar export of books to file_path (.parquet or .npz).
+
+    The file is written under a temporary name and renamed when complete.
+
+    Returns:
+        int: Number of rows written
+    """
+    suffix = columnar_format(file_path)
+    numeric, strings = build_columns(books)
+    rows = len(numeric["bookId"])
+    path = Path(file_path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+    try:
+        if suffix == ".parquet":
+            fields = {name: pa.array(numeric[name], type=getattr(pa, dtype)()) for name, (_, dtype) in NUMERIC_COLUMNS.items()}
+            for name, (codes, categories) in strings.items():
+                fields[name] = pa.DictionaryArray.from_arrays(pa.array(codes, type=pa.int32()), pa.array(categories, type=pa.string()))
+            pq.write_table(pa.table(fields), tmp_path)
+        else:
+            arrays = {name: np.frombuffer(numeric[name], dtype=dtype) for name, (_, dtype) in NUMERIC_COLUMNS.items()}
+            for name, (codes, categories) in strings.items():
+                arrays[name] = np.frombuffer(codes, dtype=np.int32)
+                arrays[name + CATEGORIES_SUFFIX] = np.array(categories, dtype=str)
+            with open(tmp_path, "wb") as f:
+                np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return rows
+
+
+def load_columns(file_path: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Load a columnar export as NumPy arrays.
+
+    Returns:
+        Dict[str, Any]: The numeric columns, and for each string column its int32
+        codes under "<name>" and its values under "<name>__categories"
+    """
+    suffix = columnar_format(file_path)
+    if not HAS_NUMPY:
+        raise RuntimeError("NumPy is required to load columnar exports. Install it with: pip install numpy")
+
+    if suffix == ".npz":
+        with np.load(file_path, allow_pickle=False) as data:
+            return {name: data[name] for name in data.files}
+
+    table = pq.read_table(file_path, columns=COLUMNS, read_dictionary=STRING_COLUMNS)
+    columns: Dict[str, Any] = {}
+    for name, (_, dtype) in NUMERIC_COLUMNS.items():
+        columns[name] = table.column(name).to_numpy().astype(dtype, copy=False)
+    for name in STRING_COLUMNS:
+        # Row groups may carry different dictionaries
+        column = table.column(name).unify_dictionaries().combine_chunks()
+        columns[name] = column.indices.to_numpy(zero_copy_only=False).astype(np.int32, copy=False)
+        columns[name + CATEGORIES_SUFFIX] = np.array(column.dictionary.to_pylist(), dtype=str)
+    return columns
+
+
+def found_mask(columns: Dict[str, Any]) -> Any:
+    """Boolean mask of the books with a selected PDF."""
+    return columns["bookId"] != MISSING_BOOK_ID
+
+
+def group_totals(columns: Dict[str, Any], by: str) -> List[Dict[str, Any]]:
+    """
+    Books, pages and bytes per value of a string column (found books only),
+    largest groups first.
+    """
+    mask = found_mask(columns)
+    codes = columns[by][mask]
+    categories = columns[by + CATEGORIES_SUFFIX]
+    length = len(categories)
+    books = np.bincount(codes, minlength=length)
+    pages = np.bincount(codes, weights=columns["page"][mask], minlength=length)
+    sizes = np.bincount(codes, weights=columns["size"][mask], minlength=length)
+
+    order = np.argsort(-books, kind="stable")
+    return [
+        {
+            by: str(categories[i]),
+            "books": int(books[i]),
+            "pages": int(pages[i]),
+            "mean_pages": round(float(pages[i] / books[i]), 1),
+            "size_mb": round(float(sizes[i]) / (1 << 20), 1),
+        }
+        for i in order if books[i]
+    ]
+
+
+def size_distribution(columns: Dict[str, Any], bins_mb: List[float]) -> List[Dict[str, Any]]:
+    """Number of found books per file size range; the last range is open-ended."""
+    sizes_mb = columns["size"][found_mask(columns)] / (1 << 20)
+    edges = np.array([0.0] + sorted(bins_mb) + [np.inf])
+    counts, _ = np.histogram(sizes_mb, bins=edges)
+    return [
+        {"from_mb": float(edges[i]), "to_mb": None if np.isinf(edges[i + 1]) else float(edges[i + 1]), "books": int(counts[i])}
+        for i in range(len(counts))
+    ]
+
+
+def print_reports(columns: Dict[str, Any], bins_mb: List[float]) -> None:
+    mask = found_mask(columns)
+    print(f"Books: {len(mask)} ({int(mask.sum())} with a PDF)")
+    print(f"Total size: {columns['size'][mask].sum() / (1 << 30):.2f} GB, pages: {int(columns['page'][mask].sum())}")
+
+    print("\nSize distribution:")
+    for row in size_distribution(columns, bins_mb):
+        upper = f"{row['to_mb']:g} MB" if row["to_mb"] is not None else "..."
+        print(f"  {row['from_mb']:g} MB - {upper}: {row['books']}")
+
+    for by in STRING_COLUMNS:
+        print(f"\nBy {by}:")
+        for row in group_totals(columns, by):
+            print(f"  {row[by] or '(empty)'}: {row['books']} books, {row['pages']} pages (mean {row['mean_pages']}), {row['size_mb']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print catalog reports from a columnar export of step_2_renumber.py.")
+    parser.add_argument("input_file", help="Columnar export (.parquet or .npz) written with --output_columnar")
+    parser.add_argument("--bins_mb", nargs='+', type=float, default=DEFAULT_BINS_MB, help=f"Size distribution bin edges in MB (default: {' '.join(map(str, DEFAULT_BINS_MB))})")
+
+    args = parser.parse_args()
+
+    try:
+        columns = load_columns(args.input_file)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"Error loading {args.input_file}: {e}")
+        return
+    print_reports(columns, args.bins_mb)
+
+
+if __name__ == "__main__":
+    main()
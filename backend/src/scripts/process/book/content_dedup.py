@@ -0,0 +1,194 @@
+"""
+Duplicate-content detection for the PDF mirrors.
+
+Finds files with byte-identical content, both the same attachment stored in
+several mirrors and different attachment names that are really the same PDF.
+Hashing every file is avoided in three stages:
+
+1. Files are grouped by size; a file with a unique size has no duplicate.
+2. Within a size group, a cheap signature of the first and last block of each
+   file splits the group further.
+3. Only files that still collide are hashed in full (SHA-256, streamed in large
+   chunks) across a worker pool. Hashes already in the PDF meta cache are reused.
+
+The result is a list of clusters written as a JSON report. step_2_renumber.py
+reads it (--duplicates) to place the PDF of every book whose selected copy is in
+a cluster as a link to the first such book's file instead of another full copy.
+"""
+
+import concurrent.futures
+import hashlib
+import json
+import os
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from parallel import bounded_map
+from pdf_meta_cache import PdfMeta, PdfMetaCache, file_sha256
+
+# Bytes read from the start and the end of a file for the prefilter signature
+PREFILTER_BLOCK_SIZE = 64 << 10
+
+
+class ContentFile(NamedTuple):
+    filename: str
+    label: str
+    path: str
+    size: int
+    mtime_ns: int
+
+
+class DuplicateCluster(NamedTuple):
+    sha256: str
+    size: int
+    files: List[ContentFile]
+
+    @property
+    def filenames(self) -> List[str]:
+        """Distinct attachment filenames in the cluster, in first-seen order."""
+        return list(dict.fromkeys(f.filename for f in self.files))
+
+
+def path_key(path: str) -> str:
+    """Key identifying a file by its resolved path."""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def block_signature(path: str, size: int, block_size: int = PREFILTER_BLOCK_SIZE) -> Optional[str]:
+    """Hash of the first and last block of a file, or None if it cannot be read."""
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, 'rb') as f:
+            digest.update(f.read(block_size))
+            if size > block_size:
+                f.seek(max(block_size, size - block_size))
+                digest.update(f.read(block_size))
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def _signature_task(item: ContentFile) -> Optional[str]:
+    return block_signature(item.path, item.size)
+
+
+def _hash_task(path: str) -> Optional[str]:
+    try:
+        return file_sha256(path)
+    except OSError:
+        return None
+
+
+def find_duplicate_clusters(files: Iterable[ContentFile], workers: int = 1, meta_cache: Optional[PdfMetaCache] = None) -> Tuple[List[DuplicateCluster], Dict[str, int]]:
+    """
+    Group files with identical content.
+
+    Args:
+        files (Iterable[ContentFile]): Candidate files; the same path listed twice is considered once
+        workers (int): Number of processes hashing files in parallel
+        meta_cache (Optional[PdfMetaCache]): Cache of SHA-256 values per (path, size, mtime)
+
+    Returns:
+        Tuple[List[DuplicateCluster], Dict[str, int]]: Clusters of two or more files
+            (largest first), and counters for each stage
+    """
+    unique: Dict[str, ContentFile] = {}
+    for item in files:
+        unique.setdefault(path_key(item.path), item)
+
+    by_size: Dict[int, List[ContentFile]] = defaultdict(list)
+    for item in unique.values():
+        by_size[item.size].append(item)
+    size_groups = [group for group in by_size.values() if len(group) > 1]
+
+    stats = {
+        "files": len(unique),
+        "size_groups": len(size_groups),
+        "size_candidates": sum(len(group) for group in size_groups),
+        "prefilter_candidates": 0,
+        "hashed": 0,
+        "hash_cache_hits": 0,
+        "unreadable": 0,
+    }
+
+    # Stage 2: first/last block signature (I/O bound, so threads are enough)
+    to_sign = [item for group in size_groups for item in group]
+    by_signature: Dict[Tuple[int, str], List[ContentFile]] = defaultdict(list)
+    signatures = bounded_map(_signature_task, to_sign, workers, executor_cls=concurrent.futures.ThreadPoolExecutor)
+    for item, signature in zip(to_sign, signatures):
+        if signature is None:
+            stats["unreadable"] += 1
+            continue
+        by_signature[(item.size, signature)].append(item)
+    to_hash = [item for group in by_signature.values() if len(group) > 1 for item in group]
+    stats["prefilter_candidates"] = len(to_hash)
+
+    # Stage 3: full hash of the remaining candidates
+    hashes: Dict[str, str] = {}
+    if meta_cache:
+        for item in to_hash:
+            meta = meta_cache.get(item.path, item.size, item.mtime_ns)
+            if meta is not None and meta.sha256:
+                hashes[item.path] = meta.sha256
+        stats["hash_cache_hits"] = len(hashes)
+    uncached = [item for item in to_hash if item.path not in hashes]
+    if uncached:
+        print(f"Hashing {len(uncached)} candidate files with {max(1, workers)} worker(s)...")
+    for item, sha256 in zip(uncached, bounded_map(_hash_task, (item.path for item in uncached), workers)):
+        if sha256 is None:
+            stats["unreadable"] += 1
+            continue
+        hashes[item.path] = sha256
+        stats["hashed"] += 1
+        if meta_cache:
+            meta_cache.put(item.path, item.size, item.mtime_ns, PdfMeta(None, sha256, None))
+
+    by_hash: Dict[str, List[ContentFile]] = defaultdict(list)
+    for item in to_hash:
+        if item.path in hashes:
+            by_hash[hashes[item.path]].append(item)
+
+    clusters = [DuplicateCluster(sha256, group[0].size, group) for sha256, group in by_hash.items() if len(group) > 1]
+    clusters.sort(key=lambda c: (-c.size * (len(c.files) - 1), c.sha256))
+    return clusters, stats
+
+
+def save_duplicate_report(clusters: List[DuplicateCluster], stats: Dict[str, int], output_file: str) -> None:
+    """
+    Write the duplicate clusters as JSON.
+
+    Each cluster lists its files (mirror label, filename, path) and the distinct
+    attachment filenames; "wasted_bytes" is what storing only one copy would save.
+    """
+    report_clusters = []
+    for cluster in clusters:
+        report_clusters.append({
+            "sha256": cluster.sha256,
+            "size": cluster.size,
+            "filenames": cluster.filenames,
+            "files": [{"label": f.label, "filename": f.filename, "path": f.path} for f in cluster.files],
+        })
+    summary = dict(stats)
+    summary["clusters"] = len(clusters)
+    summary["clusters_with_different_names"] = sum(1 for c in clusters if len(c.filenames) > 1)
+    summary["wasted_bytes"] = sum(c.size * (len(c.files) - 1) for c in clusters)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump({"summary": summary, "clusters": report_clusters}, f, indent=2, ensure_ascii=False)
+
+
+def load_duplicate_groups(report_file: str) -> Dict[str, int]:
+    """
+    Read a duplicate report and map the path of each file to its cluster number.
+
+    Clusters are keyed on the physical copies (see path_key), not on attachment
+    filenames: a filename can have copies with different content in different
+    mirrors, so only the copy a book actually selected says which cluster it is in.
+    """
+    with open(report_file, 'r', encoding='utf-8') as f:
+        report = json.load(f)
+    groups: Dict[str, int] = {}
+    for number, cluster in enumerate(report.get("clusters", [])):
+        for item in cluster.get("files", []):
+            if item.get("path"):
+                groups[path_key(item["path"])] = number
+    return groups
@@ -0,0 +1,248 @@
+"""
+Parallel, resumable file copy used by step_2_renumber.py --process.
+
+- Files are copied by a bounded thread pool.
+- Data is copied kernel-side with os.copy_file_range or os.sendfile where the
+  platform supports it, falling back to a buffered copy.
+- With link_mode "hardlink" or "reflink", files on the same filesystem are
+  linked or cloned instead of copied (falling back to a copy when not possible).
+- A destination that already has the same size and content is skipped. The
+  content check uses the journal when possible and a SHA-256 comparison otherwise.
+- Every finished file is appended to a JSON-lines journal. An interrupted run
+  resumes where it stopped. Copies are written to a ".part" file and renamed
+  into place, so a half-written destination never looks complete.
+"""
+
+import concurrent.futures
+import errno
+import json
+import os
+import shutil
+import sys
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from parallel import bounded_map
+from pdf_meta_cache import file_sha256
+
+LINK_NONE = "none"
+LINK_HARDLINK = "hardlink"
+LINK_REFLINK = "reflink"
+LINK_MODES = [LINK_NONE, LINK_HARDLINK, LINK_REFLINK]
+
+ACTION_COPIED = "copied"
+ACTION_LINKED = "linked"
+ACTION_SKIPPED = "skipped"
+ACTION_FAILED = "failed"
+
+# Bytes per kernel copy call
+COPY_CHUNK_SIZE = 64 << 20
+# Linux ioctl to clone a file's extents (btrfs, xfs, ...)
+FICLONE = 0x40049409
+# Journal entries written between flushes to disk
+JOURNAL_FLUSH_EVERY = 64
+
+
+class CopyTask(NamedTuple):
+    src: str
+    dest: str
+
+
+class CopyResult(NamedTuple):
+    task: CopyTask
+    action: str
+    bytes: int
+    error: Optional[str] = None
+
+
+def _kernel_copy(fsrc, fdst, size: int) -> None:
+    """Copy size bytes between open files, kernel-side when possible."""
+    in_fd, out_fd = fsrc.fileno(), fdst.fileno()
+    offset = 0
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            while offset < size:
+                copied = os.copy_file_range(in_fd, out_fd, min(COPY_CHUNK_SIZE, size - offset), offset, offset)
+                if copied == 0:
+                    break
+                offset += copied
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EPERM):
+                raise
+
+    if offset < size and hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        try:
+            while offset < size:
+                sent = os.sendfile(out_fd, in_fd, offset, min(COPY_CHUNK_SIZE, size - offset))
+                if sent == 0:
+                    break
+                offset += sent
+        except OSError as e:
+            if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                raise
+
+    if offset < size:
+        fsrc.seek(offset)
+        fdst.seek(offset)
+        shutil.copyfileobj(fsrc, fdst, 4 << 20)
+
+
+def _reflink(fsrc, fdst) -> bool:
+    try:
+        import fcntl
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return True
+    except (ImportError, OSError):
+        return False
+
+
+class CopyEngine:
+    """
+    Copy many files with a thread pool, skipping identical destinations and
+    recording progress in a journal.
+
+    Args:
+        workers (int): Number of copy threads
+        link_mode (str): One of LINK_MODES
+        journal_path (Optional[str]): JSON-lines journal used to resume interrupted runs
+        verify_hash (bool): Compare SHA-256 of same-size files not covered by the journal
+            (if False, equal size is enough to skip)
+    """
+
+    def __init__(self, workers: int = 4, link_mode: str = LINK_NONE, journal_path: Optional[str] = None, verify_hash: bool = True):
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"Unknown link mode: {link_mode}")
+        self.workers = max(1, workers)
+        self.link_mode = link_mode
+        self.journal_path = journal_path
+        self.verify_hash = verify_hash
+        self.journal: Dict[str, Dict] = self._load_journal()
+
+    def _load_journal(self) -> Dict[str, Dict]:
+        journal: Dict[str, Dict] = {}
+        if not self.journal_path or not os.path.exists(self.journal_path):
+            return journal
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    journal[entry["dest"]] = entry
+                except (ValueError, KeyError):
+                    # A line cut off by an interruption
+                    continue
+        return journal
+
+    def _is_identical(self, task: CopyTask, src_stat: os.stat_result) -> bool:
+        try:
+            dest_stat = os.stat(task.dest)
+        except FileNotFoundError:
+            return False
+        if dest_stat.st_size != src_stat.st_size:
+            return False
+        if os.path.samestat(src_stat, dest_stat):
+            return True
+        entry = self.journal.get(task.dest)
+        if entry and entry.get("src") == task.src and entry.get("size") == src_stat.st_size \
+                and entry.get("src_mtime_ns") == src_stat.st_mtime_ns and entry.get("dest_mtime_ns") == dest_stat.st_mtime_ns:
+            return True
+        if not self.verify_hash:
+            return True
+        return file_sha256(task.src) == file_sha256(task.dest)
+
+    def _link(self, task: CopyTask, tmp_path: str, src_stat: os.stat_result) -> bool:
+        dest_dir = os.path.dirname(os.path.abspath(task.dest))
+        if os.stat(dest_dir).st_dev != src_stat.st_dev:
+            return False
+        if self.link_mode == LINK_HARDLINK:
+            try:
+                os.link(task.src, tmp_path)
+                return True
+            except OSError:
+                return False
+        with open(task.src, 'rb') as fsrc, open(tmp_path, 'wb') as fdst:
+            cloned = _reflink(fsrc, fdst)
+        if cloned:
+            shutil.copystat(task.src, tmp_path)
+        else:
+            os.remove(tmp_path)
+        return cloned
+
+    def copy_one(self, task: CopyTask) -> CopyResult:
+        """Copy (or link) a single file; never raises."""
+        tmp_path = task.dest + ".part"
+        try:
+            src_stat = os.stat(task.src)
+            if self._is_identical(task, src_stat):
+                return CopyResult(task, ACTION_SKIPPED, 0)
+
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if self.link_mode != LINK_NONE and self._link(task, tmp_path, src_stat):
+                os.replace(tmp_path, task.dest)
+                return CopyResult(task, ACTION_LINKED, 0)
+
+            with open(task.src, 'rb') as fsrc, open(tmp_path, 'wb') as fdst:
+                _kernel_copy(fsrc, fdst, src_stat.st_size)
+            shutil.copystat(task.src, tmp_path)
+            os.replace(tmp_path, task.dest)
+            return CopyResult(task, ACTION_COPIED, src_stat.st_size)
+        except Exception as e:
+            try:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            except OSError:
+                pass
+            return CopyResult(task, ACTION_FAILED, 0, str(e))
+
+    def _record(self, journal_file, task: CopyTask) -> None:
+        try:
+            src_stat = os.stat(task.src)
+            dest_stat = os.stat(task.dest)
+        except OSError:
+            return
+        entry = {
+            "src": task.src,
+            "dest": task.dest,
+            "size": src_stat.st_size,
+            "src_mtime_ns": src_stat.st_mtime_ns,
+            "dest_mtime_ns": dest_stat.st_mtime_ns,
+        }
+        self.journal[task.dest] = entry
+        journal_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def run(self, tasks: Iterable[CopyTask]) -> List[CopyResult]:
+        """
+        Copy all tasks and print a summary with throughput.
+
+        Returns:
+            List[CopyResult]: Failed copies only (successes are in the journal and summary)
+        """
+        counts = {ACTION_COPIED: 0, ACTION_LINKED: 0, ACTION_SKIPPED: 0, ACTION_FAILED: 0}
+        failures: List[CopyResult] = []
+        copied_bytes = 0
+        start = time.perf_counter()
+
+        journal_file = open(self.journal_path, 'a', encoding='utf-8') if self.journal_path else None
+        try:
+            results = bounded_map(self.copy_one, tasks, self.workers, executor_cls=concurrent.futures.ThreadPoolExecutor)
+            for i, result in enumerate(results, start=1):
+                counts[result.action] += 1
+                copied_bytes += result.bytes
+                if result.action == ACTION_FAILED:
+                    failures.append(result)
+                elif journal_file and (result.action != ACTION_SKIPPED or result.task.dest not in self.journal):
+                    # Also record skips verified by hash, so the next run does not hash them again
+                    self._record(journal_file, result.task)
+                if journal_file and i % JOURNAL_FLUSH_EVERY == 0:
+                    journal_file.flush()
+        finally:
+            if journal_file:
+                journal_file.close()
+
+        elapsed = time.perf_counter() - start
+        rate = copied_bytes / elapsed / (1 << 20) if elapsed > 0 else 0.0
+        print(f"Copy summary: {counts[ACTION_COPIED]} copied, {counts[ACTION_LINKED]} linked, "
+              f"{counts[ACTION_SKIPPED]} skipped (identical), {counts[ACTION_FAILED]} failed")
+        print(f"Copied {copied_bytes} bytes in {elapsed:.1f}s ({rate:.1f} MB/s, {self.workers} threads)")
+        return failures
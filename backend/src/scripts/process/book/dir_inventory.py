@@ -0,0 +1,141 @@
+"""
+Directory inventory for the PDF source folders.
+
+Each source directory is listed once with os.scandir and kept in memory as
+{filename: FileInfo(size, mtime_ns, inode)}. The book scripts resolve attachment
+filenames against this map instead of calling os.path.exists + os.stat per record,
+which is slow on network-mounted shares.
+
+Inventories can be persisted to a JSON cache file. A cached listing is reused while
+the directory mtime is unchanged (files added, removed or renamed update it); use
+refresh=True to force a new listing after files were modified in place.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Union
+
+
+class FileInfo(NamedTuple):
+    size: int
+    mtime_ns: int
+    inode: int
+
+
+def name_key(filename: str) -> str:
+    """Normalize a filename for lookups (case-insensitive on Windows, like os.path.exists)."""
+    return os.path.normcase(filename)
+
+
+class DirectoryInventory:
+    """
+    In-memory listing of the regular files in one directory.
+    """
+
+    def __init__(self, directory: Union[str, Path], files: Dict[str, FileInfo], dir_mtime_ns: int = 0):
+        self.directory = str(directory)
+        self.files = files
+        self.dir_mtime_ns = dir_mtime_ns
+
+    @classmethod
+    def scan(cls, directory: Union[str, Path]) -> "DirectoryInventory":
+        """List a directory once; a missing directory gives an empty inventory."""
+        files: Dict[str, FileInfo] = {}
+        try:
+            dir_mtime_ns = os.stat(directory).st_mtime_ns
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if not entry.is_file():
+                            continue
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    files[name_key(entry.name)] = FileInfo(st.st_size, st.st_mtime_ns, entry.inode())
+        except OSError as e:
+            print(f"Warning: Cannot list directory {directory}: {e}")
+            dir_mtime_ns = 0
+        return cls(directory, files, dir_mtime_ns)
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __contains__(self, filename: str) -> bool:
+        return name_key(filename) in self.files
+
+    def get(self, filename: str) -> Optional[FileInfo]:
+        """Return the FileInfo of filename, or None if it is not in the directory."""
+        return self.files.get(name_key(filename))
+
+    def path(self, filename: str) -> str:
+        """Full path of filename inside this directory."""
+        return os.path.join(self.directory, filename)
+
+    def is_current(self) -> bool:
+        """Check whether the directory is unchanged since it was listed."""
+        try:
+            return os.stat(self.directory).st_mtime_ns == self.dir_mtime_ns
+        except OSError:
+            return False
+
+    def to_json(self) -> Dict:
+        return {
+            "dir_mtime_ns": self.dir_mtime_ns,
+            "files": {name: list(info) for name, info in self.files.items()},
+        }
+
+    @classmethod
+    def from_json(cls, directory: Union[str, Path], data: Dict) -> "DirectoryInventory":
+        files = {name: FileInfo(*info) for name, info in data.get("files", {}).items()}
+        return cls(directory, files, data.get("dir_mtime_ns", 0))
+
+
+def load_inventories(directories: List[str], cache_file: Optional[str] = None, refresh: bool = False) -> List[DirectoryInventory]:
+    """
+    Get an inventory for each directory, reusing cached listings when possible.
+
+    Args:
+        directories (List[str]): Source directories, in order
+        cache_file (Optional[str]): JSON file used to persist inventories between runs
+        refresh (bool): If True, ignore cached listings and rescan every directory
+
+    Returns:
+        List[DirectoryInventory]: One inventory per directory, in the same order
+    """
+    cached: Dict[str, Dict] = {}
+    if cache_file and not refresh and os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except Exception as e:
+            print(f"Warning: Ignoring unreadable inventory cache {cache_file}: {e}")
+
+    inventories: List[DirectoryInventory] = []
+    changed = False
+    for directory in directories:
+        key = os.path.abspath(directory)
+        inventory = None
+        if key in cached:
+            inventory = DirectoryInventory.from_json(directory, cached[key])
+            if not inventory.is_current():
+                inventory = None
+        if inventory is None:
+            inventory = DirectoryInventory.scan(directory)
+            cached[key] = inventory.to_json()
+            changed = True
+            print(f"Listed {len(inventory)} files in {directory}")
+        else:
+            print(f"Using cached listing of {len(inventory)} files in {directory}")
+        inventories.append(inventory)
+
+    if cache_file and changed:
+        try:
+            tmp_file = f"{cache_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(cached, f, ensure_ascii=False)
+            os.replace(tmp_file, cache_file)
+        except Exception as e:
+            print(f"Warning: Failed to save inventory cache {cache_file}: {e}")
+
+    return inventories
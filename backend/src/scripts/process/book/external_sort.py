@@ -0,0 +1,118 @@
+"""
+External merge sort for book records that do not fit in memory.
+
+Records are buffered in memory until a byte budget is reached, then sorted and
+spilled to a run file on disk (one JSON line per record). Reading back merges
+all runs with a heap (k-way merge), so only one record per run is in memory.
+
+Ties on the sort key keep insertion order, like list.sort().
+"""
+
+import heapq
+import json
+import os
+import tempfile
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from catalog_io import json_default
+
+# Default memory budget for buffered records
+DEFAULT_MEMORY_BUDGET = 256 << 20
+# Rough per-record overhead of the Python objects on top of the JSON text
+RECORD_OVERHEAD = 200
+# Maximum number of run files merged at once; more runs are merged in several passes
+MERGE_FAN_IN = 64
+
+
+class ExternalSorter:
+    """
+    Sort records by key using bounded memory.
+
+    Args:
+        key (Callable[[Any], Any]): Sort key of a record
+        memory_budget (int): Approximate bytes of records buffered before spilling a run
+        tmp_dir (Optional[str]): Directory for run files (default: system temp dir)
+    """
+
+    def __init__(self, key: Callable[[Any], Any], memory_budget: int = DEFAULT_MEMORY_BUDGET, tmp_dir: Optional[str] = None):
+        self.key = key
+        self.memory_budget = memory_budget
+        self.tmp_dir = tmp_dir
+        self.count = 0
+        self.runs: List[str] = []
+        self._buffer: List[Tuple[Any, int, str]] = []
+        self._buffered_bytes = 0
+
+    def add(self, record: Any) -> None:
+        """Add one record (JSON serializable, or a record with to_json())."""
+        line = json.dumps(record, ensure_ascii=False, default=json_default)
+        self._buffer.append((self.key(record), self.count, line))
+        self.count += 1
+        self._buffered_bytes += len(line) + RECORD_OVERHEAD
+        if self._buffered_bytes >= self.memory_budget:
+            self._spill()
+
+    def _spill(self) -> None:
+        if not self._buffer:
+            return
+        self._buffer.sort(key=lambda entry: (entry[0], entry[1]))
+        fd, run_path = tempfile.mkstemp(prefix="run_", suffix=".jsonl", dir=self.tmp_dir)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            for _, seq, line in self._buffer:
+                f.write(f"{seq}\t{line}\n")
+        self.runs.append(run_path)
+        self._buffer = []
+        self._buffered_bytes = 0
+
+    def _read_run(self, run_path: str) -> Iterator[Tuple[Any, int, str]]:
+        with open(run_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                seq, text = line.rstrip("\n").split("\t", 1)
+                yield self.key(json.loads(text)), int(seq), text
+
+    def _merge(self, run_paths: List[str]) -> Iterator[Tuple[Any, int, str]]:
+        streams = [self._read_run(run_path) for run_path in run_paths]
+        return heapq.merge(*streams, key=lambda entry: (entry[0], entry[1]))
+
+    def _reduce_runs(self) -> None:
+        """Merge groups of runs until at most MERGE_FAN_IN are left."""
+        while len(self.runs) > MERGE_FAN_IN:
+            group, rest = self.runs[:MERGE_FAN_IN], self.runs[MERGE_FAN_IN:]
+            fd, run_path = tempfile.mkstemp(prefix="run_", suffix=".jsonl", dir=self.tmp_dir)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                for _, seq, text in self._merge(group):
+                    f.write(f"{seq}\t{text}\n")
+            for old_path in group:
+                os.remove(old_path)
+            self.runs = rest + [run_path]
+
+    def sorted(self) -> Iterator[Any]:
+        """
+        Yield all records in key order and remove the run files.
+
+        If nothing was spilled, the in-memory buffer is sorted directly.
+        """
+        try:
+            if not self.runs:
+                self._buffer.sort(key=lambda entry: (entry[0], entry[1]))
+                for _, _, line in self._buffer:
+                    yield json.loads(line)
+                return
+
+            self._spill()
+            self._reduce_runs()
+            for _, _, text in self._merge(self.runs):
+                yield json.loads(text)
+        finally:
+            self.cleanup()
+
+    def cleanup(self) -> None:
+        """Remove run files and drop buffered records."""
+        for run_path in self.runs:
+            try:
+                os.remove(run_path)
+            except OSError:
+                pass
+        self.runs = []
+        self._buffer = []
+        self._buffered_bytes = 0
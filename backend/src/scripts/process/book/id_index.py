@@ -0,0 +1,204 @@
+"""
+Compact on-disk index of book IDs.
+
+The index is a sorted, de-duplicated array of int64 IDs stored in a small binary
+file. It is built once from the unique book list by streaming the records and
+sorting them in bounded chunks, and later runs memory-map the file instead of
+re-reading the catalog. Membership tests are binary searches over the mapped array,
+so memory use stays flat regardless of the catalog size.
+
+IDs that are not integers (rare in practice) are kept in a JSON sidecar file.
+
+File layout:
+    8 bytes   magic (b"BOOKIDX1")
+    8 bytes   size of the source catalog file
+    8 bytes   mtime (ns) of the source catalog file
+    8 bytes   number of IDs
+    N * 8     sorted IDs (native int64)
+"""
+
+import heapq
+import json
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Iterable, Iterator, List, Optional, Set, Union
+
+INDEX_MAGIC = b"BOOKIDX1"
+HEADER = struct.Struct("<8sqqq")
+
+# Number of IDs sorted in memory at once while building the index
+SORT_CHUNK_SIZE = 1_000_000
+
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+
+
+def normalize_book_id(book_id: Any) -> Any:
+    """Convert a book ID to an integer when possible for consistent comparison."""
+    try:
+        return int(book_id)
+    except (ValueError, TypeError):
+        return book_id
+
+
+def _is_int64(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and INT64_MIN <= value <= INT64_MAX
+
+
+def _read_run(path: str) -> Iterator[int]:
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(8 * 65536)
+            if not block:
+                break
+            ids = array('q')
+            ids.frombytes(block)
+            yield from ids
+
+
+class SortedIdIndex:
+    """
+    Read-only set of book IDs backed by a memory-mapped sorted int64 array.
+    """
+
+    def __init__(self, index_file: Union[str, Path]):
+        self.index_file = Path(index_file)
+        self._file = open(self.index_file, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.source_size, self.source_mtime_ns, count = HEADER.unpack_from(self._mmap, 0)
+        if magic != INDEX_MAGIC:
+            self.close()
+            raise ValueError(f"{index_file} is not a book ID index")
+        self._ids = memoryview(self._mmap)[HEADER.size:HEADER.size + count * 8].cast('q')
+        self.extra_ids: Set[Any] = set()
+        sidecar = self.sidecar_path(self.index_file)
+        if sidecar.exists():
+            with open(sidecar, 'r', encoding='utf-8') as f:
+                self.extra_ids = set(json.load(f))
+
+    @staticmethod
+    def sidecar_path(index_file: Union[str, Path]) -> Path:
+        """Path of the JSON file holding non-integer IDs."""
+        return Path(str(index_file) + ".extra.json")
+
+    def __len__(self) -> int:
+        return len(self._ids) + len(self.extra_ids)
+
+    def __contains__(self, book_id: Any) -> bool:
+        if _is_int64(book_id):
+            i = bisect_left(self._ids, book_id)
+            return i < len(self._ids) and self._ids[i] == book_id
+        return book_id in self.extra_ids
+
+    def is_current(self, source_file: Union[str, Path]) -> bool:
+        """Check whether the index was built from the current version of source_file."""
+        st = os.stat(source_file)
+        return st.st_size == self.source_size and st.st_mtime_ns == self.source_mtime_ns
+
+    def close(self) -> None:
+        """Release the memory map and the underlying file."""
+        if getattr(self, "_ids", None) is not None:
+            self._ids.release()
+            self._ids = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "SortedIdIndex":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    @classmethod
+    def build(cls, ids: Iterable[Any], index_file: Union[str, Path], source_file: Optional[Union[str, Path]] = None, chunk_size: int = SORT_CHUNK_SIZE) -> "SortedIdIndex":
+        """
+        Build an index file from an iterable of IDs and open it.
+
+        IDs are sorted in chunks of chunk_size, spilled to temporary run files and
+        merged, so only one chunk is held in memory at a time.
+
+        Args:
+            ids (Iterable[Any]): Book IDs, in any order; None values are ignored
+            index_file (Union[str, Path]): Destination index file
+            source_file (Optional[Union[str, Path]]): Catalog file the IDs were read from,
+                recorded so later runs can detect a stale index
+            chunk_size (int): Number of IDs sorted in memory at once
+        """
+        index_file = Path(index_file)
+        source_size, source_mtime_ns = 0, 0
+        if source_file is not None:
+            st = os.stat(source_file)
+            source_size, source_mtime_ns = st.st_size, st.st_mtime_ns
+
+        extra_ids: Set[Any] = set()
+        run_files: List[str] = []
+        chunk = array('q')
+        tmp_dir = str(index_file.parent) if str(index_file.parent) else None
+
+        def spill() -> None:
+            nonlocal chunk
+            if not chunk:
+                return
+            fd, run_path = tempfile.mkstemp(prefix=index_file.name + ".", suffix=".run", dir=tmp_dir)
+            with os.fdopen(fd, 'wb') as f:
+                array('q', sorted(chunk)).tofile(f)
+            run_files.append(run_path)
+            chunk = array('q')
+
+        try:
+            for book_id in ids:
+                if book_id is None:
+                    continue
+                book_id = normalize_book_id(book_id)
+                if _is_int64(book_id):
+                    chunk.append(book_id)
+                    if len(chunk) >= chunk_size:
+                        spill()
+                else:
+                    extra_ids.add(book_id)
+            spill()
+
+            count = 0
+            tmp_index = str(index_file) + ".tmp"
+            with open(tmp_index, 'wb') as f:
+                f.write(HEADER.pack(INDEX_MAGIC, source_size, source_mtime_ns, 0))
+                out = array('q')
+                last = None
+                for book_id in heapq.merge(*[_read_run(p) for p in run_files]):
+                    if book_id == last:
+                        continue
+                    last = book_id
+                    out.append(book_id)
+                    if len(out) >= 65536:
+                        out.tofile(f)
+                        count += len(out)
+                        out = array('q')
+                out.tofile(f)
+                count += len(out)
+                f.seek(0)
+                f.write(HEADER.pack(INDEX_MAGIC, source_size, source_mtime_ns, count))
+            os.replace(tmp_index, index_file)
+        finally:
+            for run_path in run_files:
+                try:
+                    os.remove(run_path)
+                except OSError:
+                    pass
+
+        sidecar = cls.sidecar_path(index_file)
+        if extra_ids:
+            with open(sidecar, 'w', encoding='utf-8') as f:
+                json.dump(sorted(extra_ids, key=str), f, ensure_ascii=False)
+        elif sidecar.exists():
+            sidecar.unlink()
+
+        return cls(index_file)
@@ -0,0 +1,116 @@
+"""
+On-disk index of book identity keys (ISBN + class + filename, filename, ...).
+
+The ID key of the unique list is served by the memory-mapped SortedIdIndex; the
+other identity keys are tuples and strings, so they are kept in a small SQLite
+file instead. It is built once by streaming the unique list and reused while
+that file is unchanged (same size and mtime), like the ID index.
+
+Keys registered during a run (new books, so repeats within the new list are
+caught) go to a temporary table, which SQLite spills to disk, and are dropped
+when the index is closed. Lookups are primary-key queries, so memory use stays
+flat regardless of the catalog size.
+"""
+
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Union
+
+from book_identity import identity_keys
+
+# Number of key rows inserted per executemany() while building the index
+BUILD_BATCH_SIZE = 50_000
+
+
+class KeyIndex:
+    """
+    Set of (key name, key value) pairs backed by SQLite, used as the key_store
+    of a BookIdentityIndex.
+    """
+
+    def __init__(self, db_path: Union[str, Path]):
+        self.db_path = Path(db_path)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.executescript("""
+        CREATE TABLE IF NOT EXISTS keys (
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (key, value)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS meta (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TEMP TABLE IF NOT EXISTS added (
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (key, value)
+        ) WITHOUT ROWID;
+        """)
+
+    @staticmethod
+    def _value(value: Any) -> str:
+        return json.dumps(value, ensure_ascii=False)
+
+    def _meta(self) -> Dict[str, str]:
+        return dict(self.conn.execute("SELECT name, value FROM meta;").fetchall())
+
+    def is_current(self, source_file: Union[str, Path], keys: Iterable[str]) -> bool:
+        """Check whether the index was built from the current version of source_file with the same keys."""
+        meta = self._meta()
+        st = os.stat(source_file)
+        return (meta.get("source_size") == str(st.st_size) and meta.get("source_mtime_ns") == str(st.st_mtime_ns)
+                and meta.get("keys") == ",".join(sorted(keys)))
+
+    def rebuild(self, books: Iterable[Dict[str, Any]], keys: List[str], source_file: Union[str, Path]) -> int:
+        """
+        Replace the stored keys with the keys of books.
+
+        Returns:
+            int: Number of distinct keys stored
+        """
+        self.conn.execute("DELETE FROM keys;")
+        self.conn.execute("DELETE FROM meta;")
+        batch = []
+        for book in books:
+            for key, value in identity_keys(book, keys):
+                batch.append((key, self._value(value)))
+            if len(batch) >= BUILD_BATCH_SIZE:
+                self.conn.executemany("INSERT OR IGNORE INTO keys (key, value) VALUES (?, ?);", batch)
+                batch = []
+        self.conn.executemany("INSERT OR IGNORE INTO keys (key, value) VALUES (?, ?);", batch)
+
+        st = os.stat(source_file)
+        self.conn.executemany("INSERT INTO meta (name, value) VALUES (?, ?);", [
+            ("source_size", str(st.st_size)),
+            ("source_mtime_ns", str(st.st_mtime_ns)),
+            ("keys", ",".join(sorted(keys))),
+        ])
+        self.conn.commit()
+        return len(self)
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM keys;").fetchone()[0]
+
+    def contains(self, key: str, value: Any) -> bool:
+        """Check whether a key value is in the stored index or was added during this run."""
+        params = (key, self._value(value))
+        return (self.conn.execute("SELECT 1 FROM keys WHERE key = ? AND value = ?;", params).fetchone() is not None
+                or self.conn.execute("SELECT 1 FROM added WHERE key = ? AND value = ?;", params).fetchone() is not None)
+
+    def add(self, key: str, value: Any) -> None:
+        """Register a key value for the rest of this run (not persisted)."""
+        self.conn.execute("INSERT OR IGNORE INTO added (key, value) VALUES (?, ?);", (key, self._value(value)))
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self) -> "KeyIndex":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
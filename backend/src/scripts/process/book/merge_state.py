@@ -0,0 +1,143 @@
+"""
+Persistent state for incremental runs of step_3_merge_json.py.
+
+The state is a small SQLite file holding:
+- a manifest of the input files already merged, by SHA-256 of their content
+  (with path, size and mtime, so unchanged files are not hashed again);
+- the identity keys (ID, ISBN + class + filename) of every unique book so far;
+- the size and mtime of the unique/duplicate outputs written by the last run,
+  so outputs changed by hand are detected instead of silently merged into.
+
+Identity keys are looked up on demand for the books being merged, so a run only
+touches the keys of the new data, never the whole history.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, Tuple
+
+from book_identity import BookIdentityIndex, identity_keys
+from pdf_meta_cache import file_sha256
+
+
+class MergeState:
+    """
+    SQLite-backed merge state. Use as a context manager; nothing is committed
+    unless commit() is called.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode = WAL;")
+        self.conn.executescript("""
+        CREATE TABLE IF NOT EXISTS inputs (
+            sha256 TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            merged_at INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS identity (
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (key, value)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS outputs (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL
+        );
+        """)
+
+    @staticmethod
+    def _value(value: Any) -> str:
+        return json.dumps(value, ensure_ascii=False)
+
+    @staticmethod
+    def _path_key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def clear(self) -> None:
+        """Forget everything, for a full rebuild."""
+        self.conn.executescript("DELETE FROM inputs; DELETE FROM identity; DELETE FROM outputs;")
+
+    def input_digest(self, path: str) -> Tuple[str, bool]:
+        """
+        SHA-256 of an input file and whether that content was already merged.
+
+        The hash is taken from the manifest when the path, size and mtime match.
+        """
+        st = os.stat(path)
+        row = self.conn.execute(
+            "SELECT sha256 FROM inputs WHERE path = ? AND size = ? AND mtime_ns = ?;",
+            (self._path_key(path), st.st_size, st.st_mtime_ns)
+        ).fetchone()
+        if row:
+            return row[0], True
+        sha256 = file_sha256(path)
+        merged = self.conn.execute("SELECT 1 FROM inputs WHERE sha256 = ?;", (sha256,)).fetchone() is not None
+        return sha256, merged
+
+    def record_input(self, path: str, sha256: str) -> None:
+        st = os.stat(path)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO inputs (sha256, path, size, mtime_ns, merged_at) VALUES (?, ?, ?, ?, ?);",
+            (sha256, self._path_key(path), st.st_size, st.st_mtime_ns, int(time.time()))
+        )
+
+    def seed(self, identity: BookIdentityIndex, book: Dict[str, Any]) -> None:
+        """Load the stored identity keys of one book into the in-memory index."""
+        for key, value in identity_keys(book, identity.keys):
+            table = identity.tables[key]
+            if value in table:
+                continue
+            row = self.conn.execute("SELECT 1 FROM identity WHERE key = ? AND value = ?;", (key, self._value(value))).fetchone()
+            if row:
+                table.add(value)
+
+    def save_identity(self, identity: BookIdentityIndex) -> None:
+        """Store every key of the in-memory index (keys already stored are ignored)."""
+        for key, values in identity.tables.items():
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO identity (key, value) VALUES (?, ?);",
+                ((key, self._value(value)) for value in values)
+            )
+
+    def has_outputs(self) -> bool:
+        return self.conn.execute("SELECT 1 FROM outputs LIMIT 1;").fetchone() is not None
+
+    def outputs_current(self, paths: Iterable[str]) -> bool:
+        """Check that the outputs are exactly the files written by the last run."""
+        for path in paths:
+            row = self.conn.execute("SELECT size, mtime_ns FROM outputs WHERE path = ?;", (self._path_key(path),)).fetchone()
+            try:
+                st = os.stat(path)
+            except OSError:
+                return False
+            if row is None or row != (st.st_size, st.st_mtime_ns):
+                return False
+        return True
+
+    def record_output(self, path: str) -> None:
+        st = os.stat(path)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO outputs (path, size, mtime_ns) VALUES (?, ?, ?);",
+            (self._path_key(path), st.st_size, st.st_mtime_ns)
+        )
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self) -> "MergeState":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
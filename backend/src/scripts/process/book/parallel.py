@@ -0,0 +1,49 @@
+"""
+Bounded parallel map used by the book scripts for per-file work
+(page counting, hashing, optimizing, copying).
+
+Results are yielded in input order, and only a fixed number of tasks are in
+flight at a time, so memory stays flat on large batches.
+"""
+
+import concurrent.futures
+from collections import deque
+from typing import Callable, Iterable, Iterator, Optional, Type, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Number of queued tasks per worker
+IN_FLIGHT_PER_WORKER = 4
+
+
+def bounded_map(fn: Callable[[T], R], items: Iterable[T], workers: int = 1, max_in_flight: Optional[int] = None, executor_cls: Type[concurrent.futures.Executor] = concurrent.futures.ProcessPoolExecutor) -> Iterator[R]:
+    """
+    Apply fn to every item using a pool of workers, yielding results in input order.
+
+    Args:
+        fn (Callable): Function to apply; must be picklable for a process pool
+        items (Iterable): Inputs, consumed lazily
+        workers (int): Number of workers; 1 or less runs fn in the current process
+        max_in_flight (Optional[int]): Maximum number of submitted but unconsumed tasks
+            (default: workers * IN_FLIGHT_PER_WORKER)
+        executor_cls (Type[Executor]): ProcessPoolExecutor for CPU-bound work,
+            ThreadPoolExecutor for I/O-bound work
+
+    Yields:
+        Results of fn, in the order of items
+    """
+    if workers <= 1:
+        for item in items:
+            yield fn(item)
+        return
+
+    limit = max(workers, max_in_flight or workers * IN_FLIGHT_PER_WORKER)
+    with executor_cls(max_workers=workers) as executor:
+        pending: deque = deque()
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= limit:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,124 @@
+"""
+Persistent metadata cache for PDF files.
+
+Stores page count, SHA-256 content hash and encryption flag per PDF in a small
+SQLite file. An entry is only valid while the file's absolute path, size and
+mtime (ns) are unchanged, so re-running a batch after fixing a few records skips
+opening every PDF that did not change. Values that were never computed (for
+example the hash when hashing was not requested) are stored as NULL.
+"""
+
+import hashlib
+import os
+import sqlite3
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+# Bytes read per chunk when hashing a file
+HASH_CHUNK_SIZE = 4 << 20
+
+
+class PdfMeta(NamedTuple):
+    page_count: Optional[int]
+    sha256: Optional[str]
+    encrypted: Optional[bool]
+
+
+def file_sha256(filepath: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """SHA-256 hex digest of a file, read in large chunks."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PdfMetaCache:
+    """
+    SQLite-backed cache of PdfMeta keyed by (absolute path, size, mtime_ns).
+
+    Use as a context manager; pending writes are committed on exit.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        parent = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(parent, exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode = WAL;")
+        self.conn.execute("PRAGMA synchronous = NORMAL;")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS pdf_meta (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            page_count INTEGER,
+            sha256 TEXT,
+            encrypted INTEGER
+        );
+        """)
+        self.hits = 0
+        self.misses = 0
+        self._pending = 0
+
+    @staticmethod
+    def _key(filepath: str) -> str:
+        return os.path.normcase(os.path.abspath(filepath))
+
+    def get(self, filepath: str, size: int, mtime_ns: int) -> Optional[PdfMeta]:
+        """Cached metadata of filepath, or None if missing or the file has changed."""
+        row = self.conn.execute(
+            "SELECT page_count, sha256, encrypted FROM pdf_meta WHERE path = ? AND size = ? AND mtime_ns = ?;",
+            (self._key(filepath), size, mtime_ns)
+        ).fetchone()
+        if row is None:
+            return None
+        page_count, sha256, encrypted = row
+        return PdfMeta(page_count, sha256, None if encrypted is None else bool(encrypted))
+
+    def get_many(self, files: Iterable[Tuple[str, int, int]]) -> Dict[str, PdfMeta]:
+        """Look up several (path, size, mtime_ns) entries; returns {path: PdfMeta} for the hits."""
+        result: Dict[str, PdfMeta] = {}
+        for filepath, size, mtime_ns in files:
+            meta = self.get(filepath, size, mtime_ns)
+            if meta is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                result[filepath] = meta
+        return result
+
+    def put(self, filepath: str, size: int, mtime_ns: int, meta: PdfMeta) -> None:
+        """
+        Store metadata for the current version of filepath.
+
+        Fields that are None keep their cached value if the file is unchanged.
+        """
+        old = self.get(filepath, size, mtime_ns)
+        if old is not None:
+            meta = PdfMeta(*(new if new is not None else cached for new, cached in zip(meta, old)))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pdf_meta (path, size, mtime_ns, page_count, sha256, encrypted) VALUES (?, ?, ?, ?, ?, ?);",
+            (self._key(filepath), size, mtime_ns, meta.page_count, meta.sha256, None if meta.encrypted is None else int(meta.encrypted))
+        )
+        self._pending += 1
+        if self._pending >= 1000:
+            self.commit()
+
+    def commit(self) -> None:
+        self.conn.commit()
+        self._pending = 0
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.commit()
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self) -> "PdfMetaCache":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
@@ -0,0 +1,186 @@
+"""
+Web optimization of the cloudFile PDFs, used by step_2_renumber.py --optimize.
+
+Each selected PDF is rewritten with PyMuPDF in a process pool:
+- unused objects are removed and identical objects (embedded images, fonts,
+  ...) are merged (garbage=4);
+- content, image and font streams are recompressed with deflate;
+- the file is linearized for fast first-page display over byte-range requests
+  when the installed MuPDF still supports it, otherwise objects are packed
+  into compressed object streams.
+
+If the rewritten file is not smaller, the original is kept and copied as usual.
+Results are recorded in a manifest in the output directory, so unchanged
+sources are not optimized again on the next run.
+"""
+
+import json
+import os
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from copy_engine import CopyTask
+from parallel import bounded_map
+
+try:
+    import pymupdf as fitz
+    HAS_PYMUPDF = True
+except ImportError:
+    try:
+        import fitz  # PyMuPDF < 1.24
+        HAS_PYMUPDF = True
+    except ImportError:
+        HAS_PYMUPDF = False
+
+# Save options shared by both attempts
+SAVE_OPTIONS = dict(garbage=4, clean=True, deflate=True, deflate_images=True, deflate_fonts=True)
+
+
+class OptimizeResult(NamedTuple):
+    task: CopyTask
+    original_size: int
+    # Size of the optimized file in task.dest, or None if the original is kept
+    optimized_size: Optional[int]
+    error: Optional[str] = None
+
+
+def _save_optimized(doc, path: str) -> None:
+    try:
+        doc.save(path, linear=True, **SAVE_OPTIONS)
+    except Exception:
+        # Linearization was dropped in recent MuPDF versions
+        doc.save(path, use_objstms=True, **SAVE_OPTIONS)
+
+
+def optimize_pdf(task: CopyTask) -> OptimizeResult:
+    """
+    Write an optimized copy of task.src to task.dest if it is smaller (worker function).
+
+    Never raises; on failure the original is kept and the error is returned.
+    """
+    tmp_path = task.dest + ".part"
+    original_size = 0
+    try:
+        original_size = os.path.getsize(task.src)
+        doc = fitz.open(task.src)
+        try:
+            if doc.needs_pass:
+                # Cannot be rewritten without the password; keep the original
+                return OptimizeResult(task, original_size, None)
+            _save_optimized(doc, tmp_path)
+        finally:
+            doc.close()
+
+        optimized_size = os.path.getsize(tmp_path)
+        if optimized_size >= original_size:
+            os.remove(tmp_path)
+            return OptimizeResult(task, original_size, None)
+        os.replace(tmp_path, task.dest)
+        return OptimizeResult(task, original_size, optimized_size)
+    except Exception as e:
+        try:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        except OSError:
+            pass
+        return OptimizeResult(task, original_size, None, str(e))
+
+
+class PdfOptimizer:
+    """
+    Optimize many PDFs in a process pool, remembering results in a manifest.
+
+    Args:
+        workers (int): Number of processes
+        manifest_path (Optional[str]): JSON file recording the source (size, mtime)
+            and result of every optimized destination
+    """
+
+    def __init__(self, workers: int = 1, manifest_path: Optional[str] = None):
+        if not HAS_PYMUPDF:
+            raise RuntimeError("PyMuPDF is required for PDF optimization. Install it with: pip install PyMuPDF")
+        self.workers = workers
+        self.manifest_path = manifest_path
+        self.manifest: Dict[str, Dict] = {}
+        if manifest_path and os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    self.manifest = json.load(f)
+            except Exception as e:
+                print(f"Warning: Ignoring unreadable optimize manifest {manifest_path}: {e}")
+
+    def _cached(self, task: CopyTask) -> Optional[OptimizeResult]:
+        """Result of a previous run, if the source and destination are unchanged."""
+        entry = self.manifest.get(os.path.basename(task.dest))
+        if not entry or entry.get("src") != task.src:
+            return None
+        try:
+            src_stat = os.stat(task.src)
+        except OSError:
+            return None
+        if entry.get("src_size") != src_stat.st_size or entry.get("src_mtime_ns") != src_stat.st_mtime_ns:
+            return None
+        optimized_size = entry.get("size")
+        if optimized_size is not None:
+            try:
+                if os.path.getsize(task.dest) != optimized_size:
+                    return None
+            except OSError:
+                return None
+        return OptimizeResult(task, src_stat.st_size, optimized_size)
+
+    def _record(self, result: OptimizeResult) -> None:
+        if result.error:
+            return
+        try:
+            src_stat = os.stat(result.task.src)
+        except OSError:
+            return
+        self.manifest[os.path.basename(result.task.dest)] = {
+            "src": result.task.src,
+            "src_size": src_stat.st_size,
+            "src_mtime_ns": src_stat.st_mtime_ns,
+            "size": result.optimized_size,
+        }
+
+    def _save_manifest(self) -> None:
+        if not self.manifest_path:
+            return
+        try:
+            tmp_file = f"{self.manifest_path}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.manifest, f, ensure_ascii=False)
+            os.replace(tmp_file, self.manifest_path)
+        except Exception as e:
+            print(f"Warning: Failed to save optimize manifest {self.manifest_path}: {e}")
+
+    def run(self, tasks: Iterable[CopyTask]) -> List[OptimizeResult]:
+        """
+        Optimize all tasks and print a summary of the bytes saved.
+
+        Returns:
+            List[OptimizeResult]: One result per task, in order
+        """
+        start = time.perf_counter()
+        tasks = list(tasks)
+        results: List[Optional[OptimizeResult]] = [self._cached(task) for task in tasks]
+        todo = [i for i, result in enumerate(results) if result is None]
+        reused = len(tasks) - len(todo)
+
+        try:
+            for i, result in zip(todo, bounded_map(optimize_pdf, (tasks[i] for i in todo), self.workers)):
+                results[i] = result
+                self._record(result)
+        finally:
+            self._save_manifest()
+
+        optimized = [r for r in results if r.optimized_size is not None]
+        failed = [r for r in results if r.error]
+        before = sum(r.original_size for r in optimized)
+        after = sum(r.optimized_size for r in optimized)
+        saved = 100.0 * (before - after) / before if before else 0.0
+        elapsed = time.perf_counter() - start
+        print(f"Optimize summary: {len(optimized)} optimized, {len(results) - len(optimized) - len(failed)} kept original, "
+              f"{len(failed)} failed, {reused} unchanged since last run")
+        print(f"Optimized files: {before} -> {after} bytes ({saved:.1f}% saved) in {elapsed:.1f}s")
+        return results
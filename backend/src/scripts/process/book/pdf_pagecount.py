@@ -0,0 +1,462 @@
+"""
+Fast PDF page counting without loading the file.
+
+The PDF is memory-mapped and only the parts needed to reach the page tree are
+parsed: startxref -> xref table or xref stream (following /Prev) -> trailer /Root
+-> catalog /Pages -> /Count. Objects stored in compressed object streams are
+supported, so the count is correct for files where a plain text search misses
+pages. Only a few kilobytes of the file are touched, so the count takes
+milliseconds and resident memory stays near zero even for very large textbooks.
+
+If the structure is broken (bad offsets, unsupported filters), scan_page_count()
+counts "/Type /Page" markers in fixed-size chunks with a small overlap window,
+so memory stays bounded as well.
+"""
+
+import mmap
+import re
+import zlib
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# Bytes read per chunk by the fallback scan
+SCAN_CHUNK_SIZE = 1 << 20
+# Overlap kept between chunks so markers split across chunk boundaries are found
+SCAN_OVERLAP = 64
+
+# Initial and maximum size of the window parsed around an object
+OBJECT_WINDOW = 4096
+MAX_OBJECT_WINDOW = 16 << 20
+
+PAGE_MARKER = re.compile(br"/Type\s*/Page\b")
+
+_WHITESPACE = b" \t\r\n\x0c\x00"
+_DELIMITERS = b"()<>[]{}/%"
+_OBJ_HEADER = re.compile(br"\s*(\d+)\s+(\d+)\s+obj\b")
+_STARTXREF = re.compile(br"startxref\s+(\d+)")
+
+
+class PdfInfo(NamedTuple):
+    page_count: Optional[int]
+    encrypted: bool
+
+
+class Ref(NamedTuple):
+    num: int
+    gen: int
+
+
+class Name(str):
+    """A PDF name object, stored without the leading slash."""
+
+
+class PdfStructureError(Exception):
+    """Raised when the PDF structure cannot be followed to the page tree."""
+
+
+class _Truncated(Exception):
+    """Raised when an object runs past the end of the parsed window."""
+
+
+def _skip_whitespace(data: bytes, pos: int) -> int:
+    n = len(data)
+    while pos < n:
+        c = data[pos]
+        if c in _WHITESPACE:
+            pos += 1
+        elif c == 0x25:  # % comment
+            while pos < n and data[pos] not in b"\r\n":
+                pos += 1
+        else:
+            break
+    return pos
+
+
+def _read_token(data: bytes, pos: int) -> Tuple[bytes, int]:
+    start = pos
+    n = len(data)
+    while pos < n and data[pos] not in _WHITESPACE and data[pos] not in _DELIMITERS:
+        pos += 1
+    if pos == n:
+        raise _Truncated()
+    return data[start:pos], pos
+
+
+def _is_int(token: bytes) -> bool:
+    return token.isdigit() or (token[:1] in (b"+", b"-") and token[1:].isdigit())
+
+
+def _parse_object(data: bytes, pos: int) -> Tuple[Any, int]:
+    """Parse one PDF object at pos. Returns (value, position after it)."""
+    pos = _skip_whitespace(data, pos)
+    if pos >= len(data):
+        raise _Truncated()
+    c = data[pos:pos + 1]
+
+    if c == b"<":
+        if data[pos + 1:pos + 2] == b"<":
+            result: Dict[str, Any] = {}
+            pos += 2
+            while True:
+                pos = _skip_whitespace(data, pos)
+                if pos + 1 >= len(data):
+                    raise _Truncated()
+                if data[pos:pos + 2] == b">>":
+                    return result, pos + 2
+                key, pos = _parse_object(data, pos)
+                value, pos = _parse_object(data, pos)
+                if isinstance(key, Name):
+                    result[key] = value
+        end = data.find(b">", pos)
+        if end < 0:
+            raise _Truncated()
+        return data[pos + 1:end], end + 1
+
+    if c == b"[":
+        items: List[Any] = []
+        pos += 1
+        while True:
+            pos = _skip_whitespace(data, pos)
+            if pos >= len(data):
+                raise _Truncated()
+            if data[pos:pos + 1] == b"]":
+                return items, pos + 1
+            item, pos = _parse_object(data, pos)
+            items.append(item)
+
+    if c == b"(":
+        depth = 0
+        start = pos
+        n = len(data)
+        while pos < n:
+            ch = data[pos]
+            if ch == 0x5C:  # backslash escape
+                pos += 2
+                continue
+            if ch == 0x28:
+                depth += 1
+            elif ch == 0x29:
+                depth -= 1
+                if depth == 0:
+                    return data[start + 1:pos], pos + 1
+            pos += 1
+        raise _Truncated()
+
+    if c == b"/":
+        token, end = _read_token(data, pos + 1)
+        return Name(token.decode("latin-1")), end
+
+    if c in (b"]", b">", b")", b"{", b"}"):
+        raise PdfStructureError(f"Unexpected delimiter {c!r}")
+
+    token, end = _read_token(data, pos)
+    if _is_int(token):
+        # Look ahead for an indirect reference "num gen R"
+        p = _skip_whitespace(data, end)
+        if p >= len(data):
+            raise _Truncated()
+        if data[p:p + 1].isdigit():
+            gen, p2 = _read_token(data, p)
+            p3 = _skip_whitespace(data, p2)
+            if gen.isdigit() and data[p3:p3 + 1] == b"R" and (p3 + 1 >= len(data) or data[p3 + 1] in _WHITESPACE or data[p3 + 1] in _DELIMITERS):
+                return Ref(int(token), int(gen)), p3 + 1
+        return int(token), end
+    if token == b"true":
+        return True, end
+    if token == b"false":
+        return False, end
+    if token == b"null":
+        return None, end
+    try:
+        return float(token), end
+    except ValueError:
+        # Keyword such as "stream", "endobj" or "obj"
+        return token, end
+
+
+def _png_unpredict(data: bytes, columns: int, bpp: int) -> bytes:
+    row_size = columns + 1
+    out = bytearray()
+    prev = bytearray(columns)
+    for i in range(0, len(data) - row_size + 1, row_size):
+        filter_type = data[i]
+        row = bytearray(data[i + 1:i + row_size])
+        for j in range(columns):
+            left = row[j - bpp] if j >= bpp else 0
+            up = prev[j]
+            if filter_type == 1:
+                row[j] = (row[j] + left) & 0xFF
+            elif filter_type == 2:
+                row[j] = (row[j] + up) & 0xFF
+            elif filter_type == 3:
+                row[j] = (row[j] + ((left + up) >> 1)) & 0xFF
+            elif filter_type == 4:
+                up_left = prev[j - bpp] if j >= bpp else 0
+                p = left + up - up_left
+                pa, pb, pc = abs(p - left), abs(p - up), abs(p - up_left)
+                pred = left if pa <= pb and pa <= pc else (up if pb <= pc else up_left)
+                row[j] = (row[j] + pred) & 0xFF
+        out += row
+        prev = row
+    return bytes(out)
+
+
+class PdfStructure:
+    """
+    Minimal, read-only view of a memory-mapped PDF: cross-reference table,
+    trailer and object lookup.
+    """
+
+    def __init__(self, data: mmap.mmap):
+        self.data = data
+        # obj_num -> (1, offset, gen) | (2, objstm_num, index) | None for free objects
+        self.xref: Dict[int, Optional[Tuple[int, int, int]]] = {}
+        self.trailer: Dict[str, Any] = {}
+        self._object_streams: Dict[int, Tuple[bytes, Dict[int, int]]] = {}
+        self._load_xref()
+
+    def _window(self, offset: int, size: int) -> bytes:
+        return self.data[offset:offset + size]
+
+    def _parse_at(self, offset: int) -> Tuple[Any, int, bytes]:
+        """Parse the object starting at offset, growing the window until it fits."""
+        size = OBJECT_WINDOW
+        while True:
+            buf = self._window(offset, size)
+            try:
+                value, end = _parse_object(buf, 0)
+                return value, end, buf
+            except _Truncated:
+                if offset + size >= len(self.data) or size >= MAX_OBJECT_WINDOW:
+                    raise PdfStructureError(f"Object at offset {offset} is truncated")
+                size *= 4
+
+    def _parse_indirect_at(self, offset: int) -> Tuple[Any, int]:
+        """Parse "N G obj <value>" at offset. Returns (value, absolute end offset)."""
+        header = _OBJ_HEADER.match(self._window(offset, 64))
+        if not header:
+            raise PdfStructureError(f"No object header at offset {offset}")
+        start = offset + header.end()
+        value, end, _ = self._parse_at(start)
+        return value, start + end
+
+    def _stream_data(self, stream_dict: Dict[str, Any], end: int) -> bytes:
+        """Read and decode the stream that follows a dictionary ending at offset end."""
+        pos = end
+        head = self._window(pos, 32)
+        i = _skip_whitespace(head, 0)
+        if head[i:i + 6] != b"stream":
+            raise PdfStructureError("Missing stream keyword")
+        i += 6
+        if head[i:i + 2] == b"\r\n":
+            i += 2
+        elif head[i:i + 1] in (b"\n", b"\r"):
+            i += 1
+        length = stream_dict.get("Length")
+        if isinstance(length, Ref):
+            length = self.resolve(length)
+        if not isinstance(length, int) or length < 0:
+            raise PdfStructureError("Invalid stream length")
+        raw = self.data[pos + i:pos + i + length]
+
+        filters = stream_dict.get("Filter")
+        if filters is None:
+            filters = []
+        elif not isinstance(filters, list):
+            filters = [filters]
+        parms = stream_dict.get("DecodeParms")
+        if isinstance(parms, list):
+            parms = parms[0] if parms else None
+        for name in filters:
+            if name != "FlateDecode":
+                raise PdfStructureError(f"Unsupported stream filter {name}")
+            raw = zlib.decompress(raw)
+        if isinstance(parms, dict) and parms.get("Predictor", 1) >= 10:
+            columns = parms.get("Columns", 1)
+            bpp = max(1, parms.get("Colors", 1) * parms.get("BitsPerComponent", 8) // 8)
+            raw = _png_unpredict(raw, columns, bpp)
+        return raw
+
+    def _load_xref(self) -> None:
+        tail_start = max(0, len(self.data) - 2048)
+        tail = self.data[tail_start:]
+        matches = list(_STARTXREF.finditer(tail))
+        if not matches:
+            raise PdfStructureError("startxref not found")
+        offset = int(matches[-1].group(1))
+
+        seen = set()
+        pending = [offset]
+        while pending:
+            offset = pending.pop(0)
+            if offset in seen or not 0 <= offset < len(self.data):
+                continue
+            seen.add(offset)
+            head = self._window(offset, 16).lstrip()
+            if head.startswith(b"xref"):
+                trailer = self._read_xref_table(offset)
+            else:
+                trailer = self._read_xref_stream(offset)
+            for key, value in trailer.items():
+                self.trailer.setdefault(key, value)
+            # Hybrid files keep compressed entries in a separate xref stream
+            if isinstance(trailer.get("XRefStm"), int):
+                pending.insert(0, trailer["XRefStm"])
+            if isinstance(trailer.get("Prev"), int):
+                pending.append(trailer["Prev"])
+
+    def _read_xref_table(self, offset: int) -> Dict[str, Any]:
+        pos = self.data.find(b"xref", offset) + 4
+        while True:
+            header = self._window(pos, 64)
+            i = _skip_whitespace(header, 0)
+            if header[i:i + 7] == b"trailer":
+                trailer, _, _ = self._parse_at(pos + i + 7)
+                if not isinstance(trailer, dict):
+                    raise PdfStructureError("Invalid trailer")
+                return trailer
+            match = re.match(br"(\d+)\s+(\d+)", header[i:])
+            if not match:
+                raise PdfStructureError("Invalid xref subsection")
+            first, count = int(match.group(1)), int(match.group(2))
+            pos += i + match.end()
+            # Entries are nominally 20 bytes, but tolerate irregular line endings
+            block = self._window(pos, count * 21 + 32)
+            entries = re.finditer(br"(\d{10})\s(\d{5})\s([nf])", block)
+            last_end = 0
+            for num, entry in zip(range(first, first + count), entries):
+                entry_offset, gen, kind = int(entry.group(1)), int(entry.group(2)), entry.group(3)
+                self.xref.setdefault(num, (1, entry_offset, gen) if kind == b"n" else None)
+                last_end = entry.end()
+            pos += last_end
+
+    def _read_xref_stream(self, offset: int) -> Dict[str, Any]:
+        stream_dict, end = self._parse_indirect_at(offset)
+        if not isinstance(stream_dict, dict) or stream_dict.get("Type") != "XRef":
+            raise PdfStructureError(f"No xref at offset {offset}")
+        data = self._stream_data(stream_dict, end)
+        widths = stream_dict.get("W")
+        if not isinstance(widths, list) or len(widths) != 3:
+            raise PdfStructureError("Invalid xref stream /W")
+        index = stream_dict.get("Index") or [0, stream_dict.get("Size", 0)]
+        entry_size = sum(widths)
+        pos = 0
+        for first, count in zip(index[0::2], index[1::2]):
+            for num in range(first, first + count):
+                entry = data[pos:pos + entry_size]
+                pos += entry_size
+                if len(entry) < entry_size:
+                    break
+                fields = []
+                i = 0
+                for width in widths:
+                    fields.append(int.from_bytes(entry[i:i + width], "big") if width else None)
+                    i += width
+                kind = 1 if fields[0] is None else fields[0]
+                if kind == 1:
+                    self.xref.setdefault(num, (1, fields[1], fields[2] or 0))
+                elif kind == 2:
+                    self.xref.setdefault(num, (2, fields[1], fields[2]))
+                else:
+                    self.xref.setdefault(num, None)
+        return stream_dict
+
+    def _object_stream(self, num: int) -> Tuple[bytes, Dict[int, int]]:
+        if num not in self._object_streams:
+            entry = self.xref.get(num)
+            if not entry or entry[0] != 1:
+                raise PdfStructureError(f"Object stream {num} not found")
+            stream_dict, end = self._parse_indirect_at(entry[1])
+            if not isinstance(stream_dict, dict):
+                raise PdfStructureError(f"Invalid object stream {num}")
+            data = self._stream_data(stream_dict, end)
+            first = stream_dict.get("First", 0)
+            numbers = [int(t) for t in data[:first].split()]
+            offsets = {numbers[i]: first + numbers[i + 1] for i in range(0, len(numbers) - 1, 2)}
+            # Terminate the last object so the parser does not treat the end of data as truncation
+            self._object_streams[num] = (data + b"\nendobj\n", offsets)
+        return self._object_streams[num]
+
+    def resolve(self, value: Any, depth: int = 0) -> Any:
+        """Follow indirect references until a direct value is reached."""
+        while isinstance(value, Ref):
+            if depth > 32:
+                raise PdfStructureError("Reference chain too deep")
+            depth += 1
+            entry = self.xref.get(value.num)
+            if entry is None:
+                return None
+            if entry[0] == 1:
+                value, _ = self._parse_indirect_at(entry[1])
+            else:
+                data, offsets = self._object_stream(entry[1])
+                if value.num not in offsets:
+                    raise PdfStructureError(f"Object {value.num} not in object stream {entry[1]}")
+                value, _ = _parse_object(data, offsets[value.num])
+        return value
+
+    @property
+    def encrypted(self) -> bool:
+        return "Encrypt" in self.trailer
+
+    def page_count(self) -> int:
+        catalog = self.resolve(self.trailer.get("Root"))
+        if not isinstance(catalog, dict):
+            raise PdfStructureError("Catalog not found")
+        pages = self.resolve(catalog.get("Pages"))
+        if not isinstance(pages, dict):
+            raise PdfStructureError("Page tree not found")
+        count = self.resolve(pages.get("Count"))
+        if not isinstance(count, int) or count < 0:
+            raise PdfStructureError("Invalid page count")
+        return count
+
+
+def read_pdf_info(filepath: str) -> PdfInfo:
+    """
+    Read the page count and encryption flag from the PDF structure.
+
+    Returns:
+        PdfInfo: page_count is None when the structure could not be followed
+    """
+    try:
+        with open(filepath, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                structure = PdfStructure(data)
+                encrypted = structure.encrypted
+                try:
+                    return PdfInfo(structure.page_count(), encrypted)
+                except Exception:
+                    return PdfInfo(None, encrypted)
+    except Exception:
+        # Unreadable, empty (mmap raises ValueError) or structurally broken file
+        return PdfInfo(None, False)
+
+
+def scan_page_count(filepath: str, chunk_size: int = SCAN_CHUNK_SIZE) -> int:
+    """
+    Count "/Type /Page" markers in fixed-size chunks (fallback for broken files).
+    """
+    count = 0
+    try:
+        with open(filepath, 'rb') as f:
+            carry = b""
+            while True:
+                chunk = f.read(chunk_size)
+                buf = carry + chunk
+                if not chunk:
+                    count += sum(1 for _ in PAGE_MARKER.finditer(buf))
+                    return count
+                # Only count markers starting before the overlap; the rest is rescanned with the next chunk
+                limit = max(0, len(buf) - SCAN_OVERLAP)
+                count += sum(1 for m in PAGE_MARKER.finditer(buf) if m.start() < limit)
+                carry = buf[limit:]
+    except OSError:
+        return 0
+
+
+def count_pages(filepath: str) -> int:
+    """Page count from the PDF structure, or from the chunked scan if the structure is broken."""
+    info = read_pdf_info(filepath)
+    if info.page_count is not None:
+        return info.page_count
+    return scan_page_count(filepath)
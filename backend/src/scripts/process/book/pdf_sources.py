@@ -0,0 +1,207 @@
+"""
+Resolve book attachments against any number of PDF mirror directories.
+
+Each mirror is a PdfSource with a label ("A", "B", "C", ...) and a priority given
+by its position on the command line (first = highest). The SourceResolver picks one
+file per attachment according to a selection policy:
+
+- smallest:     the smallest file wins
+- newest:       the most recently modified file wins
+- valid_pages:  files with a non-zero page count first, then the smallest of those
+- preferred:    the preferred mirror if it has the file, otherwise the smallest
+
+Ties are broken by priority. All file metadata comes from the directory
+inventories, and page counts are cached per path (and optionally in a
+PdfMetaCache across runs), so no file is stat-ed or opened twice.
+"""
+
+import argparse
+import string
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from dir_inventory import DirectoryInventory, FileInfo, load_inventories, name_key
+from pdf_meta_cache import PdfMeta, PdfMetaCache
+
+POLICY_SMALLEST = "smallest"
+POLICY_NEWEST = "newest"
+POLICY_VALID_PAGES = "valid_pages"
+POLICY_PREFERRED = "preferred"
+
+POLICIES = [POLICY_SMALLEST, POLICY_NEWEST, POLICY_VALID_PAGES, POLICY_PREFERRED]
+
+
+class PdfSource(NamedTuple):
+    label: str
+    priority: int
+    inventory: DirectoryInventory
+
+    @property
+    def directory(self) -> str:
+        return self.inventory.directory
+
+
+class Candidate(NamedTuple):
+    source: PdfSource
+    info: FileInfo
+    path: str
+
+
+class Selection(NamedTuple):
+    label: str
+    path: str
+    size: int
+    mtime_ns: int
+    page_count: Optional[int]
+
+
+def source_label(index: int) -> str:
+    """Label of the index-th source: A, B, ..., Z, then S27, S28, ..."""
+    if index < len(string.ascii_uppercase):
+        return string.ascii_uppercase[index]
+    return f"S{index + 1}"
+
+
+def source_labels(directories: Sequence[Optional[str]]) -> List[str]:
+    """Labels of the given directories; empty slots (None) keep their letter but get no source."""
+    return [source_label(i) for i, directory in enumerate(directories) if directory]
+
+
+def build_sources(directories: Sequence[Optional[str]], inventory_cache: Optional[str] = None, refresh_inventory: bool = False) -> List[PdfSource]:
+    """
+    Create one labelled source per directory, listing each directory once.
+
+    The label and priority come from the position in directories, so an empty
+    slot (None, e.g. --dir_a omitted next to --dir_b) keeps the following labels fixed.
+    """
+    slots = [(i, directory) for i, directory in enumerate(directories) if directory]
+    inventories = load_inventories([directory for _, directory in slots], inventory_cache, refresh_inventory)
+    return [PdfSource(source_label(i), i, inventory) for (i, _), inventory in zip(slots, inventories)]
+
+
+def add_source_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the mirror directory and selection policy options shared by the book scripts."""
+    parser.add_argument("--dir_a", help="Path to the first directory (Directory A)")
+    parser.add_argument("--dir_b", help="Path to the second directory (Directory B)")
+    parser.add_argument("--dirs", nargs='+', default=[], help="Additional mirror directories, labelled C, D, ... after --dir_a/--dir_b (or A, B, ... without them); earlier directories have higher priority")
+    parser.add_argument("--policy", choices=POLICIES, default=POLICY_SMALLEST, help="How to choose between mirrors that have the same file (default: smallest)")
+    parser.add_argument("--prefer", help="Label of the preferred mirror for --policy preferred (e.g. B)")
+    parser.add_argument("--inventory_cache", help="Optional JSON file to persist directory listings between runs")
+    parser.add_argument("--refresh_inventory", action="store_true", default=False, help="Ignore cached directory listings and rescan the folders")
+
+
+def source_dirs_from_args(parser: argparse.ArgumentParser, args: argparse.Namespace) -> List[Optional[str]]:
+    """
+    Collect the mirror directories from parsed arguments, in priority order.
+
+    --dir_a and --dir_b always hold slots A and B when either is given (an
+    omitted one is None), so labels match the help text.
+    """
+    fixed = [args.dir_a, args.dir_b] if (args.dir_a or args.dir_b) else []
+    directories = fixed + list(args.dirs)
+    if not any(directories):
+        parser.error("At least one source directory is required (--dir_a/--dir_b or --dirs).")
+    if args.policy == POLICY_PREFERRED and not args.prefer:
+        parser.error("--policy preferred requires --prefer <label>.")
+    labels = source_labels(directories)
+    if args.prefer and args.prefer not in labels:
+        parser.error(f"--prefer {args.prefer} does not match a source directory (labels: {', '.join(labels)}).")
+    return directories
+
+
+class SourceResolver:
+    """
+    Choose one source file per attachment filename.
+
+    Args:
+        sources (List[PdfSource]): Mirrors, in priority order
+        policy (str): One of POLICIES
+        preferred (Optional[str]): Label of the preferred mirror for POLICY_PREFERRED
+        page_counter (Optional[Callable[[str], int]]): Page counting function, required by POLICY_VALID_PAGES
+        meta_cache (Optional[PdfMetaCache]): Persistent cache consulted before counting pages
+    """
+
+    def __init__(self, sources: List[PdfSource], policy: str = POLICY_SMALLEST, preferred: Optional[str] = None, page_counter: Optional[Callable[[str], int]] = None, meta_cache: Optional[PdfMetaCache] = None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown selection policy: {policy}")
+        if policy == POLICY_VALID_PAGES and page_counter is None:
+            raise ValueError("The valid_pages policy needs a page counter")
+        if policy == POLICY_PREFERRED and preferred not in {source.label for source in sources}:
+            raise ValueError(f"Unknown preferred source label: {preferred}")
+        self.sources = sorted(sources, key=lambda s: s.priority)
+        self.policy = policy
+        self.preferred = preferred
+        self.page_counter = page_counter
+        self.meta_cache = meta_cache
+        self.page_counts: Dict[str, int] = {}
+
+    def page_count(self, candidate: Candidate) -> int:
+        """Page count of a candidate file, counted at most once per run (and across runs with a meta cache)."""
+        path = candidate.path
+        if path not in self.page_counts:
+            info = candidate.info
+            meta = self.meta_cache.get(path, info.size, info.mtime_ns) if self.meta_cache else None
+            if meta is not None and meta.page_count is not None:
+                count = meta.page_count
+            else:
+                count = self.page_counter(path) if self.page_counter else 0
+                if self.meta_cache:
+                    self.meta_cache.put(path, info.size, info.mtime_ns, PdfMeta(count, None, None))
+            self.page_counts[path] = count
+        return self.page_counts[path]
+
+    def candidates(self, filename: str) -> List[Candidate]:
+        """All sources that have filename, in priority order."""
+        result = []
+        for source in self.sources:
+            info = source.inventory.get(filename)
+            if info is not None:
+                result.append(Candidate(source, info, source.inventory.path(filename)))
+        return result
+
+    def choose(self, candidates: List[Candidate]) -> Optional[Selection]:
+        """Apply the selection policy to the candidates of one file."""
+        if not candidates:
+            return None
+
+        page_count = None
+        if self.policy == POLICY_NEWEST:
+            chosen = min(candidates, key=lambda c: (-c.info.mtime_ns, c.source.priority))
+        elif self.policy == POLICY_VALID_PAGES:
+            valid = [c for c in candidates if self.page_count(c) > 0]
+            chosen = min(valid or candidates, key=lambda c: (c.info.size, c.source.priority))
+            page_count = self.page_counts.get(chosen.path)
+        else:
+            chosen = None
+            if self.policy == POLICY_PREFERRED:
+                chosen = next((c for c in candidates if c.source.label == self.preferred), None)
+            if chosen is None:
+                chosen = min(candidates, key=lambda c: (c.info.size, c.source.priority))
+
+        return Selection(chosen.source.label, chosen.path, chosen.info.size, chosen.info.mtime_ns, page_count)
+
+    def resolve_all(self, filenames: Iterable[str]) -> Dict[str, List[Candidate]]:
+        """
+        Find the candidates of every filename in one pass over the inventories.
+
+        Each inventory is intersected with the whole set of requested names at
+        once, instead of probing every source for every record.
+
+        Returns:
+            Dict[str, List[Candidate]]: Candidates per filename, in priority order
+                (an empty list when no source has the file)
+        """
+        wanted: Dict[str, str] = {}
+        for filename in filenames:
+            if filename:
+                wanted.setdefault(name_key(filename), filename)
+
+        found: Dict[str, List[Candidate]] = {filename: [] for filename in wanted.values()}
+        for source in self.sources:
+            files = source.inventory.files
+            for key in wanted.keys() & files.keys():
+                filename = wanted[key]
+                found[filename].append(Candidate(source, files[key], source.inventory.path(filename)))
+
+        for candidates in found.values():
+            candidates.sort(key=lambda c: c.source.priority)
+        return found
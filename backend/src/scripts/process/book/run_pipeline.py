@@ -0,0 +1,240 @@
+"""
+Run the book pipeline (step_0 to step_4) in one process.
+
+The step scripts hand data to each other through pretty-printed JSON and CSV
+files. This runner imports their functions instead and passes the book records
+between stages in memory:
+
+    new       step_0: books of the new list that are not in the unique list
+    check     step_1: mirror comparison log (only with --log; books pass through)
+    renumber  step_2: bookId/cloudFile/size/page, optional copy to --output_dir
+    merge     step_3: unique list + renumbered books -> next unique/duplicate lists
+    sql       step_4: SQL for the renumbered books
+
+With --checkpoint_dir, the output of "new" and "renumber" is saved as compact JSON
+(new.json, renumber.json). --from_stage resumes from the checkpoint of the stage
+before it, and --to_stage stops early.
+
+Usage:
+    python process/run_pipeline.py -u unique_books.json -n new_books.json --dirs <dir_a> <dir_b> --start_id 5001 --output_dir cloud --process --merged_output unique_books_next.json --sql_output books.sql
+    python process/run_pipeline.py -u unique_books.json -n new_books.json --dirs <dir_a> <dir_b> --checkpoint_dir ckpt --to_stage renumber
+    python process/run_pipeline.py -u unique_books.json --checkpoint_dir ckpt --from_stage merge --merged_output unique_books_next.json --sql_output books.sql --sql_mode upsert
+"""
+
+import argparse
+import os
+import time
+from itertools import chain
+from typing import Any, Dict, List, Optional
+
+from book_identity import BookIdentityIndex, IDENTITY_KEYS
+from book_record import as_books, load_books
+from catalog_io import JsonArrayWriter, iter_catalog
+from cloud_layout import MAX_HASH_LEVELS, SHARD_FLAT, SHARD_HASH, SHARD_MANIFEST_NAME, SHARD_MODES
+from columnar_export import columnar_format
+from copy_engine import LINK_MODES, LINK_NONE
+from pdf_sources import add_source_arguments, source_dirs_from_args
+from step_0_create_new import DEFAULT_MATCH_KEYS, iter_new_books, print_match_counts, sort_books_by_id
+from step_1_smallest_pdf import check_pdfs
+from step_2_renumber import book_csv_row, renumber_books
+from step_3_merge_json import book_sort_key, get_unique_books, save_json
+from step_4_csv_to_sql import COPY_FORMATS, DEFAULT_BATCH_SIZE, DEFAULT_STATUS, MODES, MODE_DELTA, MODE_INSERT, STATUS_NAMES, STATUS_VALUES, iter_book_rows, write_sql
+
+STAGE_NEW = "new"
+STAGE_CHECK = "check"
+STAGE_RENUMBER = "renumber"
+STAGE_MERGE = "merge"
+STAGE_SQL = "sql"
+STAGES = [STAGE_NEW, STAGE_CHECK, STAGE_RENUMBER, STAGE_MERGE, STAGE_SQL]
+
+# Stages whose output is saved with --checkpoint_dir
+CHECKPOINT_STAGES = [STAGE_NEW, STAGE_RENUMBER]
+# Checkpoint read by each stage when the run starts there
+RESUME_FROM = {
+    STAGE_CHECK: STAGE_NEW,
+    STAGE_RENUMBER: STAGE_NEW,
+    STAGE_MERGE: STAGE_RENUMBER,
+    STAGE_SQL: STAGE_RENUMBER,
+}
+
+# CSV Status code for each status name accepted by --sql_status
+STATUS_CODES = {name: code for code, name in STATUS_VALUES.items()}
+STATUS_CODES[DEFAULT_STATUS] = ""
+
+
+def checkpoint_path(checkpoint_dir: str, stage: str) -> str:
+    return os.path.join(checkpoint_dir, f"{stage}.json")
+
+
+def save_checkpoint(books: List[Dict[str, Any]], path: str) -> None:
+    with JsonArrayWriter(path, indent=None) as writer:
+        for book in books:
+            writer.write(book)
+    print(f"Checkpoint: saved {writer.count} books to {path}")
+
+
+def load_checkpoint(path: str) -> List[Dict[str, Any]]:
+    books = load_books(path)
+    print(f"Checkpoint: loaded {len(books)} books from {path}")
+    return books
+
+
+def stage_new(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    identity = BookIdentityIndex(args.match_keys)
+    identity.add_all(iter_catalog(args.unique_books_file))
+    books = list(iter_new_books(identity, iter_catalog(args.new_books_file), args.exclude))
+    print_match_counts(identity)
+    sort_books_by_id(books)
+    print(f"Found {len(books)} new books not in the unique list")
+    return books
+
+
+def stage_check(books: List[Dict[str, Any]], args: argparse.Namespace, source_dirs: List[Optional[str]]) -> None:
+    if not args.log:
+        print("No --log given, skipping the mirror comparison log.")
+        return
+    check_pdfs(books, source_dirs, args.log, args.policy, args.prefer, args.inventory_cache, args.refresh_inventory, args.meta_cache)
+
+
+def stage_renumber(books: List[Dict[str, Any]], args: argparse.Namespace, source_dirs: List[Optional[str]]) -> List[Dict[str, Any]]:
+    return renumber_books(books, source_dirs, args.renumber_output, args.start_id, args.output_dir, args.process, args.output_csv,
+                          args.policy, args.prefer, args.inventory_cache, args.refresh_inventory, args.workers, args.meta_cache,
+                          args.hash, args.copy_workers, args.link_mode, args.duplicates, args.optimize, args.output_columnar, args.shard, args.shard_levels, args.shard_manifest)
+
+
+def stage_merge(books: List[Dict[str, Any]], args: argparse.Namespace) -> None:
+    # Books of the current unique list come first, so they win over re-found copies
+    unique_books, duplicate_books = get_unique_books(chain(as_books(iter_catalog(args.unique_books_file)), books))
+    unique_books.sort(key=book_sort_key)
+    duplicate_books.sort(key=book_sort_key)
+    save_json(unique_books, args.merged_output, "unique books")
+    save_json(duplicate_books, args.duplicates_output, "duplicate books")
+
+
+def stage_sql(books: List[Dict[str, Any]], args: argparse.Namespace) -> None:
+    status = STATUS_CODES[args.sql_status]
+    # Books whose PDF was not found have no bookId and are left out, as in the CSV of step_2
+    rows = ({**book_csv_row(book), 'Status': status} for book in books if book.get('bookId') is not None)
+    count = write_sql(iter_book_rows(rows), args.sql_output, "run_pipeline.py", args.sql_mode, args.batch_size, args.copy_format, args.snapshot, args.removed_status)
+    print(f"Wrote SQL for {count} books to {args.sql_output}")
+
+
+def run(args: argparse.Namespace, source_dirs: List[Optional[str]]) -> None:
+    first = STAGES.index(args.from_stage)
+    last = STAGES.index(args.to_stage)
+    selected = STAGES[first:last + 1]
+    print(f"Stages: {' -> '.join(selected)}")
+
+    books: Optional[List[Dict[str, Any]]] = None
+    if args.from_stage != STAGE_NEW:
+        books = load_checkpoint(checkpoint_path(args.checkpoint_dir, RESUME_FROM[args.from_stage]))
+
+    for stage in selected:
+        print("=" * 60)
+        print(f"Stage: {stage}")
+        start = time.perf_counter()
+        if stage == STAGE_NEW:
+            books = stage_new(args)
+        elif stage == STAGE_CHECK:
+            stage_check(books, args, source_dirs)
+        elif stage == STAGE_RENUMBER:
+            books = stage_renumber(books, args, source_dirs)
+        elif stage == STAGE_MERGE:
+            stage_merge(books, args)
+        elif stage == STAGE_SQL:
+            stage_sql(books, args)
+
+        if args.checkpoint_dir and stage in CHECKPOINT_STAGES:
+            save_checkpoint(books, checkpoint_path(args.checkpoint_dir, stage))
+        print(f"Stage {stage} finished in {time.perf_counter() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the book pipeline (step_0 to step_4) in one process.")
+    parser.add_argument("--from_stage", "--from-stage", choices=STAGES, default=STAGE_NEW, help="First stage to run; later stages resume from --checkpoint_dir")
+    parser.add_argument("--to_stage", "--to-stage", choices=STAGES, default=STAGE_SQL, help="Last stage to run")
+    parser.add_argument("--checkpoint_dir", help="Directory for per-stage checkpoints (new.json, renumber.json)")
+
+    # step_0
+    parser.add_argument("-u", "--unique_books_file", help="Current unique books JSON (stages new and merge)")
+    parser.add_argument("-n", "--new_books_file", help="New books JSON (stage new)")
+    parser.add_argument("-e", "--exclude", nargs='*', default=[], help="Editions or curriculums to exclude (stage new)")
+    parser.add_argument("-k", "--match_keys", nargs='+', choices=IDENTITY_KEYS, default=DEFAULT_MATCH_KEYS, help="Identity keys used to recognise existing books (stage new)")
+
+    # step_1 / step_2
+    add_source_arguments(parser)
+    parser.add_argument("--log", help="Mirror comparison log JSON (stage check; skipped without it)")
+    parser.add_argument("--start_id", type=int, default=1, help="Starting number for bookId (default: 1)")
+    parser.add_argument("--output_dir", help="Directory to save processed PDF files")
+    parser.add_argument("--process", action="store_true", default=False, help="Copy the selected PDFs to output_dir with their cloudFile name")
+    parser.add_argument("--renumber_output", help="Optional pretty-printed JSON of the renumbered books, like step_2's --output")
+    parser.add_argument("--output_csv", help="Optional CSV of the renumbered books, like step_2's --output_csv")
+    parser.add_argument("--shard", choices=SHARD_MODES, default=SHARD_FLAT, help="Layout of the PDFs in output_dir, as step_2's --shard (default: flat)")
+    parser.add_argument("--shard_levels", type=int, default=1, help="Directory levels with --shard hash (default: 1)")
+    parser.add_argument("--shard_manifest", help=f"bookId -> relative path manifest (default: <output_dir>/{SHARD_MANIFEST_NAME} with --shard digit|hash)")
+    parser.add_argument("--output_columnar", help="Optional columnar export (.parquet or .npz), like step_2's --output_columnar")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes counting pages / optimizing PDFs (default: 1)")
+    parser.add_argument("--meta_cache", help="Optional SQLite file caching PDF metadata between runs")
+    parser.add_argument("--hash", action="store_true", default=False, help="Also compute and cache the SHA-256 of each selected PDF (requires --meta_cache)")
+    parser.add_argument("--copy_workers", type=int, default=4, help="Number of threads copying PDFs with --process (default: 4)")
+    parser.add_argument("--link_mode", choices=LINK_MODES, default=LINK_NONE, help="With --process, hardlink or reflink PDFs instead of copying (default: none)")
+    parser.add_argument("--optimize", action="store_true", default=False, help="With --process, rewrite the PDFs for the web before copying")
+    parser.add_argument("--duplicates", help="Duplicate report from step_1_smallest_pdf.py --duplicates_report")
+
+    # step_3
+    parser.add_argument("--merged_output", default="unique_books.json", help="Unique books JSON written by stage merge (default: unique_books.json)")
+    parser.add_argument("--duplicates_output", default="duplicate_books.json", help="Duplicate books JSON written by stage merge (default: duplicate_books.json)")
+
+    # step_4
+    parser.add_argument("--sql_output", default="books_insert.sql", help="SQL file written by stage sql (default: books_insert.sql)")
+    parser.add_argument("--sql_mode", choices=MODES, default=MODE_INSERT, help="SQL output mode, as step_4's --mode (default: insert)")
+    parser.add_argument("--sql_status", choices=sorted(STATUS_CODES), default="published", help="Status of the new books in the SQL (default: published)")
+    parser.add_argument("--batch_size", type=int, default=DEFAULT_BATCH_SIZE, help=f"Rows per statement in upsert/delta mode (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--copy_format", choices=COPY_FORMATS, default="text", help="Payload format in copy mode (default: text)")
+    parser.add_argument("--snapshot", help="Fingerprint snapshot for --sql_mode delta")
+    parser.add_argument("--removed_status", choices=STATUS_NAMES, default="archived", help="Status set on removed rows in delta mode (default: archived)")
+
+    args = parser.parse_args()
+
+    first = STAGES.index(args.from_stage)
+    last = STAGES.index(args.to_stage)
+    if first > last:
+        parser.error("--from_stage comes after --to_stage.")
+    selected = STAGES[first:last + 1]
+
+    if first > 0 and not args.checkpoint_dir:
+        parser.error("--from_stage other than 'new' requires --checkpoint_dir.")
+    if STAGE_NEW in selected and not (args.unique_books_file and args.new_books_file):
+        parser.error("Stage new requires --unique_books_file and --new_books_file.")
+    if STAGE_MERGE in selected and not args.unique_books_file:
+        parser.error("Stage merge requires --unique_books_file.")
+    if args.process and not args.output_dir:
+        parser.error("--process requires --output_dir to be specified.")
+    if args.optimize and not args.process:
+        parser.error("--optimize requires --process.")
+    if args.hash and not args.meta_cache:
+        parser.error("--hash requires --meta_cache.")
+    if args.output_columnar:
+        try:
+            columnar_format(args.output_columnar)
+        except (ValueError, RuntimeError) as e:
+            parser.error(f"--output_columnar: {e}")
+    if args.shard == SHARD_HASH and not 1 <= args.shard_levels <= MAX_HASH_LEVELS:
+        parser.error(f"--shard_levels must be between 1 and {MAX_HASH_LEVELS}.")
+    if args.sql_mode == MODE_DELTA and STAGE_SQL in selected and not args.snapshot:
+        parser.error("--sql_mode delta requires --snapshot.")
+
+    source_dirs: List[Optional[str]] = []
+    if STAGE_CHECK in selected or STAGE_RENUMBER in selected:
+        source_dirs = source_dirs_from_args(parser, args)
+
+    if args.checkpoint_dir:
+        os.makedirs(args.checkpoint_dir, exist_ok=True)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    run(args, source_dirs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Fingerprints of the rows exported by step_4_csv_to_sql.py, for delta SQL.
+
+For every book_id the snapshot stores an 8-byte hash per mapped column
+(concatenated into one BLOB) and a hash of the whole row. The next export only
+has to compare hashes to know which rows are new, which columns changed and
+which rows disappeared; the column values themselves are not kept.
+"""
+
+import hashlib
+import sqlite3
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+# Bytes of each column hash
+COLUMN_HASH_SIZE = 8
+
+
+def column_hashes(values: Sequence) -> bytes:
+    """Concatenated per-column hashes of a row (type-aware, so 1 and '1' differ)."""
+    parts = []
+    for value in values:
+        text = f"{type(value).__name__}:{value}"
+        parts.append(hashlib.blake2b(text.encode('utf-8'), digest_size=COLUMN_HASH_SIZE).digest())
+    return b"".join(parts)
+
+
+def row_hash(col_hashes: bytes) -> bytes:
+    return hashlib.blake2b(col_hashes, digest_size=16).digest()
+
+
+def changed_columns(old: bytes, new: bytes) -> List[int]:
+    """Indexes of the columns whose hash differs."""
+    size = COLUMN_HASH_SIZE
+    count = max(len(old), len(new)) // size
+    return [i for i in range(count) if old[i * size:(i + 1) * size] != new[i * size:(i + 1) * size]]
+
+
+class RowSnapshot:
+    """
+    SQLite table of book_id -> (row hash, column hashes).
+
+    Changes are only committed by commit(), so a failed export leaves the
+    previous snapshot intact.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS row_fingerprints (
+            book_id INTEGER PRIMARY KEY,
+            row_hash BLOB NOT NULL,
+            col_hashes BLOB NOT NULL
+        );
+        """)
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM row_fingerprints;").fetchone()[0]
+
+    def get(self, book_id: int) -> Optional[Tuple[bytes, bytes]]:
+        """(row hash, column hashes) of a book_id, or None if it is not in the snapshot."""
+        return self.conn.execute("SELECT row_hash, col_hashes FROM row_fingerprints WHERE book_id = ?;", (book_id,)).fetchone()
+
+    def put(self, book_id: int, col_hashes: bytes) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO row_fingerprints (book_id, row_hash, col_hashes) VALUES (?, ?, ?);",
+            (book_id, row_hash(col_hashes), col_hashes)
+        )
+
+    def items(self) -> Iterator[Tuple[int, bytes]]:
+        """All (book_id, column hashes), in book_id order."""
+        cursor = self.conn.execute("SELECT book_id, col_hashes FROM row_fingerprints ORDER BY book_id;")
+        for book_id, col_hashes in cursor:
+            yield book_id, col_hashes
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self) -> "RowSnapshot":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
@@ -4,20 +4,35 @@ Script to identify new books that are not present in an existing unique book lis
 This program:
 1. Reads a unique book list from a JSON file
 2. Reads a new book list from another JSON file
-3. Compares the two lists by book ID
+3. Compares the two lists by identity keys (book ID, ISBN+class+attachment file, attachment file name)
 4. Identifies books in the new list that aren't in the unique list
 5. Saves those new books to an output JSON file using the same key structure as the unique books file
 
+With --stream, the unique list is read incrementally into a sorted int64 ID index
+file and, for the other identity keys, a SQLite key index (both reused on later runs
+while the unique list is unchanged), and the new list is streamed record by record
+against them. Matches are written as they are found, in the order of the new list,
+so peak memory stays flat regardless of the catalog size.
+
 Usage:
     python process/step_0_create_new.py -u unique_books.json -n new_books.json -o output.json
     python process/step_0_create_new.py -u unique_books.json -n new_books.json -o output.json -e "Edition 1" "Old Edition" "2013 Curriculum"
+    python process/step_0_create_new.py -u unique_books.json -n new_books.json -o output.json --stream [--index_file unique_books.idx] [--key_index_file unique_books.keys.db]
+    python process/step_0_create_new.py -u unique_books.json -n new_books.json -o output.json -k id isbn_class -m matched.json
 """
 
-import json
 import sys
+import sqlite3
 import argparse
 from pathlib import Path
-from typing import List, Dict, Set, Any, Optional
+from contextlib import ExitStack
+from typing import List, Dict, Set, Any, Optional, Iterable, Iterator, Callable
+
+from book_record import Book, load_books
+from book_identity import BookIdentityIndex, IdentityMatch, IDENTITY_KEYS, KEY_ID, KEY_ISBN_CLASS_FILE, KEY_FILENAME, format_match
+from catalog_io import iter_catalog, open_catalog_writer, save_catalog
+from id_index import SortedIdIndex, normalize_book_id
+from key_index import KeyIndex
 
 # Define the keys that should be included in the output file (same as unique books file)
 UNIQUE_BOOK_KEYS = [
@@ -27,7 +42,11 @@ UNIQUE_BOOK_KEYS = [
     "cloud", "size", "page"
 ]
 
-def load_books_from_file(file_path: Path) -> List[Dict[str, Any]]:
+# Identity keys used to recognise books that are already in the unique list.
+# A re-uploaded book with a new ID is still caught by its ISBN/class/file or file name.
+DEFAULT_MATCH_KEYS = [KEY_ID, KEY_ISBN_CLASS_FILE, KEY_FILENAME]
+
+def load_books_from_file(file_path: Path) -> List[Book]:
     """
     Load books from a JSON file.
     
@@ -35,11 +54,10 @@ def load_books_from_file(file_path: Path) -> List[Dict[str, Any]]:
         file_path (Path): Path to the JSON file
         
     Returns:
-        List[Dict[str, Any]]: List of book dictionaries
+        List[Book]: List of book records
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            books = json.load(f)
+        books = load_books(file_path)
         print(f"Loaded {len(books)} books from {file_path}")
         return books
     except Exception as e:
@@ -61,22 +79,19 @@ def get_book_ids(books: List[Dict[str, Any]]) -> Set[Any]:
         book_id = book.get('id')
         if book_id is not None:
             # Convert to integer if possible for consistent comparison
-            try:
-                ids.add(int(book_id))
-            except (ValueError, TypeError):
-                ids.add(book_id)
+            ids.add(normalize_book_id(book_id))
     return ids
 
-def filter_book_keys(book: Dict[str, Any], keys: List[str]) -> Dict[str, Any]:
+def filter_book_keys(book: Dict[str, Any], keys: List[str]) -> Book:
     """
     Filter a book dictionary to only include specified keys.
     
     Args:
-        book (Dict[str, Any]): Book dictionary
+        book (Dict[str, Any]): Book dictionary or record
         keys (List[str]): List of keys to include
         
     Returns:
-        Dict[str, Any]: Book dictionary with only the specified keys
+        Book: Book record with only the specified keys
     """
     filtered_book: Dict[str, Any] = {}
     for key in keys:
@@ -96,24 +111,23 @@ def filter_book_keys(book: Dict[str, Any], keys: List[str]) -> Dict[str, Any]:
                 filtered_book[key] = 0
             else:
                 filtered_book[key] = ""
-    return filtered_book
+    return Book.from_json(filtered_book)
 
-def find_new_books(unique_books: List[Dict[str, Any]], new_books: List[Dict[str, Any]], excluded_values: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+def iter_new_books(identity: BookIdentityIndex, new_books: Iterable[Dict[str, Any]], excluded_values: Optional[List[str]] = None, on_match: Optional[Callable[[Dict[str, Any], IdentityMatch], None]] = None) -> Iterator[Dict[str, Any]]:
     """
-    Find books in new_books that are not present in unique_books.
+    Yield books from new_books that do not match any key of the identity index.
     Also filters out books with editions or curriculums present in excluded_values.
+    Each new book is added to the index, so repeats within new_books are only yielded once.
     
     Args:
-        unique_books (List[Dict[str, Any]]): List of existing unique books
-        new_books (List[Dict[str, Any]]): List of new books to check
+        identity (BookIdentityIndex): Index of the existing unique books
+        new_books (Iterable[Dict[str, Any]]): New books to check, consumed one at a time
         excluded_values (Optional[List[str]]): List of editions or curriculums to exclude
+        on_match (Optional[Callable]): Called with (book, match) for every known book
         
-    Returns:
-        List[Dict[str, Any]]: List of books that are new (not in unique_books) with filtered keys
+    Yields:
+        Dict[str, Any]: Each new book with filtered keys, in input order
     """
-    unique_ids = get_book_ids(unique_books)
-    new_book_list = []
-    
     # Normalize excluded values for comparison if provided
     excluded_set: Set[str] = set(excluded_values or [])
     
@@ -135,21 +149,147 @@ def find_new_books(unique_books: List[Dict[str, Any]], new_books: List[Dict[str,
             if book_curriculum is not None and str(book_curriculum) in excluded_set:
                 continue
 
-        book_id = book.get('id')
-        if book_id is not None:
-            # Convert to integer if possible for consistent comparison
-            try:
-                book_id = int(book_id)
-            except (ValueError, TypeError):
-                pass  # Keep as original if conversion fails
-            
-            if book_id not in unique_ids:
+        if book.get('id') is not None:
+            found = identity.check_and_add(book)
+            if found is None:
                 # Filter the book to only include keys from the unique books structure
-                filtered_book = filter_book_keys(book, UNIQUE_BOOK_KEYS)
-                new_book_list.append(filtered_book)
+                yield filter_book_keys(book, UNIQUE_BOOK_KEYS)
+            elif on_match is not None:
+                on_match(book, found)
+
+def find_new_books(unique_books: List[Dict[str, Any]], new_books: List[Dict[str, Any]], excluded_values: Optional[List[str]] = None, match_keys: Optional[List[str]] = None, on_match: Optional[Callable[[Dict[str, Any], IdentityMatch], None]] = None) -> List[Dict[str, Any]]:
+    """
+    Find books in new_books that are not present in unique_books.
+    Also filters out books with editions or curriculums present in excluded_values.
     
+    Args:
+        unique_books (List[Dict[str, Any]]): List of existing unique books
+        new_books (List[Dict[str, Any]]): List of new books to check
+        excluded_values (Optional[List[str]]): List of editions or curriculums to exclude
+        match_keys (Optional[List[str]]): Identity keys a book is matched on (default: DEFAULT_MATCH_KEYS)
+        on_match (Optional[Callable]): Called with (book, match) for every known book
+        
+    Returns:
+        List[Dict[str, Any]]: List of books that are new (not in unique_books) with filtered keys
+    """
+    identity = BookIdentityIndex(match_keys or DEFAULT_MATCH_KEYS)
+    identity.add_all(unique_books)
+    new_book_list = list(iter_new_books(identity, new_books, excluded_values, on_match))
+    print_match_counts(identity)
     return new_book_list
 
+def print_match_counts(identity: BookIdentityIndex):
+    """Print how many known books were matched by each identity key."""
+    for key in identity.keys:
+        print(f"Matched existing books by {key}: {identity.match_counts[key]}")
+
+def open_id_index(unique_books_file: Path, index_file: Path) -> SortedIdIndex:
+    """
+    Open the ID index for unique_books_file, rebuilding it if missing or stale.
+    
+    Args:
+        unique_books_file (Path): Path to the unique books JSON file
+        index_file (Path): Path to the ID index file
+        
+    Returns:
+        SortedIdIndex: Memory-mapped index of the unique book IDs
+    """
+    if index_file.exists():
+        try:
+            index = SortedIdIndex(index_file)
+            if index.is_current(unique_books_file):
+                print(f"Using ID index {index_file} ({len(index)} IDs)")
+                return index
+            index.close()
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable ID index {index_file}: {e}")
+    
+    print(f"Building ID index {index_file} from {unique_books_file}...")
+    ids = (book.get('id') for book in iter_catalog(unique_books_file))
+    index = SortedIdIndex.build(ids, index_file, source_file=unique_books_file)
+    print(f"Indexed {len(index)} IDs")
+    return index
+
+def open_key_index(unique_books_file: Path, key_index_file: Path, keys: List[str]) -> KeyIndex:
+    """
+    Open the key index for unique_books_file, rebuilding it if stale or built with other keys.
+    
+    Args:
+        unique_books_file (Path): Path to the unique books JSON file
+        key_index_file (Path): Path to the SQLite key index file
+        keys (List[str]): Identity keys to index (other than the ID)
+        
+    Returns:
+        KeyIndex: On-disk index of the identity keys of the unique books
+    """
+    key_index = KeyIndex(key_index_file)
+    if key_index.is_current(unique_books_file, keys):
+        print(f"Using key index {key_index_file} ({len(key_index)} keys)")
+        return key_index
+    
+    print(f"Building key index {key_index_file} from {unique_books_file}...")
+    count = key_index.rebuild(iter_catalog(unique_books_file), keys, unique_books_file)
+    print(f"Indexed {count} keys")
+    return key_index
+
+def stream_new_books(unique_books_file: Path, new_books_file: Path, output_file: str, index_file: Path, excluded_values: Optional[List[str]] = None, match_keys: Optional[List[str]] = None, on_match: Optional[Callable[[Dict[str, Any], IdentityMatch], None]] = None, key_index_file: Optional[Path] = None) -> int:
+    """
+    Stream new_books_file against the identity index of unique_books_file and write
+    new books and their attachment URLs as they are found.
+    
+    IDs are looked up in the on-disk ID index and the other identity keys, if
+    enabled, in the on-disk key index, so memory use does not grow with either list.
+    
+    Args:
+        unique_books_file (Path): Path to the unique books JSON file
+        new_books_file (Path): Path to the new books JSON file
+        output_file (str): Path to the output JSON file
+        index_file (Path): Path to the ID index file
+        excluded_values (Optional[List[str]]): List of editions or curriculums to exclude
+        match_keys (Optional[List[str]]): Identity keys a book is matched on (default: DEFAULT_MATCH_KEYS)
+        on_match (Optional[Callable]): Called with (book, match) for every known book
+        key_index_file (Optional[Path]): Path to the key index file (default: <unique_books_file>.keys.db)
+        
+    Returns:
+        int: Number of new books written
+    """
+    base_name = output_file.rsplit('.', 1)[0] if '.' in output_file else output_file
+    urls_file = f"{base_name}_urls.txt"
+    match_keys = match_keys or DEFAULT_MATCH_KEYS
+    
+    other_keys = [key for key in match_keys if key != KEY_ID]
+    key_index_file = key_index_file or Path(str(unique_books_file) + ".keys.db")
+    
+    with ExitStack() as stack:
+        unique_ids = stack.enter_context(open_id_index(unique_books_file, index_file))
+        key_index = stack.enter_context(open_key_index(unique_books_file, key_index_file, other_keys)) if other_keys else None
+        identity = BookIdentityIndex(match_keys, id_index=unique_ids, key_store=key_index)
+        
+        with open_catalog_writer(output_file) as writer, open(urls_file, 'w', encoding='utf-8') as urls:
+            for book in iter_new_books(identity, iter_catalog(new_books_file), excluded_values, on_match):
+                writer.write(book)
+                attachment = book.get('attachment', '')
+                if attachment:
+                    urls.write(f"{attachment}\n")
+    
+    print_match_counts(identity)
+    print(f"Saved {writer.count} books to {output_file}")
+    print(f"Saved {writer.count} attachment URLs to {urls_file}")
+    return writer.count
+
+def sort_books_by_id(books: List[Dict[str, Any]]) -> None:
+    """
+    Sort books in place by ID in ascending order.
+    
+    Args:
+        books (List[Dict[str, Any]]): List of book dictionaries
+    """
+    try:
+        books.sort(key=lambda book: int(book.get('id', 0)))
+    except (ValueError, TypeError):
+        # If ID is not convertible to int, sort as strings
+        books.sort(key=lambda book: str(book.get('id', '')))
+
 def save_books_to_file(books: List[Dict[str, Any]], output_file: str):
     """
     Save books to a JSON file.
@@ -159,9 +299,8 @@ def save_books_to_file(books: List[Dict[str, Any]], output_file: str):
         output_file (str): Path to the output file
     """
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(books, f, ensure_ascii=False, indent=2)
-        print(f"Saved {len(books)} books to {output_file}")
+        count = save_catalog(books, output_file)
+        print(f"Saved {count} books to {output_file}")
     except Exception as e:
         print(f"Error saving books to {output_file}: {e}")
 
@@ -194,6 +333,11 @@ def main():
     parser.add_argument("-n", "--new_books_file", required=True, help="Path to the new books JSON file")
     parser.add_argument("-o", "--output_file", required=True, help="Path to the output JSON file")
     parser.add_argument("-e", "--exclude", nargs='*', help="List of editions or curriculums to exclude", default=[])
+    parser.add_argument("--stream", action="store_true", default=False, help="Stream both lists against an on-disk ID index instead of loading them into memory (output keeps the new list order)")
+    parser.add_argument("--index_file", help="Path to the ID index file used by --stream (default: <unique_books_file>.idx)")
+    parser.add_argument("--key_index_file", help="Path to the SQLite index of the other identity keys used by --stream (default: <unique_books_file>.keys.db)")
+    parser.add_argument("-k", "--match_keys", nargs='+', choices=IDENTITY_KEYS, default=DEFAULT_MATCH_KEYS, help=f"Identity keys used to recognise existing books (default: {' '.join(DEFAULT_MATCH_KEYS)})")
+    parser.add_argument("-m", "--matched_file", help="Optional JSON file listing the skipped known books with the key that matched them")
     
     args = parser.parse_args()
     
@@ -217,27 +361,44 @@ def main():
         print(f"Error: New books file '{new_books_file}' does not exist.")
         return
 
-    # Load the unique books
-    unique_books = load_books_from_file(unique_books_file)
-    if not unique_books:
-        print("No unique books loaded. Exiting.")
-        return
-    
-    # Load the new books
-    new_books = load_books_from_file(new_books_file)
-    if not new_books:
-        print("No new books loaded. Exiting.")
-        return
-    
-    # Find new books
-    new_unique_books = find_new_books(unique_books, new_books, excluded_values)
+    with ExitStack() as stack:
+        on_match = None
+        if args.matched_file:
+            matched_writer = stack.enter_context(open_catalog_writer(args.matched_file))
+
+            def on_match(book, found):
+                """Record a matched new book with the key it matched on."""
+                matched_writer.write({**filter_book_keys(book, UNIQUE_BOOK_KEYS), "reason": format_match(found)})
+        
+        if args.stream:
+            index_file = Path(args.index_file) if args.index_file else Path(str(unique_books_file) + ".idx")
+            try:
+                key_index_file = Path(args.key_index_file) if args.key_index_file else None
+                count = stream_new_books(unique_books_file, new_books_file, str(output_file), index_file, excluded_values, args.match_keys, on_match, key_index_file)
+            except (OSError, ValueError, sqlite3.Error) as e:
+                print(f"Error streaming books: {e}")
+                return
+            print(f"Found {count} new books not in the unique list")
+            print("Process completed successfully.")
+            return
+
+        # Load the unique books
+        unique_books = load_books_from_file(unique_books_file)
+        if not unique_books:
+            print("No unique books loaded. Exiting.")
+            return
+        
+        # Load the new books
+        new_books = load_books_from_file(new_books_file)
+        if not new_books:
+            print("No new books loaded. Exiting.")
+            return
+        
+        # Find new books
+        new_unique_books = find_new_books(unique_books, new_books, excluded_values, args.match_keys, on_match)
     
     # Sort the new books by ID in ascending order
-    try:
-        new_unique_books.sort(key=lambda book: int(book.get('id', 0)))
-    except (ValueError, TypeError):
-        # If ID is not convertible to int, sort as strings
-        new_unique_books.sort(key=lambda book: str(book.get('id', '')))
+    sort_books_by_id(new_unique_books)
     
     print(f"Found {len(new_unique_books)} new books not in the unique list")
     
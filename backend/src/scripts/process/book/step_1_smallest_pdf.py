@@ -1,17 +1,23 @@
 """
-Script to compare and identify the smallest PDF files from two directories based on a JSON input.
+Script to compare and identify the smallest PDF files from mirror directories based on a JSON input.
 
 This code for TESTING for the input to compare the size of the pdf files and show the log.
 
 This script reads a JSON file containing book records with attachment URLs. It processes each record to:
 1. Extract the filename from the attachment URL.
-2. Check for the existence of the file in two specified directories (A and B).
-3. Compare the file sizes if found in both directories to identify the smallest one.
+2. Check for the existence of the file in the mirror directories (A, B, C, ...),
+   using a single listing of each directory (optionally cached with --inventory_cache).
+3. Select one copy with the selection policy (smallest by default; see pdf_sources.py).
 4. Generate a log JSON file categorized by "found" and "notFound" files, including details
-   on file sizes and which source contained the smallest version.
+   on file sizes per mirror and which source was selected ("smallest_file").
+5. (Optional) With --duplicates_report, find byte-identical files across all mirrors and
+   attachment names (size groups, first/last-block prefilter, then parallel SHA-256) and
+   write the duplicate clusters for step_2_renumber.py --duplicates.
 
 Usage:
-    python process/step_1_smallest_pdf.py --dir_a <path_to_dir_a> --dir_b <path_to_dir_b> --input <input_json> [--output <output_json>]
+    python process/step_1_smallest_pdf.py --dir_a <path_to_dir_a> --dir_b <path_to_dir_b> --input <input_json> [--output <output_json>] [--inventory_cache <cache_json>]
+    python process/step_1_smallest_pdf.py --dirs <dir_1> <dir_2> <dir_3> <dir_4> --input <input_json> [--policy smallest|newest|valid_pages|preferred] [--prefer C]
+    python process/step_1_smallest_pdf.py --dirs <dir_1> <dir_2> --input <input_json> --duplicates_report <duplicates_json> [--workers <n>] [--meta_cache <cache.sqlite>]
 """
 
 import argparse
@@ -20,6 +26,12 @@ import os
 import urllib.parse
 from typing import List, Dict, Any, Optional
 
+from book_record import load_books
+from content_dedup import ContentFile, find_duplicate_clusters, save_duplicate_report
+from pdf_meta_cache import PdfMetaCache
+from pdf_sources import SourceResolver, POLICY_SMALLEST, POLICY_VALID_PAGES, add_source_arguments, build_sources, source_dirs_from_args
+from step_2_renumber import get_pdf_page_count
+
 def get_filename_from_url(url: Optional[str]) -> str:
     """Extracts and decodes the filename from a URL."""
     if not url:
@@ -29,7 +41,7 @@ def get_filename_from_url(url: Optional[str]) -> str:
     return urllib.parse.unquote(filename)
 
 
-def process_pdfs(dir_a: str, dir_b: str, input_file: str, output_file: str):
+def process_pdfs(source_dirs: List[Optional[str]], input_file: str, output_file: str, policy: str = POLICY_SMALLEST, preferred: Optional[str] = None, inventory_cache: Optional[str] = None, refresh_inventory: bool = False, meta_cache_file: Optional[str] = None, duplicates_report: Optional[str] = None, workers: int = 1):
     print(f"Reading input from: {input_file}")
     
     if not os.path.exists(input_file):
@@ -37,30 +49,43 @@ def process_pdfs(dir_a: str, dir_b: str, input_file: str, output_file: str):
         return
 
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = load_books(input_file)
     except Exception as e:
         print(f"Error reading input file: {e}")
         return
 
+    check_pdfs(data, source_dirs, output_file, policy, preferred, inventory_cache, refresh_inventory, meta_cache_file, duplicates_report, workers)
+
+def check_pdfs(data: List[Dict[str, Any]], source_dirs: List[Optional[str]], output_file: str, policy: str = POLICY_SMALLEST, preferred: Optional[str] = None, inventory_cache: Optional[str] = None, refresh_inventory: bool = False, meta_cache_file: Optional[str] = None, duplicates_report: Optional[str] = None, workers: int = 1):
+    """
+    Compare the mirror copies of already loaded book records and write the log
+    (the body of process_pdfs, also used by run_pipeline.py).
+    """
     results_found = []
     results_not_found = []
 
-
-
+    sources = build_sources(source_dirs, inventory_cache, refresh_inventory)
+    page_counter = get_pdf_page_count if policy == POLICY_VALID_PAGES else None
+    meta_cache = PdfMetaCache(meta_cache_file) if meta_cache_file else None
+    resolver = SourceResolver(sources, policy, preferred, page_counter, meta_cache)
+    
+    print("Checking folders:")
+    for source in sources:
+        print(f" {source.label}: {source.directory}")
+    print(f"Selection policy: {policy}\n")
+    
+    # Resolve every attachment against all folder listings in one pass
+    filenames = [get_filename_from_url(item.get("attachment")) for item in data]
+    candidates_by_name = resolver.resolve_all(filenames)
     
-    print(f"Checking folders:\n A: {dir_a}\n B: {dir_b}\n")
     print("-" * 60)
     print(f"{'FILENAME':<40} | {'STATUS':<10} | {'DETAILS'}")
     print("-" * 60)
 
-    for item in data:
-        attachment_url = item.get("attachment")
+    for item, filename in zip(data, filenames):
         title = item.get("title", "Unknown Title")
         item_id = item.get("id")
         
-        filename = get_filename_from_url(attachment_url)
-        
         if not filename:
             # print(f"[SKIP] ID {item_id}: No valid filename found.")
             results_not_found.append({
@@ -71,63 +96,31 @@ def process_pdfs(dir_a: str, dir_b: str, input_file: str, output_file: str):
 
             continue
 
-        path_a = os.path.join(dir_a, filename)
-        path_b = os.path.join(dir_b, filename)
-        
-        stat_a = os.stat(path_a) if os.path.exists(path_a) else None
-        stat_b = os.stat(path_b) if os.path.exists(path_b) else None
-
-        size_a = stat_a.st_size if stat_a else None
-        size_b = stat_b.st_size if stat_b else None
+        candidates = candidates_by_name[filename]
+        found_in = {c.source.label: c.info.size for c in candidates}
         
         log_entry = {
             "id": item_id,
             "title": title,
             "filename": filename,
-            "found_in_a": bool(stat_a),
-            "size_a": size_a,
-            "found_in_b": bool(stat_b),
-            "size_b": size_b,
-            "smallest_file": None,
-            "smallest_size": None
         }
-
-        status = None
-
-
-        if not stat_a and not stat_b:
-            print(f"{filename} | MISSING    | Not found in A or B")
-            status = "missing"
-
+        for source in sources:
+            key = source.label.lower()
+            log_entry[f"found_in_{key}"] = source.label in found_in
+            log_entry[f"size_{key}"] = found_in.get(source.label)
+        # "smallest_*" keeps its name for older log readers; it holds the source chosen by the policy
+        log_entry["smallest_file"] = None
+        log_entry["smallest_size"] = None
+
+        selected = resolver.choose(candidates)
+        if selected is None:
+            print(f"{filename} | MISSING    | Not found in {' or '.join(s.label for s in sources)}")
+            results_not_found.append(log_entry)
         else:
-            # Determine smallest
-            if stat_a and stat_b:
-                # Use infinity for comparison if size is None to avoid TypeError
-                comp_a = size_a if size_a is not None else float('inf')
-                comp_b = size_b if size_b is not None else float('inf')
-
-                if comp_a < comp_b:
-                    selected = ("A", size_a, path_a)
-                else:
-                    selected = ("B", size_b, path_b)
-            elif stat_a:
-                selected = ("A", size_a, path_a)
-            else:
-                selected = ("B", size_b, path_b)
-            
-            log_entry["smallest_file"] = selected[0]
-            log_entry["smallest_size"] = selected[1]
-            status = "found"
-            
-            print(f"{filename} | FOUND      | Smallest: {selected[0]} ({selected[1]} bytes)")
-
-
-        if status == "found":
+            log_entry["smallest_file"] = selected.label
+            log_entry["smallest_size"] = selected.size
+            print(f"{filename} | FOUND      | Selected: {selected.label} ({selected.size} bytes)")
             results_found.append(log_entry)
-        else:
-            results_not_found.append(log_entry)
-
-
 
     print("-" * 60)
     print(f"Writing log to: {output_file}")
@@ -140,31 +133,54 @@ def process_pdfs(dir_a: str, dir_b: str, input_file: str, output_file: str):
         with open(output_file, 'w', encoding='utf-8') as f:
             json.dump(output_data, f, indent=2, ensure_ascii=False)
         all_results = results_found + results_not_found
-        total_a = sum(1 for r in all_results if r.get("found_in_a"))
-        total_b = sum(1 for r in all_results if r.get("found_in_b"))
-        smallest_a = sum(1 for r in results_found if r.get("smallest_file") == "A")
-        smallest_b = sum(1 for r in results_found if r.get("smallest_file") == "B")
 
         print(f"Total processed: {len(results_found)} found, {len(results_not_found)} not found.")
-        print(f"Total found in A: {total_a} (Smallest in {smallest_a})")
-        print(f"Total found in B: {total_b} (Smallest in {smallest_b})")
+        for source in sources:
+            total = sum(1 for r in all_results if r.get(f"found_in_{source.label.lower()}"))
+            selected_count = sum(1 for r in results_found if r.get("smallest_file") == source.label)
+            print(f"Total found in {source.label}: {total} (Selected in {selected_count})")
         print("Done.")
 
 
     except Exception as e:
         print(f"Error writing output file: {e}")
 
+    if duplicates_report:
+        # Every copy in every mirror is a candidate, not only the selected one
+        files = [
+            ContentFile(filename, c.source.label, c.path, c.info.size, c.info.mtime_ns)
+            for filename, candidates in candidates_by_name.items()
+            for c in candidates
+        ]
+        print(f"Looking for duplicate content among {len(files)} files...")
+        clusters, stats = find_duplicate_clusters(files, workers, meta_cache)
+        print(f"Size groups: {stats['size_groups']} ({stats['size_candidates']} files), "
+              f"after first/last block check: {stats['prefilter_candidates']} files, "
+              f"hashed: {stats['hashed']} (cached: {stats['hash_cache_hits']})")
+        renamed = sum(1 for c in clusters if len(c.filenames) > 1)
+        print(f"Duplicate clusters: {len(clusters)} ({renamed} with different filenames)")
+        try:
+            save_duplicate_report(clusters, stats, duplicates_report)
+            print(f"Duplicate report written to: {duplicates_report}")
+        except Exception as e:
+            print(f"Error writing duplicate report: {e}")
+
+    if meta_cache:
+        meta_cache.close()
+
 def main():
-    parser = argparse.ArgumentParser(description="Compare PDF sizes in two directories based on JSON input.")
-    parser.add_argument("--dir_a", required=True, help="Path to the first directory (Directory A)")
-    parser.add_argument("--dir_b", required=True, help="Path to the second directory (Directory B)")
+    parser = argparse.ArgumentParser(description="Compare PDF files in mirror directories based on JSON input.")
+    add_source_arguments(parser)
     parser.add_argument("--input", required=True, help="Path to the input JSON file")
     parser.add_argument("--output", default="process_log.json", help="Path to the output log JSON file")
+    parser.add_argument("--meta_cache", help="Optional SQLite file caching PDF page counts and hashes between runs (used by --policy valid_pages and --duplicates_report)")
+    parser.add_argument("--duplicates_report", help="Optional JSON file listing clusters of byte-identical PDFs (input for step_2 --duplicates)")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes hashing files for --duplicates_report (default: 1)")
 
     args = parser.parse_args()
+    source_dirs = source_dirs_from_args(parser, args)
 
-    process_pdfs(args.dir_a, args.dir_b, args.input, args.output)
+    process_pdfs(source_dirs, args.input, args.output, args.policy, args.prefer, args.inventory_cache, args.refresh_inventory, args.meta_cache, args.duplicates_report, args.workers)
 
 if __name__ == "__main__":
     main()
-
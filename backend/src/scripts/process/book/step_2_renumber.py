@@ -3,29 +3,70 @@ Script to renumber books, update page/size information, and optionally organize
 
 This script performs the following operations:
 1. Reads a list of books from a JSON input.
-2. Locates the corresponding PDF files in two specified directories (Directory A and Directory B).
-3. Selects the smallest PDF file if it exists in both directories.
-4. Calculates the file size and page count (using pypdf or regex fallback).
+2. Locates the corresponding PDF files in the mirror directories (A, B, C, ...),
+   using a single listing of each directory (optionally cached with --inventory_cache).
+3. Selects one copy with the selection policy (smallest by default; see pdf_sources.py)
+   and records the chosen mirror in the book's 'source' field.
+4. Calculates the file size and page count (from the PDF trailer/xref, with pypdf or a
+   chunked scan as fallback for broken files), optionally
+   in a pool of --workers processes once all IDs have been assigned. With --meta_cache,
+   page count, encryption flag and (with --hash) SHA-256 are cached in SQLite per
+   (path, size, mtime), so unchanged PDFs are not opened again on later runs.
 5. Renumbers the book IDs sequentially starting from a given integer.
 6. Generates a unique 'cloudFile' name based on the new ID and a hash.
 7. Outputs the updated book list to a JSON file.
-8. (Optional) Copies the selected smallest PDF to a specified output directory with the new 'cloudFile' name.
+8. (Optional) Copies the selected PDF to a specified output directory with the new 'cloudFile' name,
+   using a thread pool with kernel-side copies (or hardlinks/reflinks with --link_mode).
+   Identical destinations are skipped and finished copies are journaled, so an
+   interrupted run resumes where it stopped.
 9. (Optional) Exports specific book data to a CSV file.
+10. (Optional) With --optimize (requires --process), the selected PDFs are rewritten for the
+    web before copying (recompressed streams, merged duplicate images/fonts, linearized when
+    supported; see pdf_optimize.py) in a pool of --workers processes. 'size' then holds the
+    optimized size and 'originalSize' the size before; a file that does not get smaller is
+    copied unchanged.
+11. (Optional) With --duplicates (the report of step_1_smallest_pdf.py --duplicates_report),
+    a book whose selected copy is byte-identical to the one of an earlier book keeps its own
+    cloudFile, but its file is placed as a hardlink (or reflink with --link_mode reflink) to
+    the earlier book's file instead of being read from the mirror and copied again.
+12. (Optional) With --shard digit|hash (and --process), the PDFs are spread over
+    subdirectories of output_dir (by bookId // 1000 like the app's PDF URLs, or by
+    --shard_levels levels of a hash prefix) instead of one flat directory, and a manifest
+    (bookId -> relative path, files per shard) is written; see cloud_layout.py. cloudFile
+    itself stays the file name.
+13. (Optional) With --output_columnar, bookId/size/page/class/curriculum/publisher are
+    exported as typed, dictionary-encoded columns (.parquet with pyarrow or .npz with NumPy)
+    for fast reports; see columnar_export.py.
 
 Usage:
-    python process/step_2_renumber.py --dir_a <path_to_dir_a> --dir_b <path_to_dir_b> --input <input_json> [--output <output_json>] [--start_id <start_id>] [--output_dir <output_dir> --process] [--output_csv <output_csv>]
+    python process/step_2_renumber.py --dir_a <path_to_dir_a> --dir_b <path_to_dir_b> --input <input_json> [--output <output_json>] [--start_id <start_id>] [--output_dir <output_dir> --process] [--output_csv <output_csv>] [--inventory_cache <cache_json>] [--workers <n>] [--meta_cache <cache.sqlite> [--hash]] [--copy_workers <n>] [--link_mode none|hardlink|reflink] [--duplicates <duplicates_json>] [--optimize] [--output_columnar <books.parquet|books.npz>] [--shard flat|digit|hash [--shard_levels <n>] [--shard_manifest <manifest_json>]]
+    python process/step_2_renumber.py --dirs <dir_1> <dir_2> <dir_3> <dir_4> --input <input_json> [--policy smallest|newest|valid_pages|preferred] [--prefer C]
 """
 
 import argparse
-import json
 import os
-import shutil
 import csv
 import urllib.parse
-import re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import hashlib
 
+from book_record import load_books
+from catalog_io import save_catalog
+from cloud_layout import MAX_HASH_LEVELS, SHARD_FLAT, SHARD_HASH, SHARD_MANIFEST_NAME, SHARD_MODES, ShardManifest
+from columnar_export import columnar_format, export_columnar
+from content_dedup import load_duplicate_groups, path_key
+from copy_engine import CopyEngine, CopyTask, LINK_HARDLINK, LINK_MODES, LINK_NONE
+from parallel import bounded_map
+from pdf_meta_cache import PdfMeta, PdfMetaCache, file_sha256
+from pdf_optimize import PdfOptimizer
+from pdf_pagecount import read_pdf_info, scan_page_count
+from pdf_sources import SourceResolver, Selection, POLICY_SMALLEST, add_source_arguments, build_sources, source_dirs_from_args
+
+# Journal of finished copies in output_dir, used to resume an interrupted --process run
+COPY_JOURNAL_NAME = ".copy_journal.jsonl"
+# Record of optimized files in output_dir, so unchanged sources are not optimized again
+OPTIMIZE_MANIFEST_NAME = ".optimize_manifest.json"
+
 # Attempt to import PDF libraries for page counting
 HAS_PDF_LIB = False
 try:
@@ -46,8 +87,13 @@ def get_filename_from_url(url: Optional[str]) -> str:
 def get_pdf_page_count(filepath: str) -> int:
     """
     Returns the number of pages in a PDF file.
-    Uses pypdf if available, otherwise falls back to a regex approximation.
+    Reads /Count from the page tree via the memory-mapped xref/trailer first; if the
+    structure is broken, uses pypdf if available, otherwise a chunked marker scan.
     """
+    info = read_pdf_info(filepath)
+    if info.page_count is not None:
+        return info.page_count
+
     if HAS_PDF_LIB:
         try:
             with open(filepath, 'rb') as f:
@@ -66,16 +112,28 @@ def get_pdf_page_count(filepath: str) -> int:
             # print(f"Warning: Failed to count pages with {PDF_LIB} for {filepath}: {e}")
             pass
             
-    # Fallback: Regex approximation
-    try:
-        with open(filepath, 'rb') as f:
-            content = f.read()
-            # Look for /Type /Page
-            return len(re.findall(br"/Type\s*/Page\b", content))
-    except Exception:
-        return 0
-
-def process_books(dir_a: str, dir_b: str, input_file: str, output_file: str, start_id: int, output_dir: Optional[str] = None, process: bool = False, output_csv: Optional[str] = None) -> None:
+    # Fallback: bounded-memory scan for /Type /Page markers
+    return scan_page_count(filepath)
+
+def read_pdf_meta(task: Tuple[str, bool]) -> PdfMeta:
+    """
+    Compute the metadata of one PDF (worker function for the page-count pool).
+
+    Args:
+        task (Tuple[str, bool]): (path of the PDF, whether to compute its SHA-256)
+    """
+    filepath, with_hash = task
+    info = read_pdf_info(filepath)
+    page_count = info.page_count if info.page_count is not None else get_pdf_page_count(filepath)
+    sha256 = None
+    if with_hash:
+        try:
+            sha256 = file_sha256(filepath)
+        except OSError:
+            pass
+    return PdfMeta(page_count, sha256, info.encrypted)
+
+def process_books(source_dirs: List[Optional[str]], input_file: str, output_file: str, start_id: int, output_dir: Optional[str] = None, process: bool = False, output_csv: Optional[str] = None, policy: str = POLICY_SMALLEST, preferred: Optional[str] = None, inventory_cache: Optional[str] = None, refresh_inventory: bool = False, workers: int = 1, meta_cache_file: Optional[str] = None, with_hash: bool = False, copy_workers: int = 4, link_mode: str = LINK_NONE, duplicates_file: Optional[str] = None, optimize: bool = False, columnar_file: Optional[str] = None, shard_mode: str = SHARD_FLAT, shard_levels: int = 1, shard_manifest: Optional[str] = None) -> None:
     print(f"Reading input from: {input_file}")
     
     if not os.path.exists(input_file):
@@ -83,13 +141,44 @@ def process_books(dir_a: str, dir_b: str, input_file: str, output_file: str, sta
         return
 
     try:
-        with open(input_file, 'r', encoding='utf-8') as f:
-            books: List[Dict[str, Any]] = json.load(f)
+        books: List[Dict[str, Any]] = load_books(input_file)
     except Exception as e:
         print(f"Error reading input file: {e}")
         return
 
-    print(f"Checking folders:\n A: {dir_a}\n B: {dir_b}\n")
+    renumber_books(books, source_dirs, output_file, start_id, output_dir, process, output_csv, policy, preferred, inventory_cache, refresh_inventory, workers, meta_cache_file, with_hash, copy_workers, link_mode, duplicates_file, optimize, columnar_file, shard_mode, shard_levels, shard_manifest)
+
+def renumber_books(books: List[Dict[str, Any]], source_dirs: List[Optional[str]], output_file: Optional[str], start_id: int, output_dir: Optional[str] = None, process: bool = False, output_csv: Optional[str] = None, policy: str = POLICY_SMALLEST, preferred: Optional[str] = None, inventory_cache: Optional[str] = None, refresh_inventory: bool = False, workers: int = 1, meta_cache_file: Optional[str] = None, with_hash: bool = False, copy_workers: int = 4, link_mode: str = LINK_NONE, duplicates_file: Optional[str] = None, optimize: bool = False, columnar_file: Optional[str] = None, shard_mode: str = SHARD_FLAT, shard_levels: int = 1, shard_manifest: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Renumber already loaded books, update their size/page/cloudFile, copy the PDFs and
+    write the outputs (the body of process_books, also used by run_pipeline.py).
+
+    Returns:
+        List[Dict[str, Any]]: The processed books, in input order
+            (an empty list if the duplicates file cannot be read)
+    """
+    # Cluster number per attachment filename, for PDFs known to be identical
+    duplicate_groups: Dict[str, int] = {}
+    if duplicates_file:
+        try:
+            duplicate_groups = load_duplicate_groups(duplicates_file)
+            print(f"Loaded {len(duplicate_groups)} duplicate files from {duplicates_file}")
+        except Exception as e:
+            print(f"Error reading duplicates file: {e}")
+            return []
+
+    sources = build_sources(source_dirs, inventory_cache, refresh_inventory)
+    meta_cache = PdfMetaCache(meta_cache_file) if meta_cache_file else None
+    resolver = SourceResolver(sources, policy, preferred, get_pdf_page_count, meta_cache)
+    
+    print("Checking folders:")
+    for source in sources:
+        print(f" {source.label}: {source.directory}")
+    print(f"Selection policy: {policy}\n")
+    
+    # Resolve every attachment against all folder listings in one pass
+    filenames = [get_filename_from_url(book.get("attachment")) for book in books]
+    candidates_by_name = resolver.resolve_all(filenames)
     
     processed_books: List[Dict[str, Any]] = []
     
@@ -98,12 +187,22 @@ def process_books(dir_a: str, dir_b: str, input_file: str, output_file: str, sta
 
     num_found: int = 0
     num_missing: int = 0
+    num_shared: int = 0
+    # First book seen in each duplicate cluster, with its destination under output_dir
+    cluster_firsts: Dict[int, Tuple[Dict[str, Any], Optional[str]]] = {}
     next_id: int = start_id
+    # Files to copy into output_dir once all books are numbered
+    copy_tasks: List[CopyTask] = []
+    # Duplicates placed as links to the first book's file once that one is in place
+    link_tasks: List[CopyTask] = []
+    # Books per cloudFile, to update sizes after optimization
+    cloud_file_books: Dict[str, List[Dict[str, Any]]] = {}
+    # Books whose page count is still needed, with their selected PDF
+    pending_pages: List[Tuple[Dict[str, Any], Selection]] = []
+    # Relative path of each cloudFile under output_dir
+    manifest = ShardManifest(shard_mode, shard_levels)
 
-    for book in books:
-        attachment_url = book.get("attachment")
-        filename = get_filename_from_url(attachment_url)
-        
+    for book, filename in zip(books, filenames):
         if not filename:
             # Skip or keep? If we are renumbering a clean list, we might skip invalid ones.
             # But "output very like input" suggests keeping unless told otherwise.
@@ -115,58 +214,52 @@ def process_books(dir_a: str, dir_b: str, input_file: str, output_file: str, sta
             num_missing += 1 # type: ignore
             continue
 
-        path_a = os.path.join(dir_a, filename)
-        path_b = os.path.join(dir_b, filename)
-        
-        stat_a = os.stat(path_a) if os.path.exists(path_a) else None
-        stat_b = os.stat(path_b) if os.path.exists(path_b) else None
-        
-        size_a = stat_a.st_size if stat_a else None
-        size_b = stat_b.st_size if stat_b else None
-        
-        selected_path = None
-        selected_size = 0
-        
-        # Determine smallest / existing
-        # Explicitly cast to int for comparison if not None, though logic guarantees it
-        safe_size_a = size_a if size_a is not None else float('inf')
-        safe_size_b = size_b if size_b is not None else float('inf')
-
-        if stat_a and stat_b:
-            if safe_size_a < safe_size_b:
-                selected_path = path_a
-                selected_size = size_a
-            else:
-                selected_path = path_b
-                selected_size = size_b
-        elif stat_a:
-            selected_path = path_a
-            selected_size = size_a
-        elif stat_b:
-            selected_path = path_b
-            selected_size = size_b
+        selected = resolver.choose(candidates_by_name[filename])
             
-        if selected_path:
-            page_count = get_pdf_page_count(selected_path)
+        if selected:
+            selected_path = selected.path
+            selected_size = selected.size
             
             # Update book info
             book['size'] = selected_size
-            book['page'] = page_count
+            # The valid_pages policy has already counted the chosen file; others are counted below.
+            # With --hash, counted files are still queued so their SHA-256 is computed and cached.
+            book['page'] = selected.page_count
+            if selected.page_count is None or (with_hash and meta_cache):
+                pending_pages.append((book, selected))
             book['bookId'] = next_id # Renumber
             
             key_id: str = hashlib.md5(str(next_id).encode('utf-8')).hexdigest()
             book['cloudFile'] = '%04d_%s.pdf' % (next_id, key_id[:4])
 
             book['filename'] = filename
-            
-            if process and output_dir:
-                 if os.path.exists(output_dir):
-                    dest_path = os.path.join(output_dir, book['cloudFile'])
-                    try:
-                        shutil.copy2(selected_path, dest_path)
-                        # print(f"Copied to {dest_path}")
-                    except Exception as e:
-                        print(f"Error copying file {filename} to {dest_path}: {e}")
+            book['source'] = selected.label
+
+            relpath = manifest.add(book['bookId'], book['cloudFile'])
+            dest_path = None
+            if process and output_dir and os.path.exists(output_dir):
+                dest_path = os.path.join(output_dir, *relpath.split("/"))
+
+            # Clusters are matched on the selected copy itself, not its filename
+            cluster = duplicate_groups.get(path_key(selected_path))
+            first = cluster_firsts.get(cluster) if cluster is not None else None
+            if first is None:
+                if cluster is not None:
+                    cluster_firsts[cluster] = (book, dest_path)
+                if dest_path:
+                    copy_tasks.append(CopyTask(selected_path, dest_path))
+                if optimize:
+                    cloud_file_books.setdefault(book['cloudFile'], []).append(book)
+            else:
+                first_book, first_dest = first
+                num_shared += 1
+                if dest_path and first_dest:
+                    link_tasks.append(CopyTask(first_dest, dest_path))
+                elif dest_path:
+                    copy_tasks.append(CopyTask(selected_path, dest_path))
+                if optimize:
+                    # Linked to the first book's file, so it gets the same optimized size
+                    cloud_file_books.setdefault(first_book['cloudFile'], []).append(book)
             
             processed_books.append(book)
             next_id += 1 # type: ignore
@@ -187,17 +280,81 @@ def process_books(dir_a: str, dir_b: str, input_file: str, output_file: str, sta
             # next_id += 1 # type: ignore
             num_missing += 1 # type: ignore
 
+    # IDs are already assigned in input order; count pages (in parallel with workers > 1)
+    # and merge the results back into the same books. Unchanged PDFs are served from the meta cache.
+    if meta_cache and pending_pages:
+        cached = meta_cache.get_many((sel.path, sel.size, sel.mtime_ns) for _, sel in pending_pages)
+        uncached = []
+        for book, sel in pending_pages:
+            meta = cached.get(sel.path)
+            if meta is not None and meta.page_count is not None and (meta.sha256 or not with_hash):
+                book['page'] = meta.page_count
+            else:
+                uncached.append((book, sel))
+        print(f"Meta cache: {len(pending_pages) - len(uncached)} hit(s), {len(uncached)} miss(es)")
+        pending_pages = uncached
+
+    if pending_pages:
+        print(f"Counting pages of {len(pending_pages)} PDFs with {max(1, workers)} worker(s)...")
+        # Without a meta cache the digest would be thrown away, so it is not computed
+        tasks = ((sel.path, with_hash and meta_cache is not None) for _, sel in pending_pages)
+        for (book, sel), meta in zip(pending_pages, bounded_map(read_pdf_meta, tasks, workers)):
+            book['page'] = meta.page_count
+            if meta_cache:
+                meta_cache.put(sel.path, sel.size, sel.mtime_ns, meta)
+
+    if meta_cache:
+        meta_cache.close()
+
+    if process and output_dir and (copy_tasks or link_tasks):
+        for shard in manifest.shard_dirs():
+            os.makedirs(os.path.join(output_dir, *shard.split("/")), exist_ok=True)
+
+    if optimize and copy_tasks:
+        print(f"Optimizing {len(copy_tasks)} PDFs with {max(1, workers)} worker(s)...")
+        optimizer = PdfOptimizer(workers, os.path.join(output_dir, OPTIMIZE_MANIFEST_NAME))
+        optimized: Dict[str, Tuple[int, int]] = {}
+        for result in optimizer.run(copy_tasks):
+            if result.error:
+                print(f"Error optimizing file {result.task.src}: {result.error}")
+            elif result.optimized_size is not None:
+                optimized[result.task.dest] = (result.original_size, result.optimized_size)
+        # Optimized files are already in place; the others are copied unchanged
+        copy_tasks = [task for task in copy_tasks if task.dest not in optimized]
+        for dest_path, (original_size, optimized_size) in optimized.items():
+            for book in cloud_file_books.get(os.path.basename(dest_path), []):
+                book['originalSize'] = original_size
+                book['size'] = optimized_size
+
+    if copy_tasks:
+        print(f"Copying {len(copy_tasks)} PDFs to {output_dir}...")
+        engine = CopyEngine(copy_workers, link_mode, journal_path=os.path.join(output_dir, COPY_JOURNAL_NAME))
+        for failure in engine.run(copy_tasks):
+            print(f"Error copying file {failure.task.src} to {failure.task.dest}: {failure.error}")
+
+    if link_tasks:
+        # Sources are files already placed in output_dir, so a link is always possible
+        # there; CopyEngine falls back to a copy if the filesystem refuses it
+        print(f"Linking {len(link_tasks)} identical PDFs in {output_dir}...")
+        engine = CopyEngine(copy_workers, link_mode if link_mode != LINK_NONE else LINK_HARDLINK,
+                            journal_path=os.path.join(output_dir, COPY_JOURNAL_NAME))
+        for failure in engine.run(link_tasks):
+            print(f"Error linking file {failure.task.src} to {failure.task.dest}: {failure.error}")
+
     print("-" * 60)
-    print(f"Writing output to: {output_file}")
+    if output_file:
+        print(f"Writing output to: {output_file}")
     
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(processed_books, f, indent=2, ensure_ascii=False)
+        if output_file:
+            save_catalog(processed_books, output_file)
             
         print(f"Total processed: {len(processed_books)}")
         print(f"Total processed: {len(processed_books)}")
         print(f"Found & Updated: {num_found}")
         print(f"Missing: {num_missing}")
+        if duplicates_file:
+            print(f"Linked to the PDF of an identical book: {num_shared}")
         print("Done.")
 
     except Exception as e:
@@ -212,37 +369,81 @@ def process_books(dir_a: str, dir_b: str, input_file: str, output_file: str, sta
                 
                 writer.writeheader()
                 for book in processed_books:
-                    row = {
-                        'bookId': book.get('bookId'),
-                        'versionId': 2,
-                        'groupId': -1,
-                        'educationId': book.get('class', ""),
-                        'title': book.get('title', ""),
-                        'author': book.get('writer', ""),
-                        'year': book.get('curriculum', ""),
-                        'pages': book.get('page', 0), # Using calculated page (key 'page') mapping to CSV 'pages'
-                        'size': book.get('size', 0)
-                    }
-                    writer.writerow(row)
+                    writer.writerow(book_csv_row(book))
             print(f"CSV output written successfully.")
         except Exception as e:
             print(f"Error writing CSV file: {e}")
 
+    if shard_manifest or (output_dir and shard_mode != SHARD_FLAT):
+        manifest_path = shard_manifest or os.path.join(output_dir, SHARD_MANIFEST_NAME)
+        manifest.print_summary()
+        try:
+            manifest.save(manifest_path)
+            print(f"Shard manifest written to: {manifest_path}")
+        except Exception as e:
+            print(f"Error writing shard manifest: {e}")
+
+    if columnar_file:
+        print(f"Writing columnar output to: {columnar_file}")
+        try:
+            rows = export_columnar(processed_books, columnar_file)
+            print(f"Columnar output written successfully ({rows} rows).")
+        except Exception as e:
+            print(f"Error writing columnar file: {e}")
+
+    return processed_books
+
+def book_csv_row(book: Dict[str, Any]) -> Dict[str, Any]:
+    """Map a processed book to a row of the output CSV (the input of step_4_csv_to_sql.py)."""
+    return {
+        'bookId': book.get('bookId'),
+        'versionId': 2,
+        'groupId': -1,
+        'educationId': book.get('class', ""),
+        'title': book.get('title', ""),
+        'author': book.get('writer', ""),
+        'year': book.get('curriculum', ""),
+        'pages': book.get('page', 0), # Using calculated page (key 'page') mapping to CSV 'pages'
+        'size': book.get('size', 0)
+    }
+
 def main():
     parser = argparse.ArgumentParser(description="Renumber books and update PDF metadata.")
-    parser.add_argument("--dir_a", required=True, help="Path to the first directory (Directory A)")
-    parser.add_argument("--dir_b", required=True, help="Path to the second directory (Directory B)")
+    add_source_arguments(parser)
     parser.add_argument("--input", required=True, help="Path to the input JSON file")
     parser.add_argument("--output", default="renumbered_books.json", help="Path to the output JSON file")
     parser.add_argument("--start_id", type=int, default=1, help="Starting number for bookId (default: 1)")
     parser.add_argument("--output_dir", help="Directory to save processed PDF files")
-    parser.add_argument("--process", action="store_true", default=False, help="If set, copy smallest PDF to output_dir with new name")
+    parser.add_argument("--process", action="store_true", default=False, help="If set, copy the selected PDF to output_dir with new name")
     parser.add_argument("--output_csv", help="Path to the output CSV file")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to count PDF pages (default: 1)")
+    parser.add_argument("--meta_cache", help="Optional SQLite file caching PDF metadata between runs, e.g. next to the output JSON")
+    parser.add_argument("--hash", action="store_true", default=False, help="Also compute and cache the SHA-256 of each selected PDF (requires --meta_cache)")
+    parser.add_argument("--copy_workers", type=int, default=4, help="Number of threads copying PDFs with --process (default: 4)")
+    parser.add_argument("--optimize", action="store_true", default=False, help="With --process, rewrite the PDFs for the web (recompress, dedupe, linearize) before copying; requires PyMuPDF")
+    parser.add_argument("--duplicates", help="Duplicate report from step_1_smallest_pdf.py --duplicates_report; books with an identical selected PDF get a link to the first one's file instead of a copy")
+    parser.add_argument("--link_mode", choices=LINK_MODES, default=LINK_NONE, help="With --process, hardlink or reflink PDFs on the same filesystem instead of copying (default: none)")
+    parser.add_argument("--shard", choices=SHARD_MODES, default=SHARD_FLAT, help="Layout of the PDFs in output_dir: flat, digit (bookId // 1000, as in the app's PDF URLs) or hash (hash prefix directories) (default: flat)")
+    parser.add_argument("--shard_levels", type=int, default=1, help=f"Directory levels with --shard hash, 256 directories each (1-{MAX_HASH_LEVELS}, default: 1)")
+    parser.add_argument("--shard_manifest", help=f"Path of the bookId -> relative path manifest (default: <output_dir>/{SHARD_MANIFEST_NAME} with --shard digit|hash)")
+    parser.add_argument("--output_columnar", help="Optional columnar export for reports: .parquet (requires pyarrow) or .npz (requires NumPy)")
 
     args = parser.parse_args()
+    source_dirs = source_dirs_from_args(parser, args)
 
     if args.process and not args.output_dir:
         parser.error("--process requires --output_dir to be specified.")
+    if args.optimize and not args.process:
+        parser.error("--optimize requires --process.")
+    if args.hash and not args.meta_cache:
+        parser.error("--hash requires --meta_cache.")
+    if args.output_columnar:
+        try:
+            columnar_format(args.output_columnar)
+        except (ValueError, RuntimeError) as e:
+            parser.error(f"--output_columnar: {e}")
+    if args.shard == SHARD_HASH and not 1 <= args.shard_levels <= MAX_HASH_LEVELS:
+        parser.error(f"--shard_levels must be between 1 and {MAX_HASH_LEVELS}.")
 
     if args.output_dir and not os.path.exists(args.output_dir):
         try:
@@ -252,7 +453,7 @@ def main():
              print(f"Error creating output directory {args.output_dir}: {e}")
              return
 
-    process_books(args.dir_a, args.dir_b, args.input, args.output, args.start_id, args.output_dir, args.process, args.output_csv)
+    process_books(source_dirs, args.input, args.output, args.start_id, args.output_dir, args.process, args.output_csv, args.policy, args.prefer, args.inventory_cache, args.refresh_inventory, args.workers, args.meta_cache, args.hash, args.copy_workers, args.link_mode, args.duplicates, args.optimize, args.output_columnar, args.shard, args.shard_levels, args.shard_manifest)
 
 if __name__ == "__main__":
     main()
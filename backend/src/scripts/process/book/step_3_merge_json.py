@@ -5,15 +5,37 @@ This program reads JSON files provided via command line arguments, extracts uniq
 by their ID and ISBN fields, sorts them in ascending order by ID, and saves 
 the result to a new JSON file.
 
+With --external, input files are streamed record by record and both outputs are
+sorted with an external merge sort (sorted run files on disk, merged with a heap),
+so memory stays within --memory_mb plus the de-duplication keys. The output is the
+same as the default in-memory mode.
+
 Usage:
     python process/step_3_merge_json.py data/file1.json data/file2.json -o result.json
     python process/step_3_merge_json.py data/*.json
+    python process/step_3_merge_json.py data/*.json --external [--memory_mb 256] [--tmp_dir /tmp]
+    python process/step_3_merge_json.py data/*.json --state merge_state.sqlite [--rebuild]
+
+With --state, only input files whose content was not merged before are read; their
+books are de-duplicated against the stored keys of earlier runs and merged into the
+existing (sorted) outputs. The result is the same as a full run over all files, in the
+order they were first merged.
 """
 
-import json
+import heapq
+import os
 import argparse
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+
+from book_identity import BookIdentityIndex, KEY_ID, KEY_ISBN_CLASS_FILE, format_match
+from book_record import as_books, load_books
+from catalog_io import CatalogFormatError, is_ndjson_path, iter_catalog, open_catalog_writer, save_catalog
+from external_sort import ExternalSorter
+from merge_state import MergeState
+
+# Identity keys a book is de-duplicated on, checked in this order
+DEDUP_KEYS = [KEY_ID, KEY_ISBN_CLASS_FILE]
 
 def read_json_files(file_paths):
     """
@@ -30,17 +52,70 @@ def read_json_files(file_paths):
             continue
             
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                books = json.load(f)
-                if isinstance(books, list):
-                    print(f"Loaded {len(books)} books from {file_path.name}")
-                    all_books.extend(books)
-                else:
-                    print(f"Warning: Content of {file_path.name} is not a list. Skipping.")
+            books = load_books(file_path)
+            print(f"Loaded {len(books)} books from {file_path.name}")
+            all_books.extend(books)
+        except CatalogFormatError as e:
+            # Valid JSON of the wrong shape; a malformed or truncated file is reported below
+            print(f"Warning: Content of {file_path.name} is not a list of books ({e}). Skipping.")
         except Exception as e:
             print(f"Error reading {file_path}: {e}")
     return all_books
 
+def iter_json_files(file_paths) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the books of the provided JSON files one at a time, in file order.
+
+    Unlike read_json_files, a file that turns out to be broken part way keeps
+    the books read before the error.
+    """
+    print(f"Processing {len(file_paths)} input files...")
+
+    for file_path_str in file_paths:
+        file_path = Path(file_path_str)
+        if not file_path.exists():
+            print(f"Warning: File {file_path} does not exist. Skipping.")
+            continue
+
+        count = 0
+        try:
+            for book in as_books(iter_catalog(file_path)):
+                count += 1
+                yield book
+            print(f"Loaded {count} books from {file_path.name}")
+        except Exception as e:
+            print(f"Error reading {file_path} after {count} books: {e}")
+
+def classify_books(books: Iterable[Dict[str, Any]], identity: Optional[BookIdentityIndex] = None) -> Iterator[Tuple[bool, Dict[str, Any]]]:
+    """
+    De-duplicate books by ID and ISBN in input order.
+
+    Args:
+        books: Books in input order
+        identity (Optional[BookIdentityIndex]): Index of already known books (default: a new empty one)
+
+    Yields:
+        Tuple[bool, Dict]: (True, book) for a unique book, (False, book with "reason") for a duplicate
+    """
+    # Duplicate if ID seen OR (ISBN, class, attachment filename) seen (if ISBN not empty)
+    if identity is None:
+        identity = BookIdentityIndex(DEDUP_KEYS)
+
+    for book in as_books(books):
+        # Ensure isbn key exists
+        if 'isbn' not in book:
+            book['isbn'] = ""
+
+        if not book.get('attachment'):
+            yield False, book.copy(reason="empty_attachment")
+            continue
+
+        found = identity.check_and_add(book)
+        if found is None:
+            yield True, book
+        else:
+            yield False, book.copy(reason=format_match(found))
+
 def get_unique_books(books):
     """
     Filter books to get unique entries by ID and ISBN.
@@ -48,57 +123,139 @@ def get_unique_books(books):
     """
     unique_books: List[Dict[str, Any]] = []
     duplicate_books: List[Dict[str, Any]] = []
-    seen_ids = set()
-    seen_isbn_configs = set()
-    
-    for book in books:
-        # Ensure isbn key exists
-        if 'isbn' not in book:
-            book['isbn'] = ""
-            
-        book_id = book.get('id')
-        isbn = book.get('isbn')
-        class_key = book.get('class', '')
-        attachment = book.get('attachment')
-        
-        if not attachment:
-            duplicate_books.append({**book, "reason": "empty_attachment"})
-            continue
-        
-        # Extract filename from attachment URL
-        attachment_filename = Path(attachment).name
-        
-        # Clean ISBN and Class for comparison
-        clean_isbn = str(isbn).strip() if isbn else ""
-        clean_class = str(class_key).strip()
-        isbn_config = (clean_isbn, clean_class, attachment_filename)
-        
-        # Check uniqueness: duplicate if ID seen OR ISBN seen (if not empty)
-        duplicate_reason = ""
-        if book_id and book_id in seen_ids:
-            duplicate_reason = f"duplicate_id:{book_id}"
-        elif clean_isbn and isbn_config in seen_isbn_configs:
-            duplicate_reason = f"duplicate_isbn_class_file:{clean_isbn}:{clean_class}:{attachment_filename}"
-            
-        if not duplicate_reason:
+
+    for is_unique, book in classify_books(books):
+        if is_unique:
             unique_books.append(book)
-            if book_id:
-                seen_ids.add(book_id)
-            if clean_isbn:
-                seen_isbn_configs.add(isbn_config)
         else:
-            duplicate_books.append({**book, "reason": duplicate_reason})
-    
+            duplicate_books.append(book)
+
     return unique_books, duplicate_books
 
+def book_sort_key(book: Dict[str, Any]) -> Any:
+    return book.get('id', 0)
+
+def merge_books_external(file_paths, output_file, dup_output_file, memory_budget: int, tmp_dir: Optional[str] = None) -> None:
+    """
+    Stream all input files through de-duplication into two external sorters,
+    then write both outputs sorted by ID with a k-way merge of the run files.
+
+    Args:
+        file_paths: Input JSON files, in priority order
+        output_file: Path of the unique books JSON
+        dup_output_file: Path of the duplicate books JSON
+        memory_budget (int): Approximate bytes of buffered records, shared by both outputs
+        tmp_dir (Optional[str]): Directory for run files
+    """
+    unique_sorter = ExternalSorter(book_sort_key, memory_budget // 2, tmp_dir)
+    duplicate_sorter = ExternalSorter(book_sort_key, memory_budget // 2, tmp_dir)
+
+    try:
+        total = 0
+        for is_unique, book in classify_books(iter_json_files(file_paths)):
+            (unique_sorter if is_unique else duplicate_sorter).add(book)
+            total += 1
+        print(f"Total books found: {total}")
+        print(f"Sorted runs on disk: {len(unique_sorter.runs)} unique, {len(duplicate_sorter.runs)} duplicate")
+
+        for sorter, path, description in ((unique_sorter, output_file, "unique books"), (duplicate_sorter, dup_output_file, "duplicate books")):
+            try:
+                with open_catalog_writer(path) as writer:
+                    for book in sorter.sorted():
+                        writer.write(book)
+                print(f"Saved {writer.count} {description} to {path}")
+            except Exception as e:
+                print(f"Error saving to {path}: {e}")
+    finally:
+        unique_sorter.cleanup()
+        duplicate_sorter.cleanup()
+
+def merge_books_incremental(file_paths, output_file, dup_output_file, state_file: str, rebuild: bool = False, memory_budget: int = 256 << 20, tmp_dir: Optional[str] = None) -> None:
+    """
+    Merge only the input files not seen by earlier runs into the existing outputs.
+
+    Args:
+        file_paths: Input JSON files; files whose content was already merged are skipped
+        output_file: Path of the unique books JSON (read and rewritten)
+        dup_output_file: Path of the duplicate books JSON (read and rewritten)
+        state_file (str): SQLite merge state
+        rebuild (bool): If True, forget the state and merge all files from scratch
+        memory_budget (int): Approximate bytes of buffered new records
+        tmp_dir (Optional[str]): Directory for run files
+    """
+    with MergeState(state_file) as state:
+        if rebuild:
+            state.clear()
+        outputs = [output_file, dup_output_file]
+        has_outputs = state.has_outputs()
+        if has_outputs and not state.outputs_current(outputs):
+            print(f"Error: {output_file} or {dup_output_file} changed since the last merge recorded in {state_file}. Run again with --rebuild and all input files.")
+            return
+
+        new_files: List[Tuple[str, str]] = []
+        new_digests = set()
+        for file_path_str in file_paths:
+            if not Path(file_path_str).exists():
+                print(f"Warning: File {file_path_str} does not exist. Skipping.")
+                continue
+            sha256, merged = state.input_digest(file_path_str)
+            if merged or sha256 in new_digests:
+                print(f"Skipping {Path(file_path_str).name}: already merged")
+                continue
+            new_digests.add(sha256)
+            new_files.append((file_path_str, sha256))
+
+        if not new_files:
+            print("Nothing new to merge.")
+            return
+
+        identity = BookIdentityIndex(DEDUP_KEYS)
+
+        def seeded(books: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+            for book in books:
+                state.seed(identity, book)
+                yield book
+
+        unique_sorter = ExternalSorter(book_sort_key, memory_budget // 2, tmp_dir)
+        duplicate_sorter = ExternalSorter(book_sort_key, memory_budget // 2, tmp_dir)
+        try:
+            total = 0
+            new_unique = 0
+            for is_unique, book in classify_books(seeded(iter_json_files([path for path, _ in new_files])), identity):
+                (unique_sorter if is_unique else duplicate_sorter).add(book)
+                new_unique += is_unique
+                total += 1
+            print(f"New books found: {total} ({new_unique} unique, {total - new_unique} duplicates)")
+
+            # Old records come first on equal IDs, as in a full run over the files in merge order
+            for sorter, path, description in ((unique_sorter, output_file, "unique books"), (duplicate_sorter, dup_output_file, "duplicate books")):
+                old_books = iter_catalog(path) if has_outputs else iter([])
+                # Both outputs are replaced together once both are written
+                tmp_path = f"{path}.tmp"
+                with open_catalog_writer(tmp_path, ndjson=is_ndjson_path(path)) as writer:
+                    for book in heapq.merge(old_books, sorter.sorted(), key=book_sort_key):
+                        writer.write(book)
+                print(f"Merged into {writer.count} {description}")
+        finally:
+            unique_sorter.cleanup()
+            duplicate_sorter.cleanup()
+
+        for path in outputs:
+            os.replace(f"{path}.tmp", path)
+            state.record_output(path)
+            print(f"Saved {path}")
+        state.save_identity(identity)
+        for path, sha256 in new_files:
+            state.record_input(path, sha256)
+        state.commit()
+
 def save_json(data, output_file, description="records"):
     """
     Save list of books/data to a JSON file.
     """
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        print(f"Saved {len(data)} {description} to {output_file}")
+        count = save_catalog(data, output_file)
+        print(f"Saved {count} {description} to {output_file}")
     except Exception as e:
         print(f"Error saving to {output_file}: {e}")
 
@@ -107,6 +264,11 @@ def main():
     parser.add_argument("input_files", nargs='+', help="Path to input JSON file(s)")
     parser.add_argument("-o", "--output", help="Path to output JSON file", default="unique_books.json")
     parser.add_argument("-d", "--duplicates", help="Path to duplicates JSON file", default="duplicate_books.json")
+    parser.add_argument("--external", action="store_true", default=False, help="Stream inputs and sort on disk with bounded memory")
+    parser.add_argument("--memory_mb", type=int, default=256, help="Memory budget for buffered records with --external or --state (default: 256)")
+    parser.add_argument("--state", help="SQLite merge state; only input files not merged before are processed")
+    parser.add_argument("--rebuild", action="store_true", default=False, help="With --state, discard the state and merge all input files again")
+    parser.add_argument("--tmp_dir", help="Directory for sorted run files with --external or --state (default: system temp dir)")
     
     args = parser.parse_args()
     
@@ -116,6 +278,14 @@ def main():
     
     print(f"Unique output: {output_file}")
     print(f"Duplicates output: {dup_output_file}")
+
+    if args.state:
+        merge_books_incremental(input_files, output_file, dup_output_file, args.state, args.rebuild, args.memory_mb << 20, args.tmp_dir)
+        return
+
+    if args.external:
+        merge_books_external(input_files, output_file, dup_output_file, args.memory_mb << 20, args.tmp_dir)
+        return
     
     # Read all JSON files
     all_books = read_json_files(input_files)
@@ -1,14 +1,25 @@
 """
 Script to convert Book CSV data to SQL INSERT statements.
 
-This script reads a CSV file with book data and generates a SQL file containing
-INSERT statements for the `books` table.
+This script reads a CSV file with book data and generates a SQL file for the
+`books` table. Rows are streamed to the output file as they are read. Output modes:
+- insert (default): one INSERT statement per row
+- upsert: multi-row INSERT ... ON CONFLICT (book_id) DO UPDATE statements,
+  --batch_size rows each
+- copy: a COPY books (...) FROM STDIN payload (text or CSV) for psql, the fastest
+  way to bulk load an empty table
+- delta: only the changes since the previous run, using a fingerprint snapshot
+  (--snapshot, see sql_snapshot.py): upserts for new rows, UPDATEs of the changed
+  columns, and a status flip (default 'archived') for rows no longer in the CSV
 
 Expected CSV columns:
 bookId,versionId,groupId,educationId,title,author,year,pages,size,Status
 
 Usage:
     python process/step_4_csv_to_sql.py data/books.csv -o data/books_insert.sql
+    python process/step_4_csv_to_sql.py data/books.csv -o data/books_upsert.sql --mode upsert --batch_size 1000
+    python process/step_4_csv_to_sql.py data/books.csv -o data/books_copy.sql --mode copy && psql -f data/books_copy.sql
+    python process/step_4_csv_to_sql.py data/books.csv -o data/books_delta.sql --mode delta --snapshot data/books_snapshot.sqlite
 """
 
 import csv
@@ -16,6 +27,8 @@ import argparse
 from pathlib import Path
 import sys
 
+from sql_snapshot import RowSnapshot, column_hashes, changed_columns, row_hash, COLUMN_HASH_SIZE
+
 def escape_sql_string(value):
     """
     Escape single quotes for SQL string literals.
@@ -28,6 +41,37 @@ def escape_sql_string(value):
     val_str = str(value).replace("'", "''")
     return f"'{val_str}'"
 
+# Status codes in the CSV mapped to EnumContentStatus values
+STATUS_VALUES = {"1": "published", "0": "archived"}
+DEFAULT_STATUS = "unpublished"
+# Every EnumContentStatus value the export can write (choices of --removed_status)
+STATUS_NAMES = sorted(set(STATUS_VALUES.values()) | {DEFAULT_STATUS})
+
+# Columns of the books table, in output order
+BOOK_COLUMNS = [
+    "book_id", "version_id", "book_group_id", "education_grade_id",
+    "title", "author", "published_year", "total_pages", "size", "status",
+]
+
+MODE_INSERT = "insert"
+MODE_UPSERT = "upsert"
+MODE_COPY = "copy"
+MODE_DELTA = "delta"
+MODES = [MODE_INSERT, MODE_UPSERT, MODE_COPY, MODE_DELTA]
+
+COPY_FORMATS = ["text", "csv"]
+
+DEFAULT_BATCH_SIZE = 1000
+
+def status_name(status_code):
+    """
+    Map CSV Status code to an EnumContentStatus value.
+    Maps '1' -> published
+    Maps '0' -> archived
+    Default -> unpublished
+    """
+    return STATUS_VALUES.get(str(status_code).strip(), DEFAULT_STATUS)
+
 def get_status_enum(status_code):
     """
     Map CSV Status code to EnumContentStatus string.
@@ -35,28 +79,240 @@ def get_status_enum(status_code):
     Maps '0' -> 'archived'
     Default -> 'unpublished'
     """
-    val = str(status_code).strip()
-    if val == "1":
-        return "'published'"
-    if val == "0":
-        return "'archived'"
-    return "'unpublished'"
+    return f"'{status_name(status_code)}'"
+
+def parse_row(row):
+    """
+    Convert one CSV row to a tuple of column values in BOOK_COLUMNS order.
+    Raises ValueError or KeyError for an invalid row.
+    """
+    return (
+        int(row['bookId']),
+        int(row['versionId']),
+        int(row['groupId']),
+        int(row['educationId']),
+        # Text fields
+        row['title'],
+        row['author'],
+        row['year'],
+        # Numeric fields
+        int(row['pages']),
+        int(row['size']),
+        status_name(row['Status']),
+    )
+
+def iter_book_rows(reader):
+    """
+    Yield parsed rows from a csv.DictReader, reporting and skipping invalid rows.
+    """
+    for row_num, row in enumerate(reader, start=1):
+        try:
+            yield parse_row(row)
+        except (ValueError, KeyError) as e:
+            print(f"Error on row {row_num}: {e}")
+            print(f"Row data: {row}")
+            continue
 
-def process_csv_to_sql(input_file, output_file):
+def sql_literal(value):
+    """Format a Python value as a SQL literal."""
+    if value is None:
+        return "NULL"
+    if isinstance(value, int):
+        return str(value)
+    return escape_sql_string(value)
+
+def format_values(values):
+    return "(" + ", ".join(sql_literal(v) for v in values) + ")"
+
+def copy_text_field(value):
+    """Format a value for the text format of COPY (tab separated, backslash escapes)."""
+    if value is None:
+        return "\\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+def write_inserts(rows, f_out):
+    """Write one INSERT statement per row."""
+    columns = ", ".join(BOOK_COLUMNS)
+    count = 0
+    for values in rows:
+        f_out.write(f"INSERT INTO books ({columns}) VALUES {format_values(values)};\n")
+        count += 1
+    return count
+
+def write_upserts(rows, f_out, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Write multi-row INSERT ... ON CONFLICT (book_id) DO UPDATE statements,
+    batch_size rows per statement.
+
+    PostgreSQL rejects a statement that touches the same row twice, so a book_id
+    repeated within a batch keeps only its last row.
     """
-    Read CSV file and generate SQL insert statements.
+    count = 0
+    batch = {}
+    for values in rows:
+        batch[values[0]] = format_values(values)
+        count += 1
+        if len(batch) >= batch_size:
+            write_upsert_batch(batch, f_out)
+    if batch:
+        write_upsert_batch(batch, f_out)
+    return count
+
+def write_upsert_batch(batch, f_out):
+    """Write one multi-row upsert statement from a dict of book_id -> formatted value tuple and clear the batch."""
+    columns = ", ".join(BOOK_COLUMNS)
+    updates = ", ".join([f"{c} = EXCLUDED.{c}" for c in BOOK_COLUMNS if c != "book_id"] + ["updated_at = now()"])
+    f_out.write(f"INSERT INTO books ({columns}) VALUES\n")
+    f_out.write(",\n".join(batch.values()))
+    f_out.write(f"\nON CONFLICT (book_id) DO UPDATE SET {updates};\n")
+    batch.clear()
+
+def write_delta(rows, f_out, snapshot, batch_size=DEFAULT_BATCH_SIZE, removed_status="archived"):
+    """
+    Write only the changes against the fingerprint snapshot, and update the snapshot
+    (uncommitted) to the new state.
+
+    - rows not in the snapshot: batched upserts (a book_id repeated before its
+      batch is written keeps its last row)
+    - rows whose fingerprint changed: UPDATE of the changed columns only
+    - snapshot rows missing from the CSV: status set to removed_status
+
+    Returns:
+        dict: Number of inserted, updated, unchanged and removed rows
+    """
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0, "removed": 0}
+    seen = set()
+    batch = {}
+
+    f_out.write("BEGIN;\n")
+    for values in rows:
+        book_id = values[0]
+        seen.add(book_id)
+        new_hashes = column_hashes(values)
+        stored = snapshot.get(book_id)
+        if book_id in batch:
+            # Repeated row of a book still waiting in the batch: the last one wins
+            batch[book_id] = format_values(values)
+        elif stored is None:
+            batch[book_id] = format_values(values)
+            if len(batch) >= batch_size:
+                write_upsert_batch(batch, f_out)
+            counts["inserted"] += 1
+        elif stored[0] != row_hash(new_hashes):
+            sets = ", ".join(f"{BOOK_COLUMNS[i]} = {sql_literal(values[i])}" for i in changed_columns(stored[1], new_hashes) if i < len(BOOK_COLUMNS))
+            f_out.write(f"UPDATE books SET {sets}, updated_at = now() WHERE book_id = {book_id};\n")
+            counts["updated"] += 1
+        else:
+            counts["unchanged"] += 1
+            continue
+        snapshot.put(book_id, new_hashes)
+    if batch:
+        write_upsert_batch(batch, f_out)
+
+    # Rows that disappeared from the CSV and are not flipped yet
+    status_index = BOOK_COLUMNS.index("status")
+    status_slice = slice(status_index * COLUMN_HASH_SIZE, (status_index + 1) * COLUMN_HASH_SIZE)
+    removed_hash = column_hashes([removed_status])
+    removed = [(book_id, col_hashes) for book_id, col_hashes in snapshot.items()
+               if book_id not in seen and col_hashes[status_slice] != removed_hash]
+    for start in range(0, len(removed), batch_size):
+        ids = ", ".join(str(book_id) for book_id, _ in removed[start:start + batch_size])
+        f_out.write(f"UPDATE books SET status = {sql_literal(removed_status)}, updated_at = now() WHERE book_id IN ({ids});\n")
+    for book_id, col_hashes in removed:
+        snapshot.put(book_id, col_hashes[:status_slice.start] + removed_hash + col_hashes[status_slice.stop:])
+    counts["removed"] = len(removed)
+    f_out.write("COMMIT;\n")
+    return counts
+
+def write_copy(rows, f_out, copy_format="text"):
+    """Write a COPY books (...) FROM STDIN payload for psql, terminated by \\."""
+    columns = ", ".join(BOOK_COLUMNS)
+    count = 0
+    if copy_format == "csv":
+        f_out.write(f"COPY books ({columns}) FROM STDIN WITH (FORMAT csv);\n")
+        writer = csv.writer(f_out, lineterminator="\n")
+        for values in rows:
+            writer.writerow(values)
+            count += 1
+    else:
+        f_out.write(f"COPY books ({columns}) FROM STDIN;\n")
+        for values in rows:
+            f_out.write("\t".join(copy_text_field(v) for v in values) + "\n")
+            count += 1
+    f_out.write("\\.\n")
+    return count
+
+def write_sql(rows, output_file, source_name, mode=MODE_INSERT, batch_size=DEFAULT_BATCH_SIZE, copy_format="text", snapshot_file=None, removed_status="archived"):
+    """
+    Stream parsed rows (tuples in BOOK_COLUMNS order) to a SQL file in the given mode.
+    Used by process_csv_to_sql and by run_pipeline.py.
+
+    Returns:
+        int: Number of rows processed
+    """
+    output_path = Path(output_file)
+    # Ensure output directory exists
+    if output_path.parent and not output_path.parent.exists():
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Rows are written as they are read; nothing is collected in memory
+    snapshot = RowSnapshot(snapshot_file) if mode == MODE_DELTA else None
+    try:
+        with open(output_path, 'w', encoding='utf-8') as f_out:
+            if mode == MODE_DELTA:
+                f_out.write("-- Delta SQL for books table\n")
+                f_out.write(f"-- Generated from {source_name} against snapshot {Path(snapshot_file).name} ({len(snapshot)} rows)\n\n")
+                counts = write_delta(rows, f_out, snapshot, batch_size, removed_status)
+                count = counts["inserted"] + counts["updated"] + counts["unchanged"]
+                print(f"Delta: {counts['inserted']} new, {counts['updated']} changed, "
+                      f"{counts['unchanged']} unchanged, {counts['removed']} set to '{removed_status}'")
+            elif mode == MODE_COPY:
+                f_out.write("-- COPY payload for books table (run with psql)\n")
+                f_out.write(f"-- Generated from {source_name}\n\n")
+                count = write_copy(rows, f_out, copy_format)
+            elif mode == MODE_UPSERT:
+                f_out.write(f"-- SQL Upsert Statements for books table ({batch_size} rows per statement)\n")
+                f_out.write(f"-- Generated from {source_name}\n\n")
+                count = write_upserts(rows, f_out, batch_size)
+            else:
+                f_out.write("-- SQL Insert Statements for books table\n")
+                f_out.write(f"-- Generated from {source_name}\n\n")
+                count = write_inserts(rows, f_out)
+                if count == 0:
+                    f_out.write("\n")
+
+        # The snapshot only moves forward once the SQL file is complete
+        if snapshot:
+            snapshot.commit()
+    finally:
+        if snapshot:
+            snapshot.close()
+    return count
+
+def process_csv_to_sql(input_file, output_file, mode=MODE_INSERT, batch_size=DEFAULT_BATCH_SIZE, copy_format="text", snapshot_file=None, removed_status="archived"):
+    """
+    Read CSV file and stream SQL for the books table to the output file.
+
+    Args:
+        input_file: Path to the input CSV file
+        output_file: Path to the output SQL file
+        mode: "insert" (one INSERT per row), "upsert" (batched multi-row INSERT ... ON CONFLICT
+            (book_id) DO UPDATE) or "copy" (COPY ... FROM STDIN payload for psql)
+        batch_size: Rows per statement in upsert mode
+        copy_format: "text" or "csv" payload in copy mode
+        snapshot_file: Fingerprint snapshot (SQLite) read and updated in delta mode
+        removed_status: Status set on rows that disappeared, in delta mode
     """
     input_path = Path(input_file)
     output_path = Path(output_file)
-    
+
     if not input_path.exists():
         print(f"Error: Input file {input_path} not found.")
         sys.exit(1)
 
     print(f"Reading CSV: {input_path}")
     
-    sql_statements = []
-    
     try:
         with open(input_path, 'r', encoding='utf-8-sig', errors='ignore') as f:
             # properly handle BOM if present with utf-8-sig
@@ -76,70 +332,8 @@ def process_csv_to_sql(input_file, output_file):
                     print(f"Warning: Missing expected headers: {missing}")
                     print(f"Found headers: {reader.fieldnames}")
 
-            count = 0
-            for row_num, row in enumerate(reader, start=1):
-                try:
-                    # Extract and validate fields
-                    book_id = int(row['bookId'])
-                    version_id = int(row['versionId'])
-                    book_group_id = int(row['groupId'])
-                    education_grade_id = int(row['educationId'])
-                    
-                    # Text fields
-                    title = row['title']
-                    author = row['author']
-                    published_year = row['year']
-                    
-                    # Numeric fields
-                    total_pages = int(row['pages'])
-                    size = int(row['size'])
-                    
-                    # Status
-                    status_raw = row['Status']
-                    
-                    # Format for SQL
-                    status_sql = get_status_enum(status_raw)
-                    title_sql = escape_sql_string(title)
-                    author_sql = escape_sql_string(author)
-                    year_sql = escape_sql_string(published_year)
-                    
-                    # Construct INSERT statement
-                    # Table: books
-                    # Columns from schema: 
-                    # book_id, version_id, book_group_id, education_grade_id
-                    # title, author, published_year, total_pages, size, status
-                    
-                    sql = (
-                        f"INSERT INTO books ("
-                        f"book_id, version_id, book_group_id, education_grade_id, "
-                        f"title, author, published_year, total_pages, size, status"
-                        f") VALUES ("
-                        f"{book_id}, {version_id}, {book_group_id}, {education_grade_id}, "
-                        f"{title_sql}, {author_sql}, {year_sql}, {total_pages}, {size}, {status_sql}"
-                        f");"
-                    )
-                    
-                    sql_statements.append(sql)
-                    count += 1
-                    
-                except (ValueError, KeyError) as e:
-                    print(f"Error on row {row_num}: {e}")
-                    print(f"Row data: {row}")
-                    continue
-
+            count = write_sql(iter_book_rows(reader), output_path, input_path.name, mode, batch_size, copy_format, snapshot_file, removed_status)
             print(f"Processed {count} rows successfully.")
-            
-            # Write to output file
-            # Ensure output directory exists
-            if output_path.parent and not output_path.parent.exists():
-                output_path.parent.mkdir(parents=True, exist_ok=True)
-                
-            with open(output_path, 'w', encoding='utf-8') as f_out:
-                f_out.write("-- SQL Insert Statements for books table\n")
-                f_out.write(f"-- Generated from {input_path.name}\n\n")
-                f_out.write("\n".join(sql_statements))
-                f_out.write("\n")
-                
             print(f"SQL file created: {output_path}")
             
     except Exception as e:
@@ -150,10 +344,19 @@ def main():
     parser = argparse.ArgumentParser(description="Convert Books CSV to SQL Insert Statements.")
     parser.add_argument("input_file", help="Path to input CSV file")
     parser.add_argument("-o", "--output", help="Path to output SQL file", default="books_insert.sql")
+    parser.add_argument("-m", "--mode", choices=MODES, default=MODE_INSERT, help="insert: one INSERT per row; upsert: batched INSERT ... ON CONFLICT (book_id) DO UPDATE; copy: COPY FROM STDIN payload; delta: changes since --snapshot only (default: insert)")
+    parser.add_argument("--batch_size", type=int, default=DEFAULT_BATCH_SIZE, help=f"Rows per statement in upsert mode (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--snapshot", help="Fingerprint snapshot (SQLite) of the previous export; required by --mode delta")
+    parser.add_argument("--removed_status", choices=STATUS_NAMES, default="archived", help="Status set on rows missing from the CSV in delta mode (default: archived)")
+    parser.add_argument("--copy_format", choices=COPY_FORMATS, default="text", help="Payload format in copy mode (default: text)")
     
     args = parser.parse_args()
+    if args.batch_size < 1:
+        parser.error("--batch_size must be at least 1.")
+    if args.mode == MODE_DELTA and not args.snapshot:
+        parser.error("--mode delta requires --snapshot.")
     
-    process_csv_to_sql(args.input_file, args.output)
+    process_csv_to_sql(args.input_file, args.output, args.mode, args.batch_size, args.copy_format, args.snapshot, args.removed_status)
 
 if __name__ == "__main__":
     main()
@@ -1,98 +1,607 @@
 import os
+import csv
 import json
+import time
+import argparse
 from pathlib import Path
 import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+try:
+    from PIL import Image
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
-def check_missing_images(input_dir):
+# Default image store and report file name (saved next to this script)
+DEFAULT_INPUT_DIR = r'E:\Cloud\si-cerdas\book\images'
+DEFAULT_OUTPUT_FILENAME = 'missing_image_directories.json'
+# Folder snapshot of the last incremental run (saved next to this script)
+DEFAULT_SNAPSHOT_FILENAME = 'image_snapshot.json'
+# Results of --verify by (size, mtime) of each image (saved next to this script)
+DEFAULT_VERIFY_CACHE_FILENAME = 'image_verify_cache.json'
+
+# Size directory under each digit shard, and the image every folder must contain
+SIZE_DIR = "lg"
+COVER_INDEX = "0000"
+
+# One worker per digit shard (0-9)
+DEFAULT_WORKERS = 10
+
+# Size directories checked against the catalog; the cover URLs use xs and lg (utils/book/book-utils.ts)
+DEFAULT_CATALOG_SUFFIXES = ["xs", "lg"]
+# Books per shard directory: shard = bookId // 1000
+SHARD_SIZE = 1000
+
+# JPEG start/end of image markers
+JPEG_SOI = b"\xff\xd8\xff"
+JPEG_EOI = b"\xff\xd9"
+# Smaller JPEGs are reported as corrupt without reading them (a cover is tens of KB)
+DEFAULT_MIN_JPEG_BYTES = 1024
+# Bytes at the end of a file searched for EOI when the file does not end with it (padding)
+EOI_SEARCH_BYTES = 1024
+# Images per task sent to a verify worker process
+VERIFY_CHUNK_SIZE = 64
+
+# Verify results
+STATUS_OK = "ok"
+STATUS_CORRUPT = "corrupt"
+STATUS_UNCHECKED = "unchecked"
+
+
+def expected_filename(folder_id, suffix=SIZE_DIR):
+    """Name of the cover image of a folder: {folder_id}_0000_{suffix}.jpg"""
+    return f"{folder_id}_{COVER_INDEX}_{suffix}.jpg"
+
+
+def list_dirs(path):
     """
-    Checks for missing images in the structure:
-    {input_dir}/{first_digit}/lg/{folder_id}/{folder_id}_0000_lg.jpg
+    Sorted subdirectory entries of path.
+
+    DirEntry.is_dir() uses the file type returned with the directory listing
+    (d_type), so no stat call is made per entry.
+    """
+    with os.scandir(path) as entries:
+        return sorted((entry for entry in entries if entry.is_dir()), key=lambda entry: entry.name)
+
+
+def scan_shard(input_dir, shard, previous=None, suffix=SIZE_DIR):
+    """
+    Check every {shard}/{suffix}/{folder_id} directory for its cover image.
+
+    With previous (incremental mode), folders whose mtime matches the snapshot
+    keep their recorded status; only changed and new folders are checked. The
+    folder mtime changes whenever a file in it is created, deleted or renamed.
+
+    Args:
+        input_dir (str): Image store root
+        shard (str): Digit shard directory name
+        previous (dict, optional): Snapshot entries of this shard, {path: {"mtime", "ok"}}
+        suffix (str): Size directory and image name suffix (default: lg)
+
+    Returns:
+        dict: shard, total_checked, missing_count, rescanned, seconds, skipped,
+        the relative paths of all folders under "paths", the missing entries
+        (id, path, expected_file) and, in incremental mode, the new snapshot
+        entries under "folders"
+    """
+    start = time.perf_counter()
+    size_dir = os.path.join(input_dir, shard, suffix)
+    result = {"shard": shard, "total_checked": 0, "missing_count": 0, "rescanned": 0, "seconds": 0.0, "skipped": False, "paths": [], "missing": [], "folders": {}}
+
+    try:
+        folder_entries = list_dirs(size_dir)
+    except (FileNotFoundError, NotADirectoryError):
+        logger.warning(f"Skipping {shard}: '{suffix}' subdirectory not found.")
+        result["skipped"] = True
+        return result
+
+    for entry in folder_entries:
+        folder_id = entry.name
+        target_filename = expected_filename(folder_id, suffix)
+        rel_path = f"{shard}/{suffix}/{folder_id}"
+        result["total_checked"] += 1
+        result["paths"].append(rel_path)
+
+        mtime = None
+        recorded = None
+        if previous is not None:
+            # Free on Windows (returned with the listing), one stat of the folder elsewhere
+            mtime = entry.stat().st_mtime_ns
+            recorded = previous.get(rel_path)
+
+        if recorded is not None and recorded["mtime"] == mtime:
+            ok = recorded["ok"]
+        else:
+            result["rescanned"] += 1
+            # A single stat of the expected file instead of listing the folder
+            try:
+                os.stat(os.path.join(entry.path, target_filename))
+                ok = True
+            except OSError:
+                ok = False
+                logger.warning(f"Missing image in: {rel_path}")
+
+        if previous is not None:
+            result["folders"][rel_path] = {"mtime": mtime, "ok": ok}
+        if not ok:
+            result["missing"].append({
+                "id": folder_id,
+                "path": rel_path,
+                "expected_file": target_filename
+            })
+
+    result["missing_count"] = len(result["missing"])
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def scan_image_store(input_dir, workers=DEFAULT_WORKERS, snapshot=None, suffix=SIZE_DIR):
+    """
+    Scan all digit shards of the image store in parallel, one shard per worker.
+
+    Args:
+        input_dir (str): Image store root ({input_dir}/{first_digit}/{suffix}/{folder_id})
+        workers (int): Number of worker threads
+        snapshot (dict, optional): Folder snapshot of a previous run ({path: {"mtime", "ok"}});
+            enables incremental mode ({} for the first run)
+        suffix (str): Size directory and image name suffix (default: lg)
+
+    Returns:
+        dict: total_checked, missing_count, rescanned, scan_seconds, per-shard
+        counters under "shards", the relative paths of all folders under "paths"
+        and the missing entries (sorted by path) under "missing_directories"; in
+        incremental mode also the new snapshot under "folders". None if
+        input_dir does not exist
     """
-    input_path = Path(input_dir)
-    missing_dirs = []
-    
-    if not input_path.exists():
+    if not os.path.isdir(input_dir):
         logger.error(f"Input directory '{input_dir}' does not exist.")
-        return []
-
-    logger.info(f"Starting scan in: {input_path}")
-    
-    # Counters for progress
-    total_checked = 0
-    
-    # The structure is expected to be inputDir/{0-9}/lg/{folder_id}
-    # We can iterate through the subdirectories of inputDir
+        return None
+
+    logger.info(f"Starting {'incremental ' if snapshot is not None else ''}scan of '{suffix}' in: {input_dir}")
+    start = time.perf_counter()
+    shards = [entry.name for entry in list_dirs(input_dir)]
+
+    previous_by_shard = None
+    if snapshot is not None:
+        previous_by_shard = {shard: {} for shard in shards}
+        for rel_path, recorded in snapshot.items():
+            shard_previous = previous_by_shard.get(rel_path.split("/", 1)[0])
+            if shard_previous is not None:
+                shard_previous[rel_path] = recorded
+
+    results = []
+    # Directory listings and stats release the GIL, so threads scan the shards concurrently
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            executor.submit(scan_shard, input_dir, shard, previous_by_shard[shard] if previous_by_shard is not None else None, suffix): shard
+            for shard in shards
+        }
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                result = future.result()
+            except OSError as e:
+                logger.error(f"Error scanning {shard}: {e}")
+                continue
+            results.append(result)
+            if not result["skipped"]:
+                logger.info(f"Checked {shard}/{suffix}/: {result['total_checked']} directories ({result['rescanned']} rescanned), {result['missing_count']} missing ({result['seconds']}s)")
+
+    results.sort(key=lambda result: result["shard"])
+    missing_dirs = [entry for result in results for entry in result["missing"]]
+    scan = {
+        "total_checked": sum(result["total_checked"] for result in results),
+        "missing_count": len(missing_dirs),
+        "rescanned": sum(result["rescanned"] for result in results),
+        "scan_seconds": round(time.perf_counter() - start, 3),
+        "shards": {
+            result["shard"]: {
+                "total_checked": result["total_checked"],
+                "missing_count": result["missing_count"],
+                "rescanned": result["rescanned"],
+                "seconds": result["seconds"],
+            }
+            for result in results if not result["skipped"]
+        },
+        "paths": [rel_path for result in results for rel_path in result["paths"]],
+        "missing_directories": missing_dirs,
+    }
+    if snapshot is not None:
+        scan["folders"] = {rel_path: recorded for result in results for rel_path, recorded in result["folders"].items()}
+    return scan
+
+
+def load_snapshot(snapshot_path, input_dir):
+    """
+    Folder snapshot saved by a previous incremental run.
+
+    Returns:
+        dict: {path: {"mtime", "ok"}}, empty if there is no usable snapshot
+    """
     try:
-        # Sort to have a predictable order
-        digit_dirs = sorted([d for d in input_path.iterdir() if d.is_dir()])
-        
-        for digit_dir in digit_dirs:
-            lg_dir = digit_dir / "lg"
-            if not lg_dir.exists() or not lg_dir.is_dir():
-                logger.warning(f"Skipping {digit_dir}: 'lg' subdirectory not found.")
+        with open(snapshot_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        logger.info(f"No snapshot at {snapshot_path}, running a full scan.")
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable snapshot {snapshot_path}: {e}")
+        return {}
+
+    if data.get("input_directory") != input_dir:
+        logger.warning(f"Snapshot {snapshot_path} is for '{data.get('input_directory')}', running a full scan.")
+        return {}
+    return data.get("folders", {})
+
+
+def save_snapshot(snapshot_path, input_dir, folders):
+    """Write the folder snapshot (to a temporary name first, then renamed)."""
+    data = {"input_directory": input_dir, "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "folders": folders}
+    tmp_path = f"{snapshot_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, snapshot_path)
+
+
+def compute_delta(previous, current):
+    """
+    Changes between two folder snapshots.
+
+    Returns:
+        dict: newly_missing (missing now, present before or new folder),
+        newly_fixed (present now, missing before) and removed folders
+    """
+    newly_missing = sorted(path for path, recorded in current.items() if not recorded["ok"] and previous.get(path, {"ok": True})["ok"])
+    newly_fixed = sorted(path for path, recorded in current.items() if recorded["ok"] and path in previous and not previous[path]["ok"])
+    removed = sorted(path for path in previous if path not in current)
+    return {"newly_missing": newly_missing, "newly_fixed": newly_fixed, "removed": removed}
+
+
+def catalog_folder_path(book_id, suffix=SIZE_DIR):
+    """Relative folder of a book's images, as built by getBookCoverUrl: {bookId // 1000}/{suffix}/{bookId:04d}"""
+    return f"{book_id // SHARD_SIZE}/{suffix}/{book_id:04d}"
+
+
+def load_catalog_ids(catalog_path):
+    """
+    bookIds of the renumbered catalog written by step_2_renumber.py.
+
+    Reads the JSON output (array, or one record per line for .ndjson/.jsonl) or
+    the --output_csv file. Books without a bookId (no PDF found) are skipped.
+
+    Returns:
+        set: bookIds as ints
+    """
+    suffix = Path(catalog_path).suffix.lower()
+    with open(catalog_path, 'r', encoding='utf-8', newline='' if suffix == '.csv' else None) as f:
+        if suffix == '.csv':
+            rows = csv.DictReader(f)
+        elif suffix in ('.ndjson', '.jsonl'):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = json.load(f)
+
+        book_ids = set()
+        for row in rows:
+            try:
+                book_ids.add(int(row.get("bookId")))
+            except (TypeError, ValueError):
                 continue
-                
-            logger.info(f"Checking directory: {digit_dir.name}/lg/")
-            
-            # Subdirectories under lg/ are the folder_ids
-            folder_id_dirs = sorted([d for d in lg_dir.iterdir() if d.is_dir()])
-            
-            for folder_id_dir in folder_id_dirs:
-                folder_id = folder_id_dir.name
-                target_filename = f"{folder_id}_0000_lg.jpg"
-                target_file = folder_id_dir / target_filename
-                
-                total_checked += 1
-                
-                if not target_file.exists():
-                    # Record relative path from input_dir
-                    rel_path = folder_id_dir.relative_to(input_path)
-                    missing_dirs.append({
-                        "id": folder_id,
-                        "path": str(rel_path).replace("\\", "/"),
-                        "expected_file": target_filename
-                    })
-                    logger.warning(f"Missing image in: {rel_path}")
-                
-                # Periodically log progress for large datasets
-                if total_checked % 1000 == 0:
-                    logger.info(f"Processed {total_checked} directories...")
+    return book_ids
+
 
+def check_catalog(book_ids, scans):
+    """
+    Compare the catalog with the scanned folders of each size suffix.
+
+    Args:
+        book_ids (set): bookIds expected to have images
+        scans (dict): {suffix: scan_image_store() result}
+
+    Returns:
+        dict: Per suffix the expected, found and cover counts, and the sorted
+        missing_folders (no folder at all), missing_covers (folder without its
+        cover) and orphan_folders (folder with no catalog entry)
+    """
+    report = {}
+    for suffix, scan in scans.items():
+        expected = {catalog_folder_path(book_id, suffix) for book_id in book_ids}
+        found = set(scan["paths"])
+        without_cover = {entry["path"] for entry in scan["missing_directories"]}
+
+        missing_folders = expected - found
+        missing_covers = (expected & found) & without_cover
+        orphan_folders = found - expected
+        report[suffix] = {
+            "expected_files": len(expected),
+            "folders_found": len(expected) - len(missing_folders),
+            "covers_found": len(expected) - len(missing_folders) - len(missing_covers),
+            "missing_folders": sorted(missing_folders),
+            "missing_covers": sorted(missing_covers),
+            "orphan_folders": sorted(orphan_folders),
+        }
+        logger.info(f"Catalog '{suffix}': {report[suffix]['covers_found']}/{len(expected)} covers, {len(missing_folders)} missing folders, {len(missing_covers)} missing covers, {len(orphan_folders)} orphan folders.")
+    return report
+
+
+def list_images(input_dir, paths):
+    """
+    JPEG files in the given folders with their size and mtime.
+
+    Args:
+        input_dir (str): Image store root
+        paths (list): Folder paths relative to input_dir
+
+    Returns:
+        list: (relative file path, size, mtime_ns) tuples
+    """
+    images = []
+    for rel_path in paths:
+        try:
+            with os.scandir(os.path.join(input_dir, rel_path)) as entries:
+                for entry in entries:
+                    if entry.name.lower().endswith(".jpg") and entry.is_file():
+                        stat = entry.stat()
+                        images.append((f"{rel_path}/{entry.name}", stat.st_size, stat.st_mtime_ns))
+        except OSError as e:
+            logger.error(f"Error listing {rel_path}: {e}")
+    return images
+
+
+def verify_jpeg(file_path, size, min_bytes=DEFAULT_MIN_JPEG_BYTES):
+    """
+    Check one JPEG file.
+
+    The size threshold and the SOI/EOI markers are checked first; only files
+    with data after the last EOI are opened with Pillow (verify() for the
+    headers, then a full decode to catch truncated scans).
+
+    Returns:
+        tuple: (status, reason)
+    """
+    if size < min_bytes:
+        return STATUS_CORRUPT, f"too small ({size} bytes)"
+
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(len(JPEG_SOI))
+            f.seek(max(0, size - EOI_SEARCH_BYTES))
+            tail = f.read()
+    except OSError as e:
+        return STATUS_CORRUPT, f"unreadable ({e})"
+
+    if head != JPEG_SOI:
+        return STATUS_CORRUPT, "missing SOI marker"
+    if tail.endswith(JPEG_EOI):
+        return STATUS_OK, ""
+    if JPEG_EOI not in tail:
+        return STATUS_CORRUPT, "missing EOI marker (truncated)"
+
+    # EOI followed by trailing bytes: padding from some encoders, or a truncated file
+    if not HAS_PIL:
+        return STATUS_UNCHECKED, "data after EOI marker (Pillow not installed)"
+    try:
+        with Image.open(file_path) as img:
+            img.verify()
+        # verify() leaves the image unusable, so it is opened again to decode
+        with Image.open(file_path) as img:
+            img.load()
     except Exception as e:
-        logger.error(f"An error occurred during scanning: {e}")
+        return STATUS_CORRUPT, f"decode failed ({e})"
+    return STATUS_OK, ""
+
+
+def verify_chunk(input_dir, chunk, min_bytes):
+    """Verify a chunk of (relative path, size) images (worker process function)."""
+    return [verify_jpeg(os.path.join(input_dir, rel_path), size, min_bytes) for rel_path, size in chunk]
+
+
+def load_verify_cache(cache_path, input_dir):
+    """
+    Verify results of previous runs.
+
+    Returns:
+        dict: {relative file path: [size, mtime_ns, status, reason]}
+    """
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable verify cache {cache_path}: {e}")
+        return {}
+    return data.get("files", {}) if data.get("input_directory") == input_dir else {}
+
+
+def save_verify_cache(cache_path, input_dir, files):
+    """Write the verify cache (to a temporary name first, then renamed)."""
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"input_directory": input_dir, "files": files}, f, separators=(',', ':'))
+    os.replace(tmp_path, cache_path)
+
+
+def verify_images(input_dir, paths, cache, workers=DEFAULT_WORKERS, min_bytes=DEFAULT_MIN_JPEG_BYTES):
+    """
+    Verify all JPEGs in the given folders across a process pool.
+
+    Images whose size and mtime match the cache keep their cached result.
+
+    Args:
+        input_dir (str): Image store root
+        paths (list): Folder paths relative to input_dir
+        cache (dict): Results of previous runs (see load_verify_cache); updated in place
+        workers (int): Number of worker threads (listing) and processes (verifying)
+        min_bytes (int): Minimum size of a valid JPEG
+
+    Returns:
+        dict: checked, cached, corrupt_count, unchecked_count, seconds and the
+        corrupt_files (id, path, file, reason) sorted by path
+    """
+    start = time.perf_counter()
+    workers = max(1, workers)
+
+    # Folder listings are I/O bound: one thread per group of folders
+    groups = [paths[i::workers] for i in range(workers)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        images = [image for listed in executor.map(lambda group: list_images(input_dir, group), groups) for image in listed]
+
+    files = {}
+    pending = []
+    for rel_path, size, mtime in images:
+        cached = cache.get(rel_path)
+        if cached is not None and cached[0] == size and cached[1] == mtime:
+            files[rel_path] = cached
+        else:
+            files[rel_path] = [size, mtime, None, ""]
+            pending.append((rel_path, size))
+    logger.info(f"Verifying {len(pending)} of {len(images)} images ({len(images) - len(pending)} cached) with {workers} processes...")
+
+    # Decoding is CPU bound, so the checks run in worker processes
+    chunks = [pending[i:i + VERIFY_CHUNK_SIZE] for i in range(0, len(pending), VERIFY_CHUNK_SIZE)]
+    if chunks:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(verify_chunk, input_dir, chunk, min_bytes): chunk for chunk in chunks}
+            for i, future in enumerate(as_completed(futures)):
+                chunk = futures[future]
+                for (rel_path, _), (status, reason) in zip(chunk, future.result()):
+                    files[rel_path][2:] = [status, reason]
+                if (i + 1) % 100 == 0:
+                    logger.info(f"Verified {min((i + 1) * VERIFY_CHUNK_SIZE, len(pending))}/{len(pending)} images...")
+
+    # Files no longer on disk drop out of the cache
+    cache.clear()
+    cache.update(files)
+
+    corrupt = []
+    unchecked = 0
+    for rel_path in sorted(files):
+        status, reason = files[rel_path][2:]
+        if status == STATUS_UNCHECKED:
+            unchecked += 1
+        elif status == STATUS_CORRUPT:
+            folder_path, file_name = rel_path.rsplit("/", 1)
+            corrupt.append({"id": folder_path.rsplit("/", 1)[-1], "path": folder_path, "file": file_name, "reason": reason})
+            logger.warning(f"Corrupt image: {rel_path} ({reason})")
+
+    return {
+        "checked": len(images),
+        "cached": len(images) - len(pending),
+        "corrupt_count": len(corrupt),
+        "unchecked_count": unchecked,
+        "seconds": round(time.perf_counter() - start, 3),
+        "corrupt_files": corrupt,
+    }
+
+
+def check_missing_images(input_dir, workers=DEFAULT_WORKERS):
+    """
+    Checks for missing images in the structure:
+    {input_dir}/{first_digit}/lg/{folder_id}/{folder_id}_0000_lg.jpg
+    """
+    scan = scan_image_store(input_dir, workers)
+    return scan["missing_directories"] if scan else []
 
-    return missing_dirs
 
 def main():
-    # Configuration
-    input_dir = r'E:\Cloud\si-cerdas\book\images'
-    output_filename = 'missing_image_directories.json'
-    
+    parser = argparse.ArgumentParser(description="Find image folders without their cover image ({folder_id}_0000_lg.jpg).")
+    parser.add_argument("input_dir", nargs='?', default=DEFAULT_INPUT_DIR, help=f"Image store root (default: {DEFAULT_INPUT_DIR})")
+    parser.add_argument("-o", "--output", help=f"Output JSON file (default: {DEFAULT_OUTPUT_FILENAME} next to this script)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"Number of shards scanned in parallel (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--incremental", action='store_true', help="Only check folders changed since the last incremental run and report the delta")
+    parser.add_argument("--catalog", help="Renumbered catalog from step_2_renumber.py (JSON or CSV); report books without image folders, missing covers and orphan folders")
+    parser.add_argument("--suffixes", nargs='+', default=DEFAULT_CATALOG_SUFFIXES, help=f"Size directories checked with --catalog (default: {' '.join(DEFAULT_CATALOG_SUFFIXES)})")
+    parser.add_argument("--verify", action='store_true', help="Check every JPEG in the scanned folders for truncation/corruption")
+    parser.add_argument("--min_bytes", type=int, default=DEFAULT_MIN_JPEG_BYTES, help=f"Smallest valid JPEG size for --verify (default: {DEFAULT_MIN_JPEG_BYTES})")
+    parser.add_argument("--verify_cache", help=f"Verify results cache (default: {DEFAULT_VERIFY_CACHE_FILENAME} next to this script)")
+    parser.add_argument("--snapshot", help=f"Folder snapshot file for --incremental (default: {DEFAULT_SNAPSHOT_FILENAME} next to this script)")
+
+    args = parser.parse_args()
+
     # Get the directory where the script is located to save the output there
-    script_dir = Path(__file__).parent
-    output_path = script_dir / output_filename
-    
-    missing_data = check_missing_images(input_dir)
-    
+    output_path = Path(args.output) if args.output else Path(__file__).parent / DEFAULT_OUTPUT_FILENAME
+    snapshot_path = Path(args.snapshot) if args.snapshot else Path(__file__).parent / DEFAULT_SNAPSHOT_FILENAME
+    verify_cache_path = Path(args.verify_cache) if args.verify_cache else Path(__file__).parent / DEFAULT_VERIFY_CACHE_FILENAME
+
+    previous = load_snapshot(snapshot_path, args.input_dir) if args.incremental else None
+    scan = scan_image_store(args.input_dir, args.workers, previous)
+    if scan is None:
+        return
+
+    scans = {SIZE_DIR: scan}
+    catalog_report = None
+    if args.catalog:
+        try:
+            book_ids = load_catalog_ids(args.catalog)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load catalog {args.catalog}: {e}")
+            return
+        logger.info(f"Loaded {len(book_ids)} bookIds from {args.catalog}")
+        # The lg scan above is reused; other sizes get a full scan
+        for suffix in args.suffixes:
+            if suffix not in scans:
+                scans[suffix] = scan_image_store(args.input_dir, args.workers, suffix=suffix)
+        catalog_report = check_catalog(book_ids, {suffix: scans[suffix] for suffix in args.suffixes})
+
+    verify_report = None
+    verify_cache = None
+    if args.verify:
+        if not HAS_PIL:
+            logger.warning("Pillow is not installed; images with data after the EOI marker are reported as unchecked. Install it with: pip install Pillow")
+        verify_cache = load_verify_cache(verify_cache_path, args.input_dir)
+        verify_report = verify_images(args.input_dir, [rel_path for suffix_scan in scans.values() for rel_path in suffix_scan["paths"]], verify_cache, args.workers, args.min_bytes)
+        logger.info(f"Verified {verify_report['checked']} images in {verify_report['seconds']}s ({verify_report['cached']} cached): {verify_report['corrupt_count']} corrupt, {verify_report['unchecked_count']} unchecked.")
+
     # Prepare final JSON structure
     result = {
-        "input_directory": input_dir,
-        "total_checked": 0, # We'll update this if we track it better
-        "missing_count": len(missing_data),
-        "missing_directories": missing_data
+        "input_directory": args.input_dir,
+        "total_checked": scan["total_checked"],
+        "missing_count": scan["missing_count"],
+        "scan_seconds": scan["scan_seconds"],
+        "shards": scan["shards"],
+        "missing_directories": scan["missing_directories"]
     }
-    
+    if args.incremental:
+        delta = compute_delta(previous, scan["folders"])
+        result["rescanned"] = scan["rescanned"]
+        # Without a previous snapshot every missing image counts as newly missing
+        result["baseline"] = not previous
+        result["delta"] = delta
+        logger.info(f"Rescanned {scan['rescanned']}/{scan['total_checked']} directories: {len(delta['newly_missing'])} newly missing, {len(delta['newly_fixed'])} newly fixed, {len(delta['removed'])} removed.")
+
+    if catalog_report is not None:
+        result["catalog"] = {"file": args.catalog, "expected_count": len(book_ids), "suffixes": catalog_report}
+    if verify_report is not None:
+        result["verify"] = verify_report
+
     try:
         with open(output_path, 'w', encoding='utf-8') as f:
             json.dump(result, f, indent=4)
-        logger.info(f"Scan complete. Found {len(missing_data)} missing images.")
+        logger.info(f"Scan complete. Checked {scan['total_checked']} directories in {scan['scan_seconds']}s, found {scan['missing_count']} missing images.")
         logger.info(f"Results saved to: {output_path}")
     except Exception as e:
         logger.error(f"Failed to save JSON output: {e}")
+        return
+
+    # Saved only after the report, so a failed run is compared against the same snapshot next time
+    if args.incremental:
+        try:
+            save_snapshot(snapshot_path, args.input_dir, scan["folders"])
+            logger.info(f"Snapshot saved to: {snapshot_path}")
+        except OSError as e:
+            logger.error(f"Failed to save snapshot: {e}")
+    if args.verify:
+        try:
+            save_verify_cache(verify_cache_path, args.input_dir, verify_cache)
+            logger.info(f"Verify cache saved to: {verify_cache_path}")
+        except OSError as e:
+            logger.error(f"Failed to save verify cache: {e}")
 
 if __name__ == "__main__":
     main()
@@ -11,15 +11,26 @@ Usage:
 
 Example:
     python pdf-page-to-image.py ./pdfs ./images --pages 5 --filter "*_book.pdf" --suffix extract
+
+Repair:
+    Regenerate only the missing or corrupt images listed by check-missing-image.py
+    (or of the given folder IDs). input_folder is searched recursively for the PDFs
+    and output_folder is the image store root ({shard}/{suffix}/{id}/...):
+
+    python pdf-page-to-image.py ./perpustakaan ./images --repair-from missing_image_directories.json
+    python pdf-page-to-image.py ./perpustakaan ./images --repair-ids 0001 0042 --pdf-index pdf_index.json [--refresh-pdf-index]
 """
 
 import os
+import re
 import sys
+import json
+import fnmatch
 import argparse
 import random
 from pathlib import Path
 import logging
-from typing import List, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
 import concurrent.futures
 try:
@@ -41,6 +52,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Books per image store shard: {bookId // 1000}/{suffix}/{id}
+SHARD_SIZE = 1000
+
+# Image file name written by this script: {id}_{index:04d}_{suffix}.jpg
+IMAGE_NAME_PATTERN = re.compile(r"^(?P<id>.+)_(?P<index>\d{4})_(?P<suffix>[^_]+)\.jpg$", re.IGNORECASE)
+
 class PDFPageExtractor:
     def __init__(self, input_folder, output_folder, pages_count=6, filter_pattern="*.pdf", suffix="lg", dpi=300, compress=80, height=800, include_first_page=True, max_workers=8):
         """
@@ -311,6 +328,211 @@ class PDFPageExtractor:
             logger.error(f"Error: {e}")
             sys.exit(1)
 
+    def build_pdf_index(self, index_file: Optional[str] = None, refresh: bool = False) -> Dict[str, str]:
+        """
+        Map each folder ID (first word of the PDF name) to its PDF path.
+
+        input_folder is searched recursively (e.g. the perpustakaan root with its
+        0-9 folders). With index_file, a saved index is reused unless refresh is
+        set, and a newly built index is saved there.
+
+        Returns:
+            Dict[str, str]: folder ID -> PDF path
+        """
+        if index_file and not refresh and os.path.exists(index_file):
+            with open(index_file, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            logger.info(f"Loaded PDF index with {len(index)} entries from {index_file}")
+            return index
+
+        index = {}
+        pending = [str(self.input_folder)]
+        while pending:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        pending.append(entry.path)
+                    elif entry.name.lower().endswith('.pdf') and fnmatch.fnmatch(entry.name, self.filter_pattern):
+                        folder_id = Path(entry.name).stem.split("_")[0]
+                        if folder_id in index:
+                            logger.warning(f"Duplicate PDF for ID {folder_id}: {entry.path} (keeping {index[folder_id]})")
+                            continue
+                        index[folder_id] = entry.path
+        logger.info(f"Indexed {len(index)} PDFs in {self.input_folder}")
+
+        if index_file:
+            tmp_path = f"{index_file}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, index_file)
+            logger.info(f"PDF index saved to: {index_file}")
+        return index
+
+    def image_dir(self, folder_id: str) -> Path:
+        """Image folder of an ID in the image store: {id // 1000}/{suffix}/{id}"""
+        return self.output_folder / str(int(folder_id) // SHARD_SIZE) / self.suffix / folder_id
+
+    def load_repair_targets(self, report_file: str) -> Dict[str, Optional[Set[int]]]:
+        """
+        Images to regenerate from a check-missing-image.py report.
+
+        Uses missing_directories, verify.corrupt_files and the catalog
+        missing_folders/missing_covers of this suffix.
+
+        Returns:
+            Dict[str, Optional[Set[int]]]: folder ID -> image indices to render
+            (None: every image missing from the folder)
+        """
+        with open(report_file, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+
+        targets: Dict[str, Optional[Set[int]]] = {}
+
+        def add(folder_id, file_name=None):
+            if file_name is None:
+                targets[folder_id] = None
+                return
+            match = IMAGE_NAME_PATTERN.match(file_name)
+            if not match or match.group("suffix") != self.suffix:
+                return
+            indices = targets.setdefault(folder_id, set())
+            if indices is not None:
+                indices.add(int(match.group("index")))
+
+        def in_suffix(rel_path):
+            parts = rel_path.split("/")
+            return len(parts) >= 2 and parts[-2] == self.suffix
+
+        for entry in report.get("missing_directories", []):
+            add(entry["id"], entry["expected_file"])
+        for entry in report.get("verify", {}).get("corrupt_files", []):
+            add(entry["id"], entry["file"])
+        catalog = report.get("catalog", {}).get("suffixes", {}).get(self.suffix, {})
+        for rel_path in catalog.get("missing_folders", []):
+            if in_suffix(rel_path):
+                add(rel_path.split("/")[-1])
+        for rel_path in catalog.get("missing_covers", []):
+            folder_id = rel_path.split("/")[-1]
+            add(folder_id, f"{folder_id}_0000_{self.suffix}.jpg")
+        return targets
+
+    def repair_pdf_file(self, folder_id: str, pdf_path: Path, indices: Optional[Set[int]]) -> int:
+        """
+        Render only the given image indices of one folder (None: the missing ones).
+
+        The index -> page mapping is the same as in process_pdf_file: with
+        include_first_page, index 0000 is the first page; the other indices
+        get new random pages.
+        """
+        page_count, _ = self.get_pdf_info(pdf_path)
+        if page_count == 0:
+            logger.warning(f"Skipping {pdf_path.name}: No pages found or error reading PDF")
+            return 0
+
+        selected_pages = self.select_random_pages(page_count)
+        output_dir = self.image_dir(folder_id)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        if indices is None:
+            indices = {i for i in range(len(selected_pages)) if not (output_dir / f"{folder_id}_{i:04d}_{self.suffix}.jpg").exists()}
+
+        repaired_count = 0
+        for extraction_index in sorted(indices):
+            if extraction_index >= len(selected_pages):
+                logger.warning(f"Skipping image {extraction_index:04d} of {folder_id}: {pdf_path.name} has only {page_count} pages")
+                continue
+            page_num = selected_pages[extraction_index]
+            img = self.extract_page_as_image(pdf_path, page_num)
+            if img is None:
+                logger.warning(f"Skipping page {page_num + 1} from {pdf_path.name}: No image extracted")
+                continue
+
+            output_path = output_dir / f"{folder_id}_{extraction_index:04d}_{self.suffix}.jpg"
+            # Written under a temporary name so an interrupted run leaves no truncated JPEG
+            tmp_path = output_path.with_name(f".{output_path.name}.tmp")
+            try:
+                img.save(tmp_path, "JPEG", quality=self.compress, optimize=True)
+                os.replace(tmp_path, output_path)
+                repaired_count += 1
+            except Exception as e:
+                logger.error(f"Error saving {output_path}: {e}")
+                if tmp_path.exists():
+                    tmp_path.unlink()
+        return repaired_count
+
+    def repair(self, targets: Dict[str, Optional[Set[int]]], pdf_index: Dict[str, str]):
+        """Regenerate the targeted images using the worker pool."""
+        jobs = []
+        not_indexed = []
+        for folder_id, indices in sorted(targets.items()):
+            pdf_path = pdf_index.get(folder_id)
+            if pdf_path is None or not folder_id.isdigit():
+                not_indexed.append(folder_id)
+                continue
+            jobs.append((folder_id, Path(pdf_path), indices))
+
+        if not_indexed:
+            logger.warning(f"No PDF found for {len(not_indexed)} IDs: {', '.join(not_indexed[:20])}{' ...' if len(not_indexed) > 20 else ''}")
+        if not jobs:
+            logger.warning("Nothing to repair")
+            return
+
+        total_images = 0
+        failed_count = 0
+        logger.info(f"Repairing {len(jobs)} folders with {self.max_workers} threads...")
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            future_to_id = {executor.submit(self.repair_pdf_file, *job): job[0] for job in jobs}
+            for i, future in enumerate(concurrent.futures.as_completed(future_to_id)):
+                folder_id = future_to_id[future]
+                try:
+                    total_images += future.result()
+                except Exception as e:
+                    logger.error(f"Failed to repair {folder_id}: {e}")
+                    failed_count += 1
+
+                if (i + 1) % 10 == 0:
+                    logger.info(f"Repaired {i + 1}/{len(jobs)} folders")
+
+        logger.info(f"--------------------------------------------------------------")
+        logger.info(f"Repaired folders: {len(jobs) - failed_count}/{len(jobs)}")
+        logger.info(f"Total images rendered: {total_images}")
+        logger.info(f"IDs without PDF: {len(not_indexed)}")
+        logger.info(f"--------------------------------------------------------------")
+
+    def run_repair(self, ids: Optional[List[str]] = None, report_file: Optional[str] = None, index_file: Optional[str] = None, refresh_index: bool = False):
+        """
+        Run a targeted regeneration for folder IDs and/or a check-missing-image.py report.
+
+        A saved PDF index is rebuilt with refresh_index, or when a PDF it lists for a
+        target has moved. IDs that are not in the index (e.g. orphan image folders)
+        are reported as having no PDF; use refresh_index after adding new PDFs.
+        """
+        try:
+            logger.info("Starting PDF Page Extractor (repair)...")
+            logger.info(f"PDF folder: {self.input_folder}")
+            logger.info(f"Image store: {self.output_folder}")
+            self.validate_inputs()
+
+            targets: Dict[str, Optional[Set[int]]] = {}
+            if report_file:
+                targets.update(self.load_repair_targets(report_file))
+            for folder_id in ids or []:
+                # IDs are zero-padded like the PDF and folder names (1 -> 0001)
+                targets[f"{int(folder_id):04d}" if folder_id.isdigit() else folder_id] = None
+            logger.info(f"Folders to repair: {len(targets)}")
+
+            pdf_index = self.build_pdf_index(index_file, refresh=refresh_index)
+            # A saved index may point at PDFs that were moved or removed since
+            if index_file and not refresh_index and any(folder_id in pdf_index and not os.path.exists(pdf_index[folder_id]) for folder_id in targets):
+                logger.info("PDF index is out of date, rebuilding...")
+                pdf_index = self.build_pdf_index(index_file, refresh=True)
+
+            self.repair(targets, pdf_index)
+
+        except Exception as e:
+            logger.error(f"Error: {e}")
+            sys.exit(1)
+
 # Add missing import
 import io
 
@@ -391,6 +613,28 @@ Examples:
         default=8,
         help="Number of threads to use for processing (default: 8)"
     )
+
+    parser.add_argument(
+        "--repair-ids",
+        nargs="+",
+        help="Regenerate the missing images of these folder IDs only (output_folder is the image store root)"
+    )
+
+    parser.add_argument(
+        "--repair-from",
+        help="Regenerate the missing/corrupt images listed in a check-missing-image.py report"
+    )
+
+    parser.add_argument(
+        "--pdf-index",
+        help="JSON file caching the folder ID -> PDF path index used for repairs"
+    )
+
+    parser.add_argument(
+        "--refresh-pdf-index",
+        action="store_true",
+        help="Rebuild the --pdf-index file before repairing (e.g. after adding new PDFs)"
+    )
     
     args = parser.parse_args()
     
@@ -408,7 +652,10 @@ Examples:
         max_workers=args.threads
     )
     
-    extractor.run()
+    if args.repair_ids or args.repair_from:
+        extractor.run_repair(args.repair_ids, args.repair_from, args.pdf_index, args.refresh_pdf_index)
+    else:
+        extractor.run()
 
 if __name__ == "__main__":
     # python src/tools/pdf-page-to-image.py E:/Cloud/SiCerdas/perpustakaan/0 E:/Cloud/SiCerdas/perpustakaan/pages/0/lg --pages 5 --filter "*.pdf" --suffix lg --dpi 300 --compress 80 --height 800